@@ -0,0 +1,191 @@
+import math
+
+import numpy as np
+
+from src.bll.bll_models import CrossTabModel
+from src.bll.poll_versions import PollVersions
+from src.bll.read_cache import ReadCache
+from src.dal.repositories import PollRepository, VoteRepository
+from src.tracing import traced
+
+
+@traced
+class AnalyticsService:
+    # results are cached per pair of poll versions; the ttl bounds how
+    # long votes cast on other workers go unseen
+    def __init__(
+        self,
+        poll_repository: PollRepository,
+        vote_repository: VoteRepository,
+        poll_versions: PollVersions | None = None,
+        read_cache: ReadCache | None = None,
+    ):
+        self.poll_repository = poll_repository
+        self.vote_repository = vote_repository
+        self.poll_versions = poll_versions or PollVersions()
+        self.read_cache = read_cache or ReadCache()
+
+    def get_cross_tab(
+        self, poll_id: int, other_poll_id: int
+    ) -> CrossTabModel | None:
+        return self.read_cache.get(
+            ("crosstab", poll_id, other_poll_id),
+            (
+                self.poll_versions.get(poll_id),
+                self.poll_versions.get(other_poll_id),
+            ),
+            lambda: self._load_cross_tab(poll_id, other_poll_id),
+        )
+
+    def _load_cross_tab(
+        self, poll_id: int, other_poll_id: int
+    ) -> CrossTabModel | None:
+        option_ids = self._option_ids(poll_id)
+        other_option_ids = self._option_ids(other_poll_id)
+        if len(option_ids) == 0 or len(other_option_ids) == 0:
+            return None
+
+        users, options = self.vote_repository.get_poll_voters(poll_id=poll_id)
+        other_users, other_options = self.vote_repository.get_poll_voters(
+            poll_id=other_poll_id
+        )
+        table, overlap, voters, other_voters = contingency_table(
+            users,
+            np.searchsorted(option_ids, options),
+            len(option_ids),
+            other_users,
+            np.searchsorted(other_option_ids, other_options),
+            len(other_option_ids),
+        )
+        statistic, degrees_of_freedom, p_value = chi_square(table)
+        smaller = min(
+            np.count_nonzero(table.sum(axis=1)),
+            np.count_nonzero(table.sum(axis=0)),
+        )
+        total = int(table.sum())
+        return CrossTabModel(
+            poll_id=poll_id,
+            other_poll_id=other_poll_id,
+            option_ids=tuple(option_ids.tolist()),
+            other_option_ids=tuple(other_option_ids.tolist()),
+            counts=tuple(tuple(row) for row in table.tolist()),
+            voters=voters,
+            other_voters=other_voters,
+            overlap=overlap,
+            chi_square=statistic,
+            degrees_of_freedom=degrees_of_freedom,
+            p_value=p_value,
+            cramers_v=(
+                math.sqrt(statistic / (total * (smaller - 1)))
+                if total > 0 and smaller > 1
+                else 0.0
+            ),
+        )
+
+    def _option_ids(self, poll_id: int) -> np.ndarray:
+        options = self.poll_repository.get_options_for_poll(poll_id=poll_id)
+        return np.sort(np.array([option.id for option in options], np.int64))
+
+
+def contingency_table(
+    users: np.ndarray,
+    options: np.ndarray,
+    option_count: int,
+    other_users: np.ndarray,
+    other_options: np.ndarray,
+    other_option_count: int,
+) -> tuple[np.ndarray, int, int, int]:
+    # options are indexes into each poll's options. Every vote of a user
+    # is paired with each of their votes in the other poll, so voters of
+    # multiple choice polls count once per pair of options they chose.
+    # Returns the table and the number of users who voted in both polls,
+    # in the first and in the other one
+    users, options = _by_user(users, options)
+    other_users, other_options = _by_user(other_users, other_options)
+    starts = np.searchsorted(other_users, users, side="left")
+    matches = np.searchsorted(other_users, users, side="right") - starts
+
+    pairs = int(matches.sum())
+    rows = np.repeat(options, matches)
+    # index of each pair within its user's run of other votes
+    runs = np.repeat(np.cumsum(matches) - matches, matches)
+    positions = np.repeat(starts, matches) + (np.arange(pairs) - runs)
+    columns = other_options[positions]
+
+    table = np.bincount(
+        rows * other_option_count + columns,
+        minlength=option_count * other_option_count,
+    ).reshape(option_count, other_option_count)
+    return (
+        table,
+        _distinct(users[matches > 0]),
+        _distinct(users),
+        _distinct(other_users),
+    )
+
+
+def _by_user(
+    users: np.ndarray, options: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    order = np.argsort(users)
+    return users[order], options[order]
+
+
+def _distinct(sorted_values: np.ndarray) -> int:
+    # cheaper than np.unique, which sorts again
+    if len(sorted_values) == 0:
+        return 0
+    return 1 + int(np.count_nonzero(np.diff(sorted_values)))
+
+
+def chi_square(table: np.ndarray) -> tuple[float, int, float]:
+    # Pearson's test of independence over the rows and columns that have
+    # any votes; returns the statistic, degrees of freedom and p-value
+    table = table[table.sum(axis=1) > 0][:, table.sum(axis=0) > 0]
+    rows, columns = table.shape
+    degrees_of_freedom = (rows - 1) * (columns - 1)
+    if degrees_of_freedom <= 0:
+        return 0.0, 0, 1.0
+
+    total = table.sum()
+    expected = np.outer(table.sum(axis=1), table.sum(axis=0)) / total
+    statistic = float(((table - expected) ** 2 / expected).sum())
+    return (
+        statistic,
+        degrees_of_freedom,
+        _upper_gamma(degrees_of_freedom / 2, statistic / 2),
+    )
+
+
+def _upper_gamma(a: float, x: float) -> float:
+    # regularized upper incomplete gamma function Q(a, x), by its series
+    # below a + 1 and its continued fraction above
+    if x <= 0:
+        return 1.0
+    scale = math.exp(-x + a * math.log(x) - math.lgamma(a))
+    if x < a + 1:
+        term = total = 1 / a
+        denominator = a
+        while abs(term) > abs(total) * 1e-15:
+            denominator += 1
+            term *= x / denominator
+            total += term
+        return max(0.0, 1 - total * scale)
+
+    tiny = 1e-300
+    b = x + 1 - a
+    c = 1 / tiny
+    d = 1 / b
+    fraction = d
+    for i in range(1, 1000):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        d = tiny if abs(d) < tiny else d
+        c = b + an / c
+        c = tiny if abs(c) < tiny else c
+        d = 1 / d
+        fraction *= d * c
+        if abs(d * c - 1) < 1e-15:
+            break
+    return fraction * scale
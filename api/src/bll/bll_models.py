@@ -10,13 +10,18 @@ class VoteModel:
     vote_date: datetime
 
 
-@dataclass
+# the models a ReadCache holds are frozen, since every caller that gets
+# one shares it with the cache
+
+
+@dataclass(frozen=True)
 class OptionModel:
     id: int
     text: str
+    votes: int | None = None
 
 
-@dataclass
+@dataclass(frozen=True)
 class PollModel:
     id: int
     name: str
@@ -25,11 +30,103 @@ class PollModel:
     creation_date: datetime
     anonymous_voting: bool
     multiple_choice: bool
-    options: list[OptionModel] | None = None
+    options: tuple[OptionModel, ...] | None = None
+
+
+@dataclass
+class PollSearchPage:
+    polls: list[PollModel]
+    # rank and id of the last poll, None on the last page
+    next_cursor: tuple[float, int] | None = None
+
+
+@dataclass
+class RankedPollModel:
+    poll_id: int
+    name: str
+    tag: str
+    votes: int
+
+
+@dataclass
+class LeaderboardPage:
+    polls: list[RankedPollModel]
+    # votes and id of the last poll, None on the last page
+    next_cursor: tuple[int, int] | None = None
+
+
+@dataclass
+class OptionSeriesModel:
+    id: int
+    text: str
+    votes: list[int]
+
+
+@dataclass
+class VoteSeriesModel:
+    poll_id: int
+    resolution: str
+    buckets: list[datetime]
+    options: list[OptionSeriesModel]
+
+
+@dataclass
+class OptionOverlapModel:
+    poll_id: int
+    option_ids: list[int]
+    # voters[i][j] voted for both option i and option j, the diagonal
+    # holds each option's voter count
+    voters: list[list[int]]
 
 
 @dataclass
+class PollMembershipModel:
+    poll_id: int
+    user_id: int
+    voted: bool
+    # None for anonymous polls
+    option_ids: list[int] | None = None
+
+
+@dataclass(frozen=True)
+class CrossTabModel:
+    poll_id: int
+    other_poll_id: int
+    option_ids: tuple[int, ...]
+    other_option_ids: tuple[int, ...]
+    # counts[i][j] voters who chose option i and other option j
+    counts: tuple[tuple[int, ...], ...]
+    voters: int
+    other_voters: int
+    # voters of both polls
+    overlap: int
+    chi_square: float
+    degrees_of_freedom: int
+    p_value: float
+    cramers_v: float
+
+
+@dataclass
+class OptionStatisticsModel:
+    id: int
+    votes: int
+    share: float
+    # bounds of the share's confidence interval
+    lower: float
+    upper: float
+    margin_of_error: float
+    win_probability: float
+
+
+@dataclass
+class PollStatisticsModel:
+    poll_id: int
+    votes: int
+    options: list[OptionStatisticsModel]
+
+
+@dataclass(frozen=True)
 class UserModel:
     id: int
     name: str
-    created_polls: list[PollModel] | None = None
+    created_polls: tuple[PollModel, ...] | None = None
@@ -1,50 +1,354 @@
+from dataclasses import replace
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING
+
 from src.bll.bll_exceptions import (
     NotFound,
     NotAllowed,
     PollExistsException,
     DatabaseExcetpion,
 )
-from src.bll.bll_models import PollModel, OptionModel
-from src.dal import PollEntity
+from src.bll.bll_models import (
+    PollModel,
+    OptionModel,
+    PollSearchPage,
+    RankedPollModel,
+    LeaderboardPage,
+    OptionSeriesModel,
+    VoteSeriesModel,
+    OptionOverlapModel,
+    PollMembershipModel,
+    PollStatisticsModel,
+)
+from src.bll.poll_versions import PollVersions
+from src.bll.read_cache import ReadCache
+from src.bll.trending import TrendingPolls
+from src.bll.voter_index import VoterIndex
+from src.dal import PollEntity, joined
 from src.dal.dal_entities import OptionEntity
-from src.dal.exceptions import DalUniqueViolationException
+from src.dal.exceptions import (
+    DalUniqueViolationException,
+    DalForeignKeyViolationException,
+    DalNotFound,
+)
 from src.dal.repositories import PollRepository, VoteRepository
+from src.tracing import traced
+
+if TYPE_CHECKING:
+    # numpy comes with it, so it is only imported once statistics are
+    # asked for
+    from src.bll.result_stats import ResultStatistics
+
+# rollup resolutions from finest to coarsest, as stored in vote_rollups
+_RESOLUTIONS = (
+    ("minute", "m", timedelta(minutes=1)),
+    ("hour", "h", timedelta(hours=1)),
+    ("day", "d", timedelta(days=1)),
+)
 
 
+@traced
 class PollService:
     def __init__(
-        self, poll_repository: PollRepository, vote_repository: VoteRepository
+        self,
+        poll_repository: PollRepository,
+        vote_repository: VoteRepository,
+        poll_versions: PollVersions | None = None,
+        read_cache: ReadCache | None = None,
+        trending: TrendingPolls | None = None,
+        voter_index: VoterIndex | None = None,
+        result_statistics: "ResultStatistics | None" = None,
+        follow_votes: bool = False,
+        rollup_retention: dict[str, timedelta] | None = None,
+        change_retention: timedelta | None = None,
     ):
         self.poll_repository = poll_repository
         self.vote_repository = vote_repository
+        self.poll_versions = poll_versions or PollVersions()
+        self.read_cache = read_cache or ReadCache()
+        self.trending = trending
+        self.voter_index = voter_index
+        self._result_statistics = result_statistics
+        # when following, trending and the index learn of every vote,
+        # this worker's included, from apply_new_votes
+        self.follow_votes = follow_votes
+        # a voter index loaded from file is followed on from where it was
+        # saved
+        self._vote_change_position: int | None = (
+            voter_index.position if voter_index is not None else None
+        )
+        # resolution -> how long its rollups are kept; unlisted ones are
+        # kept for good
+        self.rollup_retention = rollup_retention or dict()
+        # how long vote changes are kept for followers; None keeps them
+        self.change_retention = change_retention
+
+    @property
+    def result_statistics(self) -> "ResultStatistics":
+        if self._result_statistics is None:
+            from src.bll.result_stats import ResultStatistics
+
+            self._result_statistics = ResultStatistics()
+        return self._result_statistics
+
+    def get_poll_version(self, poll_id: int) -> int:
+        return self.poll_versions.get(poll_id)
 
     def get_polls_by_userid(self, user_id: int) -> list[PollModel]:
-        polls_entities = self.poll_repository.get_polls_by_user(
+        polls_entities = self.poll_repository.get_polls_with_options(
             user_id=user_id
         )
-        poll_models = list()
-        for poll in polls_entities:
-            options = self.poll_repository.get_options_for_poll(
-                poll_id=poll.id
+        return [
+            self._to_poll_model(poll, poll.options) for poll in polls_entities
+        ]
+
+    def get_polls(
+        self, poll_ids: list[int], with_counts: bool = True
+    ) -> list[PollModel]:
+        # one query whatever the number of polls, returned in the order
+        # asked for; unknown ids are left out
+        poll_entities = self.poll_repository.get_polls_with_options(
+            poll_ids=poll_ids, with_counts=with_counts
+        )
+        polls = {
+            poll.id: self._to_poll_model(poll, poll.options)
+            for poll in poll_entities
+        }
+        return [polls[poll_id] for poll_id in poll_ids if poll_id in polls]
+
+    def search_polls(
+        self,
+        query: str,
+        limit: int,
+        cursor: tuple[float, int] | None = None,
+    ) -> PollSearchPage:
+        # one extra hit tells whether another page follows
+        hits = self.poll_repository.search_polls(
+            query=query, limit=limit + 1, cursor=cursor
+        )
+        page = PollSearchPage(
+            polls=[self._to_poll_model(hit.poll, []) for hit in hits[:limit]]
+        )
+        if len(hits) > limit:
+            last = hits[limit - 1]
+            page.next_cursor = (last.rank, last.poll.id)
+        return page
+
+    def get_leaderboard(
+        self,
+        tag: str | None,
+        limit: int,
+        cursor: tuple[int, int] | None = None,
+    ) -> LeaderboardPage:
+        totals = self.poll_repository.get_leaderboard(
+            tag=tag, limit=limit + 1, cursor=cursor
+        )
+        page = LeaderboardPage(
+            polls=[
+                RankedPollModel(
+                    poll_id=total.poll_id,
+                    name=total.name,
+                    tag=total.tag,
+                    votes=total.votes,
+                )
+                for total in totals[:limit]
+            ]
+        )
+        if len(totals) > limit:
+            last = totals[limit - 1]
+            page.next_cursor = (last.votes, last.poll_id)
+        return page
+
+    def get_vote_series(
+        self, poll_id: int, start: datetime, end: datetime, max_points: int
+    ) -> VoteSeriesModel | None:
+        # the finest resolution that fits max_points and is still kept
+        # back to start, else days
+        name, resolution, step = next(
+            (
+                resolution
+                for resolution in _RESOLUTIONS
+                if (end - start) / resolution[2] <= max_points
+                and start >= self._rollups_kept_since(resolution[1])
+            ),
+            _RESOLUTIONS[-1],
+        )
+        options = self.poll_repository.get_options_for_poll(poll_id=poll_id)
+        if len(options) == 0:
+            return None
+
+        first = _truncate(start, step)
+        buckets = list()
+        bucket = first
+        while bucket < end:
+            buckets.append(bucket)
+            bucket += step
+        series = {option.id: [0] * len(buckets) for option in options}
+        for option_id, bucket, votes in self.vote_repository.get_vote_rollups(
+            poll_id=poll_id, resolution=resolution, start=first, end=end
+        ):
+            series[option_id][(bucket - first) // step] = votes
+
+        return VoteSeriesModel(
+            poll_id=poll_id,
+            resolution=name,
+            buckets=buckets,
+            options=[
+                OptionSeriesModel(
+                    id=option.id, text=option.text, votes=series[option.id]
+                )
+                for option in options
+            ],
+        )
+
+    def prune_vote_rollups(self) -> None:
+        # the bucket holding the cutoff is kept whole, so series that
+        # start at the cutoff still see all of it
+        for _, resolution, step in _RESOLUTIONS:
+            if resolution in self.rollup_retention:
+                self.vote_repository.delete_vote_rollups_before(
+                    resolution=resolution,
+                    before=_truncate(
+                        self._rollups_kept_since(resolution), step
+                    ),
+                )
+
+    def prune_vote_history(self) -> None:
+        self.prune_vote_rollups()
+        if self.change_retention is not None:
+            self.vote_repository.delete_vote_changes_before(
+                before=datetime.now(timezone.utc).replace(tzinfo=None)
+                - self.change_retention
             )
-            poll_models.append(self._to_poll_model(poll, options))
-        return poll_models
+
+    def _rollups_kept_since(self, resolution: str) -> datetime:
+        retention = self.rollup_retention.get(resolution)
+        if retention is None:
+            return datetime.min
+        # naive UTC, like the vote dates
+        return datetime.now(timezone.utc).replace(tzinfo=None) - retention
+
+    def get_option_overlap(self, poll_id: int) -> OptionOverlapModel | None:
+        options = self.poll_repository.get_options_for_poll(poll_id=poll_id)
+        if len(options) == 0:
+            return None
+        voters = [self.voter_index.voters(option.id) for option in options]
+        overlap = [[0] * len(voters) for _ in voters]
+        for i, mine in enumerate(voters):
+            overlap[i][i] = len(mine)
+            for j in range(i + 1, len(voters)):
+                overlap[i][j] = overlap[j][i] = mine.intersection_len(
+                    voters[j]
+                )
+        return OptionOverlapModel(
+            poll_id=poll_id,
+            option_ids=[option.id for option in options],
+            voters=overlap,
+        )
+
+    def get_poll_membership(
+        self, poll_id: int, user_id: int
+    ) -> PollMembershipModel | None:
+        poll = self.get_poll_by_id(poll_id=poll_id)
+        if poll is None:
+            return None
+        option_ids = [
+            option.id
+            for option in poll.options
+            if user_id in self.voter_index.voters(option.id)
+        ]
+        return PollMembershipModel(
+            poll_id=poll_id,
+            user_id=user_id,
+            voted=len(option_ids) > 0,
+            option_ids=None if poll.anonymous_voting else option_ids,
+        )
+
+    def get_poll_statistics(
+        self, poll_ids: list[int]
+    ) -> list[PollStatisticsModel]:
+        # in the requested order, polls without options are left out
+        versions = {
+            poll_id: self.poll_versions.get(poll_id) for poll_id in poll_ids
+        }
+        statistics = self.result_statistics.get(
+            versions,
+            lambda missing: self.vote_repository.get_vote_counts_by_polls(
+                poll_ids=missing
+            ),
+        )
+        return [
+            statistics[poll_id]
+            for poll_id in poll_ids
+            if poll_id in statistics
+        ]
 
     def get_poll_by_id(self, poll_id: int) -> PollModel | None:
-        poll_entity = self.poll_repository.get_poll_by_id(poll_id=poll_id)
+        return self.read_cache.get(
+            ("poll", poll_id),
+            self.poll_versions.get(poll_id),
+            lambda: self._load_poll(poll_id),
+        )
+
+    def get_polls_by_id(self, poll_ids: list[int]) -> dict[int, PollModel]:
+        # get_poll_by_id for many polls sharing its cache entries; the
+        # polls not cached are read in one query
+        polls = self.read_cache.get_many(
+            {
+                ("poll", poll_id): self.poll_versions.get(poll_id)
+                for poll_id in poll_ids
+            },
+            lambda keys: {
+                ("poll", poll.id): poll
+                for poll in self.get_polls(
+                    [poll_id for _, poll_id in keys], with_counts=False
+                )
+            },
+        )
+        return {
+            poll_id: poll
+            for (_, poll_id), poll in polls.items()
+            if poll is not None
+        }
+
+    def get_poll_results(self, poll_id: int) -> PollModel | None:
+        return self.read_cache.get(
+            ("results", poll_id),
+            self.poll_versions.get(poll_id),
+            lambda: self._load_poll_results(poll_id),
+        )
+
+    def _load_poll(self, poll_id: int) -> PollModel | None:
+        poll_entity = self.poll_repository.get_poll_by_id(
+            poll_id=poll_id, load=(joined("options"),)
+        )
         if poll_entity is None:
             return None
-        return self._get_poll(poll_entity)
+        return self._to_poll_model(poll_entity, poll_entity.options)
+
+    def _load_poll_results(self, poll_id: int) -> PollModel | None:
+        poll = self.get_poll_by_id(poll_id=poll_id)
+        if poll is None:
+            return None
+        counts = self.vote_repository.get_vote_counts_by_poll(poll_id=poll_id)
+        # the poll is the cached one, so its results are a copy
+        return replace(
+            poll,
+            options=tuple(
+                replace(option, votes=counts.get(option.id, 0))
+                for option in poll.options
+            ),
+        )
 
     def get_poll_by_tag_userid(
         self, tag: str, user_id: int
     ) -> PollModel | None:
         poll_entity = self.poll_repository.get_poll_by_user_and_tag(
-            tag=tag, user_id=user_id
+            tag=tag, user_id=user_id, load=(joined("options"),)
         )
         if poll_entity is None:
             return None
-        return self._get_poll(poll_entity)
+        return self._to_poll_model(poll_entity, poll_entity.options)
 
     def create_poll(
         self,
@@ -66,16 +370,21 @@ class PollService:
             )
         except DalUniqueViolationException:
             raise PollExistsException(tag=tag, user_id=user_id)
+        except DalForeignKeyViolationException:
+            raise NotFound("user", user_id)
 
         poll = self.get_poll_by_tag_userid(tag=tag, user_id=user_id)
 
         if poll is None:
             raise DatabaseExcetpion("Database error. Please try again")
 
+        self.poll_versions.bump(poll.id)
         return poll
 
     def delete_poll_by_id(self, poll_id, user_id: int) -> None:
-        poll = self.poll_repository.get_poll_by_id(poll_id=poll_id)
+        # the options are only needed to drop them from the voter index
+        load = (joined("options"),) if self.voter_index is not None else ()
+        poll = self.poll_repository.get_poll_by_id(poll_id=poll_id, load=load)
 
         if poll is None:
             raise NotFound("poll", poll_id)
@@ -83,19 +392,115 @@ class PollService:
             raise NotAllowed(f"User {user_id} doesn't own poll {poll_id}")
 
         self.poll_repository.delete_poll(poll_id=poll_id)
+        self.poll_versions.bump(poll_id)
+        if self.voter_index is not None:
+            self.voter_index.remove_options(
+                option.id for option in poll.options
+            )
+
+    def create_vote(self, poll_id: int, option_id: int, user_id: int) -> None:
+        option = self.poll_repository.get_option_by_id(option_id=option_id)
+        if option is None or option.poll_id != poll_id:
+            raise NotFound("option", option_id)
+
+        poll = self.poll_repository.get_poll_by_id(poll_id=poll_id)
+        if poll is None:
+            raise NotFound("poll", poll_id)
+        if not poll.multiple_choice:
+            votes = self.vote_repository.get_votes_by_user_poll(
+                poll_id=poll_id, user_id=user_id
+            )
+            if len(votes) > 0:
+                raise NotAllowed(
+                    f"User {user_id} already voted in poll {poll_id}"
+                )
+
+        try:
+            self.vote_repository.create_vote(
+                option_id=option_id, user_id=user_id
+            )
+        except DalNotFound:
+            raise NotFound("user", user_id)
+        except DalUniqueViolationException:
+            raise NotAllowed(
+                f"User {user_id} already voted for option {option_id}"
+            )
+        self.poll_versions.bump(poll_id)
+        if self.follow_votes:
+            return
+        if self.trending is not None:
+            self.trending.record(poll_id)
+        if self.voter_index is not None:
+            self.voter_index.add(option_id, user_id)
+
+    def apply_new_votes(self) -> int:
+        # feeds votes cast and retracted by any worker to trending and the
+        # voter index, and bumps their polls so cached results and
+        # statistics are redone. The repository hands out only the
+        # changes of finished transactions, so a vote committing behind
+        # a newer one is picked up on a later call instead of skipped
+        position, changes = self.vote_repository.get_vote_changes(
+            since=self._vote_change_position
+        )
+        if self._vote_change_position is None:
+            self._vote_change_position = position
+            return 0
+        for change, _, poll_id, option_id, user_id in changes:
+            if change == "i":
+                if self.trending is not None:
+                    self.trending.record(poll_id)
+                if self.voter_index is not None:
+                    self.voter_index.add(option_id, user_id)
+            elif self.voter_index is None:
+                continue
+            elif poll_id is None:
+                # deleted with its poll, so the option is gone too
+                self.voter_index.remove_options([option_id])
+            else:
+                self.voter_index.discard(option_id, user_id)
+        for poll_id in {change[2] for change in changes} - {None}:
+            self.poll_versions.bump(poll_id)
+        self._vote_change_position = position
+        return len(changes)
 
-    def _get_poll(self, poll_entity: PollEntity) -> PollModel:
-        options = self.poll_repository.get_options_for_poll(
-            poll_id=poll_entity.id
+    def save_voter_index(self) -> None:
+        # the position is only kept current while following, so without
+        # it the file is rebuilt on the next start
+        self.voter_index.save(
+            position=self._vote_change_position if self.follow_votes else None
         )
-        return self._to_poll_model(poll_entity, options)
+
+    def delete_vote(self, vote_id: int, user_id: int) -> None:
+        vote = self.vote_repository.get_vote_by_id(vote_id=vote_id)
+
+        if vote is None:
+            raise NotFound("vote", vote_id)
+        if vote.user_id != user_id:
+            raise NotAllowed(f"User {user_id} doesn't own vote {vote_id}")
+
+        option = self.poll_repository.get_option_by_id(option_id=vote.option_id)
+        self.vote_repository.delete_vote(vote_id=vote_id)
+        if option is not None:
+            self.poll_versions.bump(option.poll_id)
+        if self.voter_index is not None:
+            self.voter_index.discard(vote.option_id, vote.user_id)
+
+    def retract_vote(self, poll_id: int, option_id: int, user_id: int) -> None:
+        votes = self.vote_repository.get_votes_by_user_poll(
+            poll_id=poll_id, user_id=user_id
+        )
+        for vote in votes:
+            if vote.option_id == option_id:
+                self.delete_vote(vote_id=vote.id, user_id=user_id)
+                return
+        raise NotFound("vote", f"{user_id} for option {option_id}")
 
     def _to_poll_model(
         self,
         poll_entity: PollEntity,
         option_entities: list[OptionEntity] | None,
     ) -> PollModel:
-        poll = PollModel(
+        return PollModel(
             id=poll_entity.id,
             user_id=poll_entity.user_id,
             name=poll_entity.name,
@@ -103,12 +508,24 @@ class PollService:
             creation_date=poll_entity.creation_date,
             anonymous_voting=poll_entity.anonymous_voting,
             multiple_choice=poll_entity.multiple_choice,
+            options=tuple(
+                self._to_option_model(opt) for opt in option_entities
+            ),
         )
 
-        poll.options = [self._to_option_model(opt) for opt in option_entities]
-
-        return poll
-
     @staticmethod
     def _to_option_model(option_entity: OptionEntity) -> OptionModel:
-        return OptionModel(id=option_entity.id, text=option_entity.text)
+        return OptionModel(
+            id=option_entity.id,
+            text=option_entity.text,
+            votes=option_entity.votes,
+        )
+
+
+def _truncate(moment: datetime, step: timedelta) -> datetime:
+    moment = moment.replace(second=0, microsecond=0)
+    if step >= timedelta(hours=1):
+        moment = moment.replace(minute=0)
+    if step >= timedelta(days=1):
+        moment = moment.replace(hour=0)
+    return moment
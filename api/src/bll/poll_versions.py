@@ -0,0 +1,17 @@
+import threading
+
+
+class PollVersions:
+    def __init__(self) -> None:
+        self._versions: dict[int, int] = dict()
+        # bumped from the database thread and, on revalidation, the loop
+        self._lock = threading.Lock()
+
+    def get(self, poll_id: int) -> int:
+        return self._versions.get(poll_id, 0)
+
+    def bump(self, poll_id: int) -> int:
+        with self._lock:
+            version = self._versions.get(poll_id, 0) + 1
+            self._versions[poll_id] = version
+        return version
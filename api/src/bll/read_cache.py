@@ -0,0 +1,235 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Hashable
+
+
+@dataclass
+class _Call:
+    done: threading.Event = field(default_factory=threading.Event)
+    value: Any = None
+    error: BaseException | None = None
+
+
+class SingleFlight:
+    # concurrent calls for the same key wait for the first one and share
+    # its result, so a hot key costs one load however many ask for it
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, _Call] = dict()
+
+    def do(self, key: Hashable, load: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = load()
+            return call.value
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def do_many(
+        self,
+        keys: list[Hashable],
+        load_many: Callable[[list[Hashable]], dict[Hashable, Any]],
+    ) -> dict[Hashable, Any]:
+        # the keys nobody is loading yet are loaded in one call, the
+        # others are waited for; keys load_many leaves out map to None
+        led, joined = dict(), dict()
+        with self._lock:
+            for key in keys:
+                call = self._calls.get(key)
+                if call is None:
+                    call = _Call()
+                    self._calls[key] = call
+                    led[key] = call
+                else:
+                    joined[key] = call
+
+        if len(led) > 0:
+            try:
+                values = load_many(list(led))
+                for key, call in led.items():
+                    call.value = values.get(key)
+            except BaseException as error:
+                for call in led.values():
+                    call.error = error
+                raise
+            finally:
+                with self._lock:
+                    for key in led:
+                        del self._calls[key]
+                for call in led.values():
+                    call.done.set()
+
+        results = {key: call.value for key, call in led.items()}
+        for key, call in joined.items():
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            results[key] = call.value
+        return results
+
+
+@dataclass
+class _Entry:
+    value: Any
+    version: int
+    loaded_at: float
+
+
+class ReadCache:
+    # entries are tied to the version they were read at, so local writes
+    # invalidate them at once; the ttl only bounds how long writes from
+    # other workers go unseen. Past the ttl an entry is still served for
+    # stale_s while a single refresh runs on the executor. Values are
+    # handed out as cached, so they must not be modified
+    def __init__(
+        self,
+        ttl_s: float = 0.0,
+        stale_s: float = 0.0,
+        max_entries: int = 10_000,
+        executor: Executor | None = None,
+    ) -> None:
+        self.ttl_s = ttl_s
+        self.stale_s = stale_s
+        self.max_entries = max_entries
+        self._executor = executor
+        self._flight = SingleFlight()
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[Hashable, _Entry] = OrderedDict()
+        self._refreshing: set[Hashable] = set()
+
+    def get(self, key: Hashable, version: int, load: Callable[[], Any]) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.version == version:
+                age = now - entry.loaded_at
+                if age < self.ttl_s + self.stale_s:
+                    self._entries.move_to_end(key)
+                    if age >= self.ttl_s:
+                        self._revalidate(key, version, load)
+                    return entry.value
+        return self._load(key, version, load)
+
+    def get_many(
+        self,
+        versions: dict[Hashable, int],
+        load_many: Callable[[list[Hashable]], dict[Hashable, Any]],
+    ) -> dict[Hashable, Any]:
+        # get for many keys at once, with the ones that miss loaded in a
+        # single call; stale hits are refreshed one key at a time
+        now = time.monotonic()
+        found = dict()
+        with self._lock:
+            for key, version in versions.items():
+                entry = self._entries.get(key)
+                if entry is None or entry.version != version:
+                    continue
+                age = now - entry.loaded_at
+                if age < self.ttl_s + self.stale_s:
+                    self._entries.move_to_end(key)
+                    if age >= self.ttl_s:
+                        self._revalidate(
+                            key,
+                            version,
+                            lambda key=key: load_many([key]).get(key),
+                        )
+                    found[key] = entry.value
+
+        missing = [key for key in versions if key not in found]
+        if len(missing) > 0:
+            loaded = self._load_many(
+                {key: versions[key] for key in missing}, load_many
+            )
+            found.update(loaded)
+        return found
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def _load(
+        self, key: Hashable, version: int, load: Callable[[], Any]
+    ) -> Any:
+        def load_and_store() -> Any:
+            value = load()
+            if self.ttl_s + self.stale_s > 0:
+                self._store(key, _Entry(value, version, time.monotonic()))
+            return value
+
+        return self._flight.do((key, version), load_and_store)
+
+    def _load_many(
+        self,
+        versions: dict[Hashable, int],
+        load_many: Callable[[list[Hashable]], dict[Hashable, Any]],
+    ) -> dict[Hashable, Any]:
+        # flights are keyed like those of _load, so single gets and
+        # batches of the same key share one load
+        def load_and_store(flights: list[Hashable]) -> dict[Hashable, Any]:
+            values = load_many([key for key, _ in flights])
+            loaded_at = time.monotonic()
+            if self.ttl_s + self.stale_s > 0:
+                for key, version in flights:
+                    self._store(
+                        key, _Entry(values.get(key), version, loaded_at)
+                    )
+            return {flight: values.get(flight[0]) for flight in flights}
+
+        values = self._flight.do_many(
+            list(versions.items()), load_and_store
+        )
+        return {
+            key: values[(key, version)] for key, version in versions.items()
+        }
+
+    def _store(self, key: Hashable, entry: _Entry) -> None:
+        with self._lock:
+            current = self._entries.get(key)
+            if current is not None and current.version > entry.version:
+                return
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _revalidate(
+        self, key: Hashable, version: int, load: Callable[[], Any]
+    ) -> None:
+        # called with the lock held
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1)
+
+        def refresh() -> None:
+            try:
+                self._load(key, version, load)
+            except BaseException:
+                # the stale entry keeps being served until it expires
+                pass
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        self._executor.submit(refresh)
@@ -0,0 +1,144 @@
+import threading
+from collections import OrderedDict
+from typing import Callable
+
+import numpy as np
+
+from src.bll.bll_models import OptionStatisticsModel, PollStatisticsModel
+
+# simulated votes held in memory at once, in draws x polls x options
+_MAX_SAMPLES = 1 << 22
+
+
+class ResultStatistics:
+    # statistics are kept per poll version, so a poll is only computed
+    # again after a vote changes it; polls that are missing are computed
+    # together in one pass
+    def __init__(
+        self,
+        z: float = 1.96,
+        draws: int = 2_000,
+        max_entries: int = 10_000,
+        seed: int | None = None,
+    ) -> None:
+        self.z = z
+        self.draws = draws
+        self.max_entries = max_entries
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[int, tuple[int, PollStatisticsModel]] = (
+            OrderedDict()
+        )
+
+    def get(
+        self,
+        versions: dict[int, int],
+        load_tallies: Callable[[list[int]], dict[int, dict[int, int]]],
+    ) -> dict[int, PollStatisticsModel]:
+        # load_tallies maps poll ids to their votes per option id; polls
+        # without options are left out of the result
+        found = dict()
+        with self._lock:
+            for poll_id, version in versions.items():
+                entry = self._entries.get(poll_id)
+                if entry is not None and entry[0] == version:
+                    self._entries.move_to_end(poll_id)
+                    found[poll_id] = entry[1]
+        missing = [poll_id for poll_id in versions if poll_id not in found]
+        if len(missing) == 0:
+            return found
+
+        computed = self.compute(load_tallies(missing))
+        with self._lock:
+            for poll_id, statistics in computed.items():
+                self._entries[poll_id] = (versions[poll_id], statistics)
+                self._entries.move_to_end(poll_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return found | computed
+
+    def compute(
+        self, tallies: dict[int, dict[int, int]]
+    ) -> dict[int, PollStatisticsModel]:
+        poll_ids = [poll_id for poll_id in tallies if len(tallies[poll_id])]
+        if len(poll_ids) == 0:
+            return dict()
+        width = max(len(tallies[poll_id]) for poll_id in poll_ids)
+        counts = np.zeros((len(poll_ids), width), np.int64)
+        present = np.zeros((len(poll_ids), width), bool)
+        for row, poll_id in enumerate(poll_ids):
+            votes = list(tallies[poll_id].values())
+            counts[row, : len(votes)] = votes
+            present[row, : len(votes)] = True
+
+        totals = counts.sum(axis=1)
+        shares, lower, upper, margins = wilson_intervals(counts, self.z)
+        win_probabilities = self.winner_probabilities(counts, present)
+
+        statistics = dict()
+        for row, poll_id in enumerate(poll_ids):
+            statistics[poll_id] = PollStatisticsModel(
+                poll_id=poll_id,
+                votes=int(totals[row]),
+                options=[
+                    OptionStatisticsModel(
+                        id=option_id,
+                        votes=int(counts[row, column]),
+                        share=float(shares[row, column]),
+                        lower=float(lower[row, column]),
+                        upper=float(upper[row, column]),
+                        margin_of_error=float(margins[row, column]),
+                        win_probability=float(win_probabilities[row, column]),
+                    )
+                    for column, option_id in enumerate(tallies[poll_id])
+                ],
+            )
+        return statistics
+
+    def winner_probabilities(
+        self, counts: np.ndarray, present: np.ndarray
+    ) -> np.ndarray:
+        # share of simulated elections each option wins, re-drawing each
+        # poll's votes from its observed shares; ties split the win
+        polls, width = counts.shape
+        totals = counts.sum(axis=1)
+        # the last column takes the probability left over by rounding
+        shares = np.zeros((polls, width + 1))
+        shares[:, :width] = counts / np.maximum(totals, 1)[:, None]
+
+        wins = np.zeros((polls, width))
+        step = max(1, _MAX_SAMPLES // (self.draws * (width + 1)))
+        for start in range(0, polls, step):
+            end = min(start + step, polls)
+            samples = self._rng.multinomial(
+                totals[start:end],
+                shares[start:end],
+                size=(self.draws, end - start),
+            )[..., :width]
+            samples = np.where(present[start:end], samples, -1)
+            winners = samples == samples.max(axis=2, keepdims=True)
+            wins[start:end] = (
+                winners / winners.sum(axis=2, keepdims=True)
+            ).mean(axis=0)
+        return wins
+
+
+def wilson_intervals(
+    counts: np.ndarray, z: float
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    # rows are polls and columns their options; returns the shares, the
+    # bounds of the Wilson score interval and the normal approximation's
+    # margin of error. Polls without votes get the whole range
+    totals = counts.sum(axis=1, keepdims=True).astype(float)
+    voted = totals > 0
+    n = np.where(voted, totals, 1)
+    shares = counts / n
+    z2 = z * z
+    denominator = 1 + z2 / n
+    center = (shares + z2 / (2 * n)) / denominator
+    half = z * np.sqrt(shares * (1 - shares) / n + z2 / (4 * n * n))
+    half /= denominator
+    lower = np.where(voted, np.clip(center - half, 0, 1), 0)
+    upper = np.where(voted, np.clip(center + half, 0, 1), 1)
+    margins = np.where(voted, z * np.sqrt(shares * (1 - shares) / n), 1)
+    return shares, lower, upper, margins
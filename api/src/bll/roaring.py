@@ -0,0 +1,243 @@
+import struct
+from array import array
+from bisect import bisect_left
+from typing import Iterable, Iterator
+
+# values are split by their high 16 bits into containers of up to 65536
+# low values; sparse containers are sorted arrays, dense ones are ints
+# used as 65536-bit sets, whose &, | and bit_count run in C
+_ARRAY_MAX = 4096
+_BITMAP_BYTES = 1 << 13
+_HEADER = struct.Struct("<4sI")
+_ENTRY = struct.Struct("<HBxI")
+_MAGIC = b"RBM1"
+_ARRAY = 0
+_BITMAP = 1
+
+Container = array | int
+
+
+class RoaringBitmap:
+    def __init__(self, values: Iterable[int] = ()) -> None:
+        self._containers: dict[int, Container] = dict()
+        for value in values:
+            self.add(value)
+
+    @classmethod
+    def from_sorted(cls, values: Iterable[int]) -> "RoaringBitmap":
+        bitmap = cls()
+        key, low_values = None, array("H")
+        for value in values:
+            if value >> 16 != key:
+                bitmap._put(key, low_values)
+                key, low_values = value >> 16, array("H")
+            low = value & 0xFFFF
+            if len(low_values) == 0 or low_values[-1] != low:
+                low_values.append(low)
+        bitmap._put(key, low_values)
+        return bitmap
+
+    def add(self, value: int) -> None:
+        key, low = value >> 16, value & 0xFFFF
+        container = self._containers.get(key)
+        if container is None:
+            self._containers[key] = array("H", (low,))
+        elif isinstance(container, int):
+            self._containers[key] = container | (1 << low)
+        else:
+            index = bisect_left(container, low)
+            if index < len(container) and container[index] == low:
+                return
+            if len(container) < _ARRAY_MAX:
+                container.insert(index, low)
+            else:
+                self._containers[key] = _to_bits(container) | (1 << low)
+
+    def discard(self, value: int) -> None:
+        key, low = value >> 16, value & 0xFFFF
+        container = self._containers.get(key)
+        if container is None:
+            return
+        if isinstance(container, int):
+            container &= ~(1 << low)
+            # half the array limit, so a container at the limit does not
+            # flip back and forth
+            if container.bit_count() < _ARRAY_MAX // 2:
+                container = _to_array(container)
+            self._containers[key] = container
+        else:
+            index = bisect_left(container, low)
+            if index < len(container) and container[index] == low:
+                del container[index]
+        if _cardinality(self._containers[key]) == 0:
+            del self._containers[key]
+
+    def __contains__(self, value: int) -> bool:
+        container = self._containers.get(value >> 16)
+        if container is None:
+            return False
+        low = value & 0xFFFF
+        if isinstance(container, int):
+            return container >> low & 1 == 1
+        index = bisect_left(container, low)
+        return index < len(container) and container[index] == low
+
+    def __len__(self) -> int:
+        return sum(map(_cardinality, self._containers.values()))
+
+    def __iter__(self) -> Iterator[int]:
+        for key in sorted(self._containers):
+            container = self._containers[key]
+            if isinstance(container, int):
+                container = _to_array(container)
+            high = key << 16
+            for low in container:
+                yield high | low
+
+    def __and__(self, other: "RoaringBitmap") -> "RoaringBitmap":
+        result = RoaringBitmap()
+        for key in self._containers.keys() & other._containers.keys():
+            result._put(
+                key, _and(self._containers[key], other._containers[key])
+            )
+        return result
+
+    def __or__(self, other: "RoaringBitmap") -> "RoaringBitmap":
+        result = RoaringBitmap()
+        for key in self._containers.keys() | other._containers.keys():
+            mine = self._containers.get(key)
+            theirs = other._containers.get(key)
+            if mine is None or theirs is None:
+                result._put(key, _copy(theirs if mine is None else mine))
+            else:
+                result._put(key, _or(mine, theirs))
+        return result
+
+    def intersection_len(self, other: "RoaringBitmap") -> int:
+        # counts without building the intersection
+        count = 0
+        for key in self._containers.keys() & other._containers.keys():
+            mine, theirs = self._containers[key], other._containers[key]
+            if isinstance(mine, int) and isinstance(theirs, int):
+                count += (mine & theirs).bit_count()
+            elif isinstance(mine, int) or isinstance(theirs, int):
+                bits, values = (
+                    (mine, theirs) if isinstance(mine, int) else (theirs, mine)
+                )
+                count += sum(bits >> low & 1 for low in values)
+            else:
+                count += len(set(mine).intersection(theirs))
+        return count
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, RoaringBitmap):
+            return NotImplemented
+        return list(self) == list(other)
+
+    def to_bytes(self) -> bytes:
+        keys = sorted(self._containers)
+        parts = [_HEADER.pack(_MAGIC, len(keys))]
+        payloads = list()
+        for key in keys:
+            container = self._containers[key]
+            if isinstance(container, int):
+                parts.append(_ENTRY.pack(key, _BITMAP, container.bit_count()))
+                payloads.append(container.to_bytes(_BITMAP_BYTES, "little"))
+            else:
+                parts.append(_ENTRY.pack(key, _ARRAY, len(container)))
+                payloads.append(_le_array(container).tobytes())
+        return b"".join(parts + payloads)
+
+    @classmethod
+    def from_buffer(cls, buffer) -> "RoaringBitmap":
+        # reads from any buffer, such as a slice of a memory-mapped file;
+        # decoding is a copy per container
+        view = memoryview(buffer)
+        magic, count = _HEADER.unpack_from(view)
+        if magic != _MAGIC:
+            raise ValueError("Not a roaring bitmap")
+        bitmap = cls()
+        offset = _HEADER.size + count * _ENTRY.size
+        for index in range(count):
+            key, kind, cardinality = _ENTRY.unpack_from(
+                view, _HEADER.size + index * _ENTRY.size
+            )
+            if kind == _BITMAP:
+                end = offset + _BITMAP_BYTES
+                bitmap._containers[key] = int.from_bytes(
+                    view[offset:end], "little"
+                )
+            else:
+                end = offset + 2 * cardinality
+                container = array("H")
+                container.frombytes(view[offset:end])
+                bitmap._containers[key] = _le_array(container)
+            offset = end
+        return bitmap
+
+    def _put(self, key: int | None, container: Container | None) -> None:
+        if key is None or container is None or _cardinality(container) == 0:
+            return
+        if not isinstance(container, int) and len(container) > _ARRAY_MAX:
+            container = _to_bits(container)
+        elif isinstance(container, int) and container.bit_count() <= (
+            _ARRAY_MAX
+        ):
+            container = _to_array(container)
+        self._containers[key] = container
+
+
+def _cardinality(container: Container) -> int:
+    if isinstance(container, int):
+        return container.bit_count()
+    return len(container)
+
+
+def _and(mine: Container, theirs: Container) -> Container:
+    if isinstance(mine, int) and isinstance(theirs, int):
+        return mine & theirs
+    if isinstance(mine, int) or isinstance(theirs, int):
+        bits, values = (
+            (mine, theirs) if isinstance(mine, int) else (theirs, mine)
+        )
+        return array("H", (low for low in values if bits >> low & 1))
+    return array("H", sorted(set(mine).intersection(theirs)))
+
+
+def _or(mine: Container, theirs: Container) -> Container:
+    if isinstance(mine, int) or isinstance(theirs, int):
+        return _as_bits(mine) | _as_bits(theirs)
+    return array("H", sorted(set(mine).union(theirs)))
+
+
+def _copy(container: Container) -> Container:
+    return container if isinstance(container, int) else array("H", container)
+
+
+def _as_bits(container: Container) -> int:
+    return container if isinstance(container, int) else _to_bits(container)
+
+
+def _to_bits(values: array) -> int:
+    bits = bytearray(_BITMAP_BYTES)
+    for low in values:
+        bits[low >> 3] |= 1 << (low & 7)
+    return int.from_bytes(bits, "little")
+
+
+def _to_array(bits: int) -> array:
+    values = array("H")
+    for index, byte in enumerate(bits.to_bytes(_BITMAP_BYTES, "little")):
+        if byte:
+            base = index << 3
+            values.extend(base + bit for bit in range(8) if byte >> bit & 1)
+    return values
+
+
+def _le_array(values: array) -> array:
+    # the file format is little-endian whatever the machine is
+    if struct.pack("=H", 1) == struct.pack("<H", 1):
+        return values
+    swapped = array("H", values)
+    swapped.byteswap()
+    return swapped
@@ -0,0 +1,133 @@
+import heapq
+import math
+import random
+import threading
+import time
+from array import array
+
+_PRIME = (1 << 61) - 1
+
+
+class CountMinSketch:
+    # estimates never undercount; they overcount by at most e / width of
+    # the total weight, except with probability e ** -depth
+    def __init__(self, width: int, depth: int, seed: int = 0) -> None:
+        self.width = width
+        self.depth = depth
+        rng = random.Random(seed)
+        self._hashes = [
+            (rng.randrange(1, _PRIME), rng.randrange(_PRIME))
+            for _ in range(depth)
+        ]
+        self._rows = [array("d", bytes(8 * width)) for _ in range(depth)]
+
+    def add(self, key: int, weight: float) -> float:
+        estimate = math.inf
+        for row, index in zip(self._rows, self._indexes(key)):
+            row[index] += weight
+            estimate = min(estimate, row[index])
+        return estimate
+
+    def estimate(self, key: int) -> float:
+        return min(
+            row[index] for row, index in zip(self._rows, self._indexes(key))
+        )
+
+    def scale(self, factor: float) -> None:
+        for row in self._rows:
+            for index in range(self.width):
+                row[index] *= factor
+
+    def _indexes(self, key: int) -> list[int]:
+        return [(a * key + b) % _PRIME % self.width for a, b in self._hashes]
+
+
+class TrendingPolls:
+    # counts decay exponentially with the given half-life, so a count
+    # divided by the time constant is the recent vote rate. Decay is
+    # applied forward: each vote weighs more the later it arrives,
+    # which keeps the relative order of stored counts fixed over time,
+    # so the top-k heap never needs re-scoring
+    def __init__(
+        self,
+        half_life_s: float = 600,
+        top_k: int = 100,
+        width: int = 2048,
+        depth: int = 4,
+        snapshot_interval_s: float = 5,
+        seed: int = 0,
+    ) -> None:
+        self.tau_s = half_life_s / math.log(2)
+        self.top_k = top_k
+        self.snapshot_interval_s = snapshot_interval_s
+        self._sketch = CountMinSketch(width, depth, seed)
+        self._landmark: float | None = None
+        self._scores: dict[int, float] = dict()
+        self._heap: list[tuple[float, int]] = list()
+        self._snapshot: list[tuple[int, float]] = list()
+        self._snapshot_at = -math.inf
+        self._lock = threading.Lock()
+
+    def record(self, poll_id: int, now: float | None = None) -> None:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self._landmark is None:
+                self._landmark = now
+            exponent = (now - self._landmark) / self.tau_s
+            if exponent > 50:
+                self._rescale(now)
+                exponent = 0
+            estimate = self._sketch.add(poll_id, math.exp(exponent))
+            self._offer(poll_id, estimate)
+
+    def trending(
+        self, limit: int, now: float | None = None
+    ) -> list[tuple[int, float]]:
+        # (poll id, votes per second), refreshed at most once an interval
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self._landmark is None:
+                return []
+            if now - self._snapshot_at >= self.snapshot_interval_s:
+                decay = math.exp(-(now - self._landmark) / self.tau_s)
+                self._snapshot = sorted(
+                    (
+                        (poll_id, score * decay / self.tau_s)
+                        for poll_id, score in self._scores.items()
+                    ),
+                    key=lambda item: (-item[1], item[0]),
+                )
+                self._snapshot_at = now
+            return self._snapshot[:limit]
+
+    def _offer(self, poll_id: int, estimate: float) -> None:
+        if poll_id in self._scores or len(self._scores) < self.top_k:
+            self._scores[poll_id] = estimate
+            heapq.heappush(self._heap, (estimate, poll_id))
+        elif estimate > self._min_score():
+            _, evicted = heapq.heappop(self._heap)
+            del self._scores[evicted]
+            self._scores[poll_id] = estimate
+            heapq.heappush(self._heap, (estimate, poll_id))
+        # updated scores leave their old entries behind
+        if len(self._heap) > 4 * self.top_k:
+            self._rebuild_heap()
+
+    def _min_score(self) -> float:
+        # drops outdated entries until the smallest one is current
+        while self._heap[0][0] != self._scores.get(self._heap[0][1]):
+            heapq.heappop(self._heap)
+        return self._heap[0][0]
+
+    def _rebuild_heap(self) -> None:
+        self._heap = [(score, key) for key, score in self._scores.items()]
+        heapq.heapify(self._heap)
+
+    def _rescale(self, now: float) -> None:
+        factor = math.exp(-(now - self._landmark) / self.tau_s)
+        self._sketch.scale(factor)
+        self._scores = {
+            key: score * factor for key, score in self._scores.items()
+        }
+        self._rebuild_heap()
+        self._landmark = now
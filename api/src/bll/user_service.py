@@ -11,11 +11,19 @@ from .bll_exceptions import (
     WrongCredentialsException,
 )
 from .bll_models import UserModel
+from .read_cache import ReadCache
+from src.tracing import traced
 
 
+@traced
 class UserService:
-    def __init__(self, user_repository: UserRepository):
+    def __init__(
+        self,
+        user_repository: UserRepository,
+        read_cache: ReadCache | None = None,
+    ):
         self._user_repository = user_repository
+        self._read_cache = read_cache or ReadCache()
 
     def create_user(self, name: str, password: str) -> UserModel:
         try:
@@ -33,6 +41,11 @@ class UserService:
             raise UserExistsException(name)
 
     def get_user(self, identifier: str | int) -> UserModel | None:
+        return self._read_cache.get(
+            ("user", identifier), 0, lambda: self._load_user(identifier)
+        )
+
+    def _load_user(self, identifier: str | int) -> UserModel | None:
         if isinstance(identifier, int):
             user = self._user_repository.get_user_by_id(user_id=identifier)
         else:
@@ -48,6 +61,7 @@ class UserService:
     def delete_user(self, user_id: int, password: str) -> None:
         self._validate_password(password=password, user_id=user_id)
         self._user_repository.delete_user(user_id=user_id)
+        self._forget_user(user_id)
         return None
 
     def change_password(
@@ -65,8 +79,10 @@ class UserService:
         user = self._user_repository.get_user_by_id(user_id)
         self._ensure_found(user, user_id)
         self._validate_password(password=user_password, user_id=user_id)
+        old_name = user.name
         user.name = new_username
         self._user_repository.update_user(user=user)
+        self._forget_user(user_id, old_name)
 
     def _validate_password(self, password: str, user_id: int | str):
         if isinstance(user_id, int):
@@ -82,6 +98,11 @@ class UserService:
         self._validate_password(password=user_password, user_id=user_id)
         return self.get_user(user_id)
 
+    def _forget_user(self, user_id: int, name: str | None = None) -> None:
+        self._read_cache.invalidate(("user", user_id))
+        if name is not None:
+            self._read_cache.invalidate(("user", name))
+
     @staticmethod
     def _ensure_found(
         user_entity: UserEntity | None, identifier: int | None = None
@@ -0,0 +1,172 @@
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Iterable
+
+from src.bll.roaring import RoaringBitmap
+
+_HEADER = struct.Struct("<4sIqd")
+_ENTRY = struct.Struct("<qQQ")
+_MAGIC = b"VIX2"
+
+
+class VoterIndex:
+    # one bitmap of user ids per option. The file holds a directory of
+    # offsets followed by the serialized bitmaps and is memory-mapped, so
+    # only the options that are read get decoded. Its header records the
+    # vote change position the bitmaps are current to, so a worker
+    # loading it follows the vote changes from there
+    def __init__(
+        self, path: str | None = None, max_age_s: float | None = None
+    ) -> None:
+        self.path = path
+        self.position: int | None = None
+        self._bitmaps: dict[int, RoaringBitmap] = dict()
+        self._mapped: dict[int, tuple[int, int]] = dict()
+        self._map: mmap.mmap | None = None
+        self._lock = threading.Lock()
+        # updates made while a build reads votes, replayed onto its result
+        self._pending: list[tuple[str, int, int]] | None = None
+        if path is not None and os.path.exists(path):
+            # workers sharing the path all read the file and each swaps in
+            # its own on save. One saved without a position, in another
+            # format or longer ago than the changes are kept cannot be
+            # brought up to date, and is rebuilt instead
+            with open(path, "rb") as file:
+                header = file.read(_HEADER.size)
+            if _is_current(header, max_age_s):
+                self._open_map(path)
+                self.position = _HEADER.unpack(header)[2]
+
+    @property
+    def loaded(self) -> bool:
+        return self._map is not None or len(self._bitmaps) > 0
+
+    def build(self, option_voters: Iterable[tuple[int, int]]) -> None:
+        # option_voters must be ordered by option id, then user id
+        with self._lock:
+            self._pending = list()
+        bitmaps = dict()
+        current, user_ids = None, list()
+        for option_id, user_id in option_voters:
+            if option_id != current:
+                if current is not None:
+                    bitmaps[current] = RoaringBitmap.from_sorted(user_ids)
+                current, user_ids = option_id, list()
+            user_ids.append(user_id)
+        if current is not None:
+            bitmaps[current] = RoaringBitmap.from_sorted(user_ids)
+
+        with self._lock:
+            self._bitmaps = bitmaps
+            self._mapped = dict()
+            pending, self._pending = self._pending, None
+            for change, option_id, user_id in pending:
+                self._apply(change, option_id, user_id)
+
+    def add(self, option_id: int, user_id: int) -> None:
+        with self._lock:
+            self._apply("add", option_id, user_id)
+
+    def discard(self, option_id: int, user_id: int) -> None:
+        with self._lock:
+            self._apply("discard", option_id, user_id)
+
+    def remove_options(self, option_ids: Iterable[int]) -> None:
+        with self._lock:
+            for option_id in option_ids:
+                self._apply("remove", option_id, 0)
+
+    def voters(self, option_id: int) -> RoaringBitmap:
+        with self._lock:
+            return self._bitmap(option_id)
+
+    def save(self, position: int | None = None) -> None:
+        # written to a file of this process's own and mapped before it is
+        # swapped in, so neither readers of the old file nor workers
+        # saving at the same time are cut off mid-read
+        with self._lock:
+            for option_id in list(self._mapped):
+                self._bitmap(option_id)
+            option_ids = sorted(self._bitmaps)
+            blobs = [self._bitmaps[key].to_bytes() for key in option_ids]
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as file:
+                file.write(
+                    _HEADER.pack(
+                        _MAGIC,
+                        len(option_ids),
+                        -1 if position is None else position,
+                        time.time(),
+                    )
+                )
+                offset = _HEADER.size + len(option_ids) * _ENTRY.size
+                for option_id, blob in zip(option_ids, blobs):
+                    file.write(_ENTRY.pack(option_id, offset, len(blob)))
+                    offset += len(blob)
+                for blob in blobs:
+                    file.write(blob)
+                file.flush()
+                os.fsync(file.fileno())
+            self._close_map()
+            self._open_map(tmp_path)
+            os.replace(tmp_path, self.path)
+            self._bitmaps = dict()
+            self.position = position
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_map()
+
+    def _bitmap(self, option_id: int) -> RoaringBitmap:
+        bitmap = self._bitmaps.get(option_id)
+        if bitmap is not None:
+            return bitmap
+        location = self._mapped.pop(option_id, None)
+        if location is None:
+            bitmap = RoaringBitmap()
+        else:
+            offset, length = location
+            bitmap = RoaringBitmap.from_buffer(
+                memoryview(self._map)[offset : offset + length]
+            )
+        self._bitmaps[option_id] = bitmap
+        return bitmap
+
+    def _apply(self, change: str, option_id: int, user_id: int) -> None:
+        if self._pending is not None:
+            self._pending.append((change, option_id, user_id))
+        if change == "remove":
+            self._bitmaps.pop(option_id, None)
+            self._mapped.pop(option_id, None)
+        elif change == "add":
+            self._bitmap(option_id).add(user_id)
+        else:
+            self._bitmap(option_id).discard(user_id)
+
+    def _open_map(self, path: str) -> None:
+        with open(path, "rb") as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        _, count, _, _ = _HEADER.unpack_from(self._map)
+        self._mapped = dict()
+        for index in range(count):
+            option_id, offset, length = _ENTRY.unpack_from(
+                self._map, _HEADER.size + index * _ENTRY.size
+            )
+            self._mapped[option_id] = (offset, length)
+
+    def _close_map(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+
+def _is_current(header: bytes, max_age_s: float | None) -> bool:
+    if len(header) < _HEADER.size or header[:4] != _MAGIC:
+        return False
+    _, _, position, saved_at = _HEADER.unpack(header)
+    if max_age_s is not None and time.time() - saved_at > max_age_s:
+        return False
+    return position >= 0
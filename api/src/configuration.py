@@ -1,21 +1,106 @@
 import os
+from typing import Any, Callable
 
-from dotenv import load_dotenv
+# settings are resolved on first access, so importing this module neither
+# reads .env nor fails on missing variables
 
-load_dotenv()
+
+def load_env() -> None:
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        _env_loaded = True
 
 
 def get_required_env(var_name: str) -> str:
-    value = os.getenv(var_name)
+    value = get_env(var_name)
     if value is None:
         raise EnvironmentError(f"Required env var is missing: {var_name}")
     return value
 
 
-DB_HOST = os.getenv("DB_HOST", "localhost")
-DB_PORT = os.getenv("DB_PORT", "5432")
-DB_NAME = get_required_env("DB_NAME")
-DB_USER = get_required_env("DB_USER")
-DB_PASSWORD = os.getenv("DB_PASSWORD", None)
-PW_SALT = os.getenv("PW_SALT", "default_password_salt")
-APP_SECRET_KEY = bytes(get_required_env("APP_SECRET_KEY"), "utf-8")
+def get_env(var_name: str, default: str | None = None) -> str | None:
+    load_env()
+    return os.getenv(var_name, default)
+
+
+_env_loaded = False
+_SETTINGS: dict[str, Callable[[], Any]] = {
+    "DB_HOST": lambda: get_env("DB_HOST", "localhost"),
+    "DB_PORT": lambda: get_env("DB_PORT", "5432"),
+    "DB_NAME": lambda: get_required_env("DB_NAME"),
+    "DB_USER": lambda: get_required_env("DB_USER"),
+    "DB_PASSWORD": lambda: get_env("DB_PASSWORD", None),
+    "PW_SALT": lambda: get_env("PW_SALT", "default_password_salt"),
+    "APP_SECRET_KEY": lambda: bytes(
+        get_required_env("APP_SECRET_KEY"), "utf-8"
+    ),
+    "BULK_LIST_SERIALIZATION": lambda: (
+        get_env("BULK_LIST_SERIALIZATION", "false").lower() == "true"
+    ),
+    "POLL_CACHE_MAX_BYTES": lambda: int(
+        get_env("POLL_CACHE_MAX_BYTES", str(64 << 20))
+    ),
+    "POLL_READ_TTL_MS": lambda: int(get_env("POLL_READ_TTL_MS", "1000")),
+    "POLL_READ_STALE_MS": lambda: int(get_env("POLL_READ_STALE_MS", "5000")),
+    "BATCH_LOADER_MAX_SIZE": lambda: int(
+        get_env("BATCH_LOADER_MAX_SIZE", "100")
+    ),
+    "BATCH_LOADER_WINDOW_US": lambda: int(
+        get_env("BATCH_LOADER_WINDOW_US", "0")
+    ),
+    "TRENDING_HALF_LIFE_S": lambda: float(
+        get_env("TRENDING_HALF_LIFE_S", "600")
+    ),
+    "TRENDING_TOP_K": lambda: int(get_env("TRENDING_TOP_K", "100")),
+    "ANALYTICS_CACHE_TTL_MS": lambda: int(
+        get_env("ANALYTICS_CACHE_TTL_MS", "60000")
+    ),
+    "RESULT_STATS_DRAWS": lambda: int(get_env("RESULT_STATS_DRAWS", "2000")),
+    "VOTER_INDEX_PATH": lambda: get_env("VOTER_INDEX_PATH", None),
+    "VOTE_FEED_INTERVAL_MS": lambda: int(
+        get_env("VOTE_FEED_INTERVAL_MS", "1000")
+    ),
+    "VOTE_ROLLUP_MINUTE_DAYS": lambda: float(
+        get_env("VOTE_ROLLUP_MINUTE_DAYS", "2")
+    ),
+    "VOTE_ROLLUP_HOUR_DAYS": lambda: float(
+        get_env("VOTE_ROLLUP_HOUR_DAYS", "90")
+    ),
+    "VOTE_CHANGE_RETENTION_MIN": lambda: float(
+        get_env("VOTE_CHANGE_RETENTION_MIN", "60")
+    ),
+    "VOTE_ROLLUP_PRUNE_INTERVAL_S": lambda: float(
+        get_env("VOTE_ROLLUP_PRUNE_INTERVAL_S", "3600")
+    ),
+    "SLOW_QUERY_MS": lambda: float(get_env("SLOW_QUERY_MS", "200")),
+    "SLOW_QUERY_EXPLAIN": lambda: (
+        get_env("SLOW_QUERY_EXPLAIN", "true").lower() == "true"
+    ),
+    "SLOW_QUERY_LOG_SIZE": lambda: int(get_env("SLOW_QUERY_LOG_SIZE", "100")),
+    "ADMIN_TOKEN": lambda: get_env("ADMIN_TOKEN", None),
+    "TRACE_SAMPLE_RATE": lambda: float(get_env("TRACE_SAMPLE_RATE", "0.01")),
+    "TRACE_FILE": lambda: get_env("TRACE_FILE", None),
+    "TRACE_OTLP_ENDPOINT": lambda: get_env("TRACE_OTLP_ENDPOINT", None),
+    "RATE_LIMITS": lambda: get_env("RATE_LIMITS", ""),
+    "RATE_LIMIT_SHARED_PATH": lambda: get_env("RATE_LIMIT_SHARED_PATH", None),
+    "ADMISSION_LIMIT": lambda: int(get_env("ADMISSION_LIMIT", "4")),
+    "ADMISSION_MAX_QUEUE": lambda: int(get_env("ADMISSION_MAX_QUEUE", "64")),
+    "ADMISSION_ALGORITHM": lambda: get_env("ADMISSION_ALGORITHM", "aimd"),
+    "ADMISSION_DEFAULT_TIMEOUT_MS": lambda: int(
+        get_env("ADMISSION_DEFAULT_TIMEOUT_MS", "2000")
+    ),
+    "ADMISSION_MAX_TIMEOUT_MS": lambda: int(
+        get_env("ADMISSION_MAX_TIMEOUT_MS", "10000")
+    ),
+}
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _SETTINGS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = _SETTINGS[name]()
+    globals()[name] = value
+    return value
@@ -1,5 +1,15 @@
-from .exceptions import NotFoundException
+from .exceptions import NotFoundException, DalDeadlineExceeded
 from .in_memory_user_repository import InMemoryUserRepository
-from .repositories import UserRepository, PollRepository, VoteRepository
-from .dal_entities import UserEntity, PollEntity, VoteEntity
-from .init_db import ensure_exists
+from .in_memory_poll_repository import InMemoryPollRepository
+from .in_memory_vote_repository import InMemoryVoteRepository
+from .repositories import (
+    UserRepository,
+    PollRepository,
+    VoteRepository,
+    TimedCursor,
+)
+from .dal_entities import UserEntity, PollEntity, VoteEntity, PollSearchHit, PollVoteTotal
+from .loading import LoadOption, LazyList, selectin, joined, lazy
+from .init_db import ensure_exists, prepare_schema
+from .journal import Journal
+from .slow_query_log import SlowQueryLog, SlowQuery
@@ -1,3 +1,4 @@
+from collections.abc import Sequence
 from dataclasses import dataclass
 from datetime import datetime
 
@@ -15,6 +16,7 @@ class OptionEntity:
     id: int
     poll_id: int
     text: str
+    votes: int | None = None
 
 
 @dataclass
@@ -26,7 +28,8 @@ class PollEntity:
     creation_date: datetime
     anonymous_voting: bool
     multiple_choice: bool
-    options: list[OptionEntity] | None = None
+    # None until loaded, see loading.py
+    options: Sequence[OptionEntity] | None = None
 
 
 @dataclass
@@ -34,4 +37,18 @@ class UserEntity:
     id: int
     name: str
     password_hash: str
-    created_polls: list[PollEntity] | None = None
+    created_polls: Sequence[PollEntity] | None = None
+
+
+@dataclass
+class PollVoteTotal:
+    poll_id: int
+    name: str
+    tag: str
+    votes: int
+
+
+@dataclass
+class PollSearchHit:
+    poll: PollEntity
+    rank: float
@@ -32,3 +32,9 @@ class DalNotFound(BaseException):
     ):
         self.msg = f"Not found: {table_name}:{columnn_name}:{identifier}"
         super().__init__(self.msg)
+
+
+class DalDeadlineExceeded(BaseException):
+    def __init__(self, method: str):
+        self.msg = f"Deadline exceeded before {method} finished"
+        super().__init__(self.msg)
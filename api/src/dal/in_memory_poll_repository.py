@@ -0,0 +1,254 @@
+import dataclasses
+from datetime import datetime
+from typing import Callable, Iterable, Iterator, Sequence
+
+from .dal_entities import PollEntity, OptionEntity
+from .exceptions import (
+    DalUniqueViolationException,
+    DalForeignKeyViolationException,
+)
+from .in_memory_user_repository import InMemoryUserRepository
+from .journal import Journal, Record
+from .loading import LoadOption, strategy_for
+
+_CREATE = "create_poll"
+_DELETE = "delete_poll"
+
+
+class InMemoryPollRepository:
+    def __init__(
+        self,
+        user_repository: InMemoryUserRepository | None = None,
+        journal: Journal | None = None,
+    ) -> None:
+        self.user_repository = user_repository
+        self._polls: dict[int, PollEntity] = dict()
+        self._poll_ids_by_user: dict[int, dict[str, int]] = dict()
+        self._options: dict[int, OptionEntity] = dict()
+        self._option_ids_by_poll: dict[int, list[int]] = dict()
+        self._options_deleted_listeners: list[Callable[[list[int]], None]] = (
+            list()
+        )
+        self._last_poll_id = 0
+        self._last_option_id = 0
+        self._journal = journal
+        if journal is not None:
+            for record in journal.replay():
+                self._apply(record)
+        if user_repository is not None:
+            self._delete_orphaned_polls()
+            user_repository.on_user_deleted(self._delete_polls_of_user)
+
+    def on_options_deleted(
+        self, listener: Callable[[list[int]], None]
+    ) -> None:
+        self._options_deleted_listeners.append(listener)
+
+    def commit(self) -> None:
+        pass
+
+    def create_poll(
+        self,
+        name: str,
+        tag: str,
+        user_id: int,
+        anonymous_voting: bool,
+        multiple_choice: bool,
+        options: list[str],
+        commit: bool = True,
+    ) -> None:
+        if (
+            self.user_repository is not None
+            and self.user_repository.get_user_by_id(user_id) is None
+        ):
+            raise DalForeignKeyViolationException("polls", "user_id", user_id)
+        if self.get_poll_by_user_and_tag(user_id, tag) is not None:
+            raise DalUniqueViolationException("polls", "tag", tag)
+        seen = set()
+        for text in options:
+            if text in seen:
+                raise DalUniqueViolationException("options", "text", text)
+            seen.add(text)
+
+        first_option_id = self._last_option_id + 1
+        self._write(
+            [
+                _CREATE,
+                self._last_poll_id + 1,
+                name,
+                tag,
+                user_id,
+                datetime.now().isoformat(),
+                anonymous_voting,
+                multiple_choice,
+                [[first_option_id + i, text] for i, text in enumerate(options)],
+            ]
+        )
+
+    def get_polls(
+        self,
+        poll_ids: list[int] | None = None,
+        load: Sequence[LoadOption] = (),
+    ) -> list[PollEntity]:
+        if poll_ids is None:
+            polls = list(self._polls.values())
+        else:
+            polls = [
+                self._polls[poll_id]
+                for poll_id in poll_ids
+                if poll_id in self._polls
+            ]
+        return [self._loaded(poll, load) for poll in polls]
+
+    def get_poll_by_id(
+        self, poll_id: int, load: Sequence[LoadOption] = ()
+    ) -> PollEntity | None:
+        return self._loaded(self._polls.get(poll_id), load)
+
+    def get_polls_by_user(
+        self, user_id: int, load: Sequence[LoadOption] = ()
+    ) -> list[PollEntity]:
+        polls_of_user = self._poll_ids_by_user.get(user_id)
+        if polls_of_user is None:
+            return []
+        return [
+            self._loaded(self._polls[poll_id], load)
+            for poll_id in polls_of_user.values()
+        ]
+
+    def get_poll_by_user_and_tag(
+        self, user_id: int, tag: str, load: Sequence[LoadOption] = ()
+    ) -> PollEntity | None:
+        polls_of_user = self._poll_ids_by_user.get(user_id)
+        if polls_of_user is None or tag not in polls_of_user:
+            return None
+        return self._loaded(self._polls[polls_of_user[tag]], load)
+
+    def delete_poll(self, poll_id: int, commit: bool = True) -> None:
+        if poll_id not in self._polls:
+            return
+        option_ids = self._option_ids_by_poll[poll_id]
+        self._write([_DELETE, poll_id])
+        for listener in self._options_deleted_listeners:
+            listener(option_ids)
+
+    def get_options_for_poll(
+        self, poll_id: int | PollEntity
+    ) -> list[OptionEntity]:
+        if isinstance(poll_id, PollEntity):
+            poll_id = poll_id.id
+
+        option_ids = self._option_ids_by_poll.get(poll_id, [])
+        return [self._options[option_id] for option_id in option_ids]
+
+    def get_option_by_id(self, option_id: int) -> OptionEntity | None:
+        return self._options.get(option_id)
+
+    def _loaded(
+        self, poll: PollEntity | None, load: Sequence[LoadOption]
+    ) -> PollEntity | None:
+        # everything is at hand, so every strategy loads eagerly
+        if poll is None or strategy_for(load, "options") is None:
+            return poll
+        return dataclasses.replace(
+            poll, options=self.get_options_for_poll(poll.id)
+        )
+
+    def load(self, polls: Iterable[PollEntity]) -> None:
+        for poll in polls:
+            self._apply(self._to_record(poll, poll.options or []))
+        if self._journal is not None:
+            self._journal.write_snapshot(self._snapshot_records())
+
+    def _write(self, record: Record) -> None:
+        self._apply(record)
+        if self._journal is not None:
+            self._journal.append(record, self._compact)
+
+    def _apply(self, record: Record) -> None:
+        if record[0] == _DELETE:
+            self._remove(record[1])
+            return
+
+        (
+            _,
+            poll_id,
+            name,
+            tag,
+            user_id,
+            creation_date,
+            anonymous_voting,
+            multiple_choice,
+            options,
+        ) = record
+        self._remove(poll_id)
+        poll = PollEntity(
+            id=poll_id,
+            name=name,
+            tag=tag,
+            user_id=user_id,
+            creation_date=datetime.fromisoformat(creation_date),
+            anonymous_voting=anonymous_voting,
+            multiple_choice=multiple_choice,
+        )
+        self._polls[poll_id] = poll
+        self._poll_ids_by_user.setdefault(user_id, dict())[tag] = poll_id
+        self._last_poll_id = max(self._last_poll_id, poll_id)
+
+        option_ids = list()
+        for option_id, text in options:
+            self._options[option_id] = OptionEntity(
+                id=option_id, poll_id=poll_id, text=text
+            )
+            option_ids.append(option_id)
+            self._last_option_id = max(self._last_option_id, option_id)
+        self._option_ids_by_poll[poll_id] = option_ids
+
+    def _remove(self, poll_id: int) -> None:
+        poll = self._polls.pop(poll_id, None)
+        if poll is None:
+            return
+
+        polls_of_user = self._poll_ids_by_user[poll.user_id]
+        del polls_of_user[poll.tag]
+        if len(polls_of_user) == 0:
+            del self._poll_ids_by_user[poll.user_id]
+
+        for option_id in self._option_ids_by_poll.pop(poll_id):
+            del self._options[option_id]
+
+    def _delete_polls_of_user(self, user_id: int) -> None:
+        for poll_id in list(self._poll_ids_by_user.get(user_id, {}).values()):
+            self.delete_poll(poll_id)
+
+    def _delete_orphaned_polls(self) -> None:
+        # the user journal may have recorded a delete that did not reach
+        # this journal before a crash
+        for user_id in list(self._poll_ids_by_user):
+            if self.user_repository.get_user_by_id(user_id) is None:
+                self._delete_polls_of_user(user_id)
+
+    @staticmethod
+    def _compact(records: Iterable[Record]) -> Iterator[Record]:
+        scratch = InMemoryPollRepository()
+        for record in records:
+            scratch._apply(record)
+        return scratch._snapshot_records()
+
+    def _snapshot_records(self) -> Iterator[Record]:
+        for poll in self._polls.values():
+            yield self._to_record(poll, self.get_options_for_poll(poll.id))
+
+    @staticmethod
+    def _to_record(poll: PollEntity, options: list[OptionEntity]) -> Record:
+        return [
+            _CREATE,
+            poll.id,
+            poll.name,
+            poll.tag,
+            poll.user_id,
+            poll.creation_date.isoformat(),
+            poll.anonymous_voting,
+            poll.multiple_choice,
+            [[option.id, option.text] for option in options],
+        ]
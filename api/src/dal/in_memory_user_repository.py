@@ -1,42 +1,126 @@
+from typing import Callable, Iterable, Iterator
+
 from .dal_entities import UserEntity
-from .exceptions import NotFoundException
+from .exceptions import NotFoundException, DalUniqueViolationException
+from .journal import Journal, Record
+
+_PUT = "put_user"
+_DELETE = "delete_user"
 
 
 class InMemoryUserRepository:
-    def __init__(self) -> None:
+    def __init__(self, journal: Journal | None = None) -> None:
         self._users: dict[int, UserEntity] = dict()
+        self._ids_by_name: dict[str, int] = dict()
+        self._names_by_id: dict[int, str] = dict()
         self._last_id = -1
+        self._user_deleted_listeners: list[Callable[[int], None]] = list()
+        self._journal = journal
+        if journal is not None:
+            for record in journal.replay():
+                self._apply(record)
 
-    def create_user(self, name: str, password: str) -> UserEntity:
-        user = UserEntity(
-            id=self._get_id(), name=name, password_hash=password
-        )
-        self._users[user.id] = user
-        return user
+    def on_user_deleted(self, listener: Callable[[int], None]) -> None:
+        # stands in for ON DELETE CASCADE on the tables that reference users
+        self._user_deleted_listeners.append(listener)
+
+    def create_user(
+        self, name: str, password_hash: str, commit: bool = True
+    ) -> UserEntity:
+        if name in self._ids_by_name:
+            raise DalUniqueViolationException("users", "name", name)
+        user_id = self._get_id()
+        self._write([_PUT, user_id, name, password_hash])
+        return self._users[user_id]
 
-    def get_users(self) -> list[UserEntity]:
-        users = list()
-        for user_id in self._users.keys():
-            users.append(self._users[user_id])
-        return users
+    def get_users(self, user_ids: list[int] | None = None) -> list[UserEntity]:
+        if user_ids is None:
+            return list(self._users.values())
+        return [
+            self._users[user_id]
+            for user_id in user_ids
+            if user_id in self._users
+        ]
+
+    def get_user_rows(
+        self, user_ids: list[int] | None = None
+    ) -> list[tuple[int, str]]:
+        return [(user.id, user.name) for user in self.get_users(user_ids)]
 
     def get_user(self, user_id: int) -> UserEntity:
         if user_id in self._users:
             return self._users[user_id]
         raise NotFoundException(UserEntity, user_id)
 
+    def get_user_by_id(self, user_id: int) -> UserEntity | None:
+        return self._users.get(user_id)
+
+    def get_user_by_name(self, name: str) -> UserEntity | None:
+        user_id = self._ids_by_name.get(name)
+        if user_id is None:
+            return None
+        return self._users[user_id]
+
     def update_user(self, user: UserEntity) -> None:
         if user.id in self._users:
-            self._users[user.id] = user
+            owner_id = self._ids_by_name.get(user.name, user.id)
+            if owner_id != user.id:
+                raise DalUniqueViolationException("users", "name", user.name)
+            self._write([_PUT, user.id, user.name, user.password_hash])
             return
         raise NotFoundException(UserEntity, user.id)
 
-    def delete_user(self, user_id: int) -> None:
+    def delete_user(self, user_id: int, commit: bool = True) -> None:
         if user_id in self._users:
-            self._users.pop(user_id)
+            self._write([_DELETE, user_id])
+            for listener in self._user_deleted_listeners:
+                listener(user_id)
             return
         raise NotFoundException(UserEntity, user_id)
 
+    def load(self, users: Iterable[UserEntity]) -> None:
+        for user in users:
+            self._apply([_PUT, user.id, user.name, user.password_hash])
+        if self._journal is not None:
+            self._journal.write_snapshot(self._snapshot_records())
+
+    def _write(self, record: Record) -> None:
+        self._apply(record)
+        if self._journal is not None:
+            self._journal.append(record, self._compact)
+
+    def _apply(self, record: Record) -> None:
+        if record[0] == _DELETE:
+            user_id = record[1]
+            if user_id in self._users:
+                del self._users[user_id]
+                del self._ids_by_name[self._names_by_id.pop(user_id)]
+            return
+
+        _, user_id, name, password_hash = record
+        old_name = self._names_by_id.get(user_id)
+        if old_name is not None:
+            del self._ids_by_name[old_name]
+        self._users[user_id] = UserEntity(
+            id=user_id, name=name, password_hash=password_hash
+        )
+        self._ids_by_name[name] = user_id
+        self._names_by_id[user_id] = name
+        self._last_id = max(self._last_id, user_id)
+
+    @staticmethod
+    def _compact(records: Iterable[Record]) -> Iterator[Record]:
+        # runs on the journal's compaction thread, so it folds the records
+        # into a scratch repository rather than reading this one
+        scratch = InMemoryUserRepository()
+        for record in records:
+            scratch._apply(record)
+        return scratch._snapshot_records()
+
+    def _snapshot_records(self) -> Iterator[Record]:
+        for user in self._users.values():
+            yield [_PUT, user.id, user.name, user.password_hash]
+
     def _get_id(self) -> int:
         self._last_id += 1
         return self._last_id
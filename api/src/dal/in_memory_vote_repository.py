@@ -0,0 +1,256 @@
+from datetime import datetime
+from typing import Iterable, Iterator
+
+from .dal_entities import VoteEntity
+from .exceptions import DalNotFound, DalUniqueViolationException
+from .in_memory_poll_repository import InMemoryPollRepository
+from .in_memory_user_repository import InMemoryUserRepository
+from .journal import Journal, Record
+
+_CREATE = "create_vote"
+_DELETE = "delete_vote"
+_DELETE_FOR_OPTIONS = "delete_votes_for_options"
+_DELETE_FOR_USER = "delete_votes_for_user"
+
+
+class InMemoryVoteRepository:
+    # vote id sets are dict[int, None] so that reads keep insertion order
+    def __init__(
+        self,
+        user_repository: InMemoryUserRepository,
+        poll_repository: InMemoryPollRepository,
+        journal: Journal | None = None,
+    ) -> None:
+        self.user_repository = user_repository
+        self.poll_repository = poll_repository
+        self._votes: dict[int, VoteEntity] = dict()
+        self._vote_ids_by_user_option: dict[tuple[int, int], int] = dict()
+        self._vote_ids_by_option: dict[int, dict[int, None]] = dict()
+        self._vote_ids_by_user: dict[int, dict[int, None]] = dict()
+        self._vote_ids_by_poll: dict[int, dict[int, None]] = dict()
+        self._vote_ids_by_poll_user: dict[tuple[int, int], dict[int, None]] = (
+            dict()
+        )
+        self._poll_ids_by_option: dict[int, int] = dict()
+        self._last_id = 0
+        # (change, vote_id, poll_id, option_id, user_id, changed_at)
+        self._changes: list[tuple[str, int, int, int, int, datetime]] = list()
+        self._changes_pruned = 0
+        self._journal = journal
+        if journal is not None:
+            for record in journal.replay():
+                self._apply(record)
+            self._delete_orphaned_votes()
+        poll_repository.on_options_deleted(self._delete_votes_for_options)
+        user_repository.on_user_deleted(self._delete_votes_for_user)
+
+    def commit(self) -> None:
+        pass
+
+    def create_vote(
+        self, option_id: int, user_id: int, commit: bool = True
+    ) -> None:
+        user = self.user_repository.get_user_by_id(user_id)
+        option = self.poll_repository.get_option_by_id(option_id)
+        if user is None:
+            raise DalNotFound("users", "id", user_id)
+        if option is None:
+            raise DalNotFound("options", "id", option_id)
+        if (user_id, option_id) in self._vote_ids_by_user_option:
+            raise DalUniqueViolationException(
+                "votes", "user_id, option_id", f"{user_id}, {option_id}"
+            )
+
+        self._write(
+            [
+                _CREATE,
+                self._last_id + 1,
+                user_id,
+                option_id,
+                option.poll_id,
+                datetime.now().isoformat(),
+            ]
+        )
+
+    def delete_vote(self, vote_id: int, commit: bool = True) -> None:
+        if vote_id not in self._votes:
+            return
+        self._write([_DELETE, vote_id])
+
+    def get_vote_by_id(self, vote_id: int) -> VoteEntity | None:
+        return self._votes.get(vote_id)
+
+    def get_votes_by_poll(self, poll_id: int) -> list[VoteEntity]:
+        return self._collect(self._vote_ids_by_poll.get(poll_id))
+
+    def get_votes_by_user(self, user_id: int) -> list[VoteEntity]:
+        return self._collect(self._vote_ids_by_user.get(user_id))
+
+    def get_votes_by_user_poll(
+        self, poll_id: int, user_id: int
+    ) -> list[VoteEntity]:
+        return self._collect(self._vote_ids_by_poll_user.get((poll_id, user_id)))
+
+    def get_vote_changes(
+        self, since: int | None
+    ) -> tuple[int, list[tuple[str, int, int | None, int, int]]]:
+        # writes apply at once here, so every change is final; positions
+        # count changes ever recorded, pruned ones included
+        position = self._changes_pruned + len(self._changes)
+        if since is None:
+            return position, []
+        start = max(since - self._changes_pruned, 0)
+        return position, [change[:5] for change in self._changes[start:]]
+
+    def delete_vote_changes_before(
+        self, before: datetime, commit: bool = True
+    ) -> None:
+        pruned = 0
+        while pruned < len(self._changes) and self._changes[pruned][5] < before:
+            pruned += 1
+        del self._changes[:pruned]
+        self._changes_pruned += pruned
+
+    def get_vote_counts_by_poll(self, poll_id: int) -> dict[int, int]:
+        return {
+            option.id: len(self._vote_ids_by_option.get(option.id, ()))
+            for option in self.poll_repository.get_options_for_poll(poll_id)
+        }
+
+    def load(self, votes: Iterable[VoteEntity]) -> None:
+        for vote in votes:
+            option = self.poll_repository.get_option_by_id(vote.option_id)
+            if option is None:
+                raise DalNotFound("options", "id", vote.option_id)
+            self._apply(
+                [
+                    _CREATE,
+                    vote.id,
+                    vote.user_id,
+                    vote.option_id,
+                    option.poll_id,
+                    vote.vote_date.isoformat(),
+                ]
+            )
+        if self._journal is not None:
+            self._journal.write_snapshot(self._snapshot_records())
+
+    def _write(self, record: Record) -> None:
+        self._apply(record)
+        if self._journal is not None:
+            self._journal.append(record, self._compact)
+
+    def _apply(self, record: Record) -> None:
+        if record[0] == _DELETE:
+            vote = self._votes.get(record[1])
+            if vote is not None:
+                self._remove(vote)
+        elif record[0] == _DELETE_FOR_OPTIONS:
+            for option_id in record[1]:
+                for vote_id in list(self._vote_ids_by_option.get(option_id, ())):
+                    self._remove(self._votes[vote_id])
+                self._poll_ids_by_option.pop(option_id, None)
+        elif record[0] == _DELETE_FOR_USER:
+            for vote_id in list(self._vote_ids_by_user.get(record[1], ())):
+                self._remove(self._votes[vote_id])
+        else:
+            _, vote_id, user_id, option_id, poll_id, vote_date = record
+            if vote_id in self._votes:
+                return
+            vote = VoteEntity(
+                id=vote_id,
+                user_id=user_id,
+                option_id=option_id,
+                vote_date=datetime.fromisoformat(vote_date),
+            )
+            self._poll_ids_by_option[option_id] = poll_id
+            self._insert(vote, poll_id)
+            self._last_id = max(self._last_id, vote_id)
+
+    def _insert(self, vote: VoteEntity, poll_id: int) -> None:
+        self._votes[vote.id] = vote
+        self._vote_ids_by_user_option[(vote.user_id, vote.option_id)] = vote.id
+        self._vote_ids_by_option.setdefault(vote.option_id, dict())[vote.id] = None
+        self._vote_ids_by_user.setdefault(vote.user_id, dict())[vote.id] = None
+        self._vote_ids_by_poll.setdefault(poll_id, dict())[vote.id] = None
+        self._vote_ids_by_poll_user.setdefault(
+            (poll_id, vote.user_id), dict()
+        )[vote.id] = None
+        self._record_change("i", vote, poll_id)
+
+    def _remove(self, vote: VoteEntity) -> None:
+        poll_id = self._poll_ids_by_option[vote.option_id]
+        del self._votes[vote.id]
+        del self._vote_ids_by_user_option[(vote.user_id, vote.option_id)]
+        _discard(self._vote_ids_by_option, vote.option_id, vote.id)
+        _discard(self._vote_ids_by_user, vote.user_id, vote.id)
+        _discard(self._vote_ids_by_poll, poll_id, vote.id)
+        _discard(self._vote_ids_by_poll_user, (poll_id, vote.user_id), vote.id)
+        self._record_change("d", vote, poll_id)
+
+    def _record_change(
+        self, change: str, vote: VoteEntity, poll_id: int
+    ) -> None:
+        self._changes.append(
+            (
+                change,
+                vote.id,
+                poll_id,
+                vote.option_id,
+                vote.user_id,
+                datetime.now(),
+            )
+        )
+
+    def _delete_votes_for_options(self, option_ids: list[int]) -> None:
+        self._write([_DELETE_FOR_OPTIONS, option_ids])
+
+    def _delete_votes_for_user(self, user_id: int) -> None:
+        if user_id in self._vote_ids_by_user:
+            self._write([_DELETE_FOR_USER, user_id])
+
+    def _delete_orphaned_votes(self) -> None:
+        # the poll and user journals may have recorded a delete that did
+        # not reach this journal before a crash
+        orphaned_option_ids = [
+            option_id
+            for option_id in self._vote_ids_by_option
+            if self.poll_repository.get_option_by_id(option_id) is None
+        ]
+        if len(orphaned_option_ids) > 0:
+            self._delete_votes_for_options(orphaned_option_ids)
+        for user_id in list(self._vote_ids_by_user):
+            if self.user_repository.get_user_by_id(user_id) is None:
+                self._delete_votes_for_user(user_id)
+
+    @staticmethod
+    def _compact(records: Iterable[Record]) -> Iterator[Record]:
+        scratch = InMemoryVoteRepository(
+            InMemoryUserRepository(), InMemoryPollRepository()
+        )
+        for record in records:
+            scratch._apply(record)
+        return scratch._snapshot_records()
+
+    def _snapshot_records(self) -> Iterator[Record]:
+        for vote in self._votes.values():
+            yield [
+                _CREATE,
+                vote.id,
+                vote.user_id,
+                vote.option_id,
+                self._poll_ids_by_option[vote.option_id],
+                vote.vote_date.isoformat(),
+            ]
+
+    def _collect(self, vote_ids: dict[int, None] | None) -> list[VoteEntity]:
+        if vote_ids is None:
+            return []
+        return [self._votes[vote_id] for vote_id in vote_ids]
+
+
+def _discard(index: dict, key, vote_id: int) -> None:
+    vote_ids = index[key]
+    del vote_ids[vote_id]
+    if len(vote_ids) == 0:
+        del index[key]
@@ -1,11 +1,78 @@
 from psycopg2._psycopg import cursor
+from psycopg2.errors import UndefinedTable
 
+# bump whenever ensure_exists changes, so running workers pick up the DDL
+SCHEMA_VERSION = 10
+_SCHEMA_LOCK_ID = 7_254_001
+_COUNT_VOTE_TOTALS = """
+    INSERT INTO poll_vote_totals (poll_id, tag, votes)
+    SELECT polls.id, polls.tag, count(*)
+    FROM votes
+    JOIN options ON options.id = votes.option_id
+    JOIN polls ON polls.id = options.poll_id
+    {where}
+    GROUP BY polls.id
+"""
+_COUNT_VOTE_ROLLUPS = """
+    INSERT INTO vote_rollups (option_id, resolution, bucket, votes)
+    SELECT votes.option_id, units.resolution,
+        date_trunc(units.unit, votes.vote_date), count(*)
+    FROM votes
+    CROSS JOIN (VALUES ('m', 'minute'), ('h', 'hour'), ('d', 'day'))
+        AS units (resolution, unit)
+    {where}
+    GROUP BY 1, 2, 3
+"""
 
-def ensure_exists(cur: cursor) -> None:
+
+def prepare_schema(cur: cursor) -> bool:
+    if schema_is_current(cur):
+        return False
+    return ensure_exists(cur)
+
+
+def schema_is_current(cur: cursor) -> bool:
+    try:
+        cur.execute("SELECT version FROM schema_version;")
+        row = cur.fetchone()
+    except UndefinedTable:
+        return False
+    finally:
+        cur.connection.rollback()
+    return row is not None and row[0] == SCHEMA_VERSION
+
+
+def rebuild_vote_totals(cur: cursor) -> None:
+    # poll and result counts are read from the rollups alone, so this
+    # must run after any load that writes votes with the counting
+    # triggers disabled, before the counts are served again
     cur.execute(
-        """
-    BEGIN;
+        "DELETE FROM poll_vote_totals;"
+        + _COUNT_VOTE_TOTALS.format(where="")
+        + "; DELETE FROM vote_rollups;"
+        + _COUNT_VOTE_ROLLUPS.format(where="")
+        + ";"
+    )
+
+
+def ensure_exists(cur: cursor) -> bool:
+    # the advisory lock queues workers that start together, instead of
+    # letting them race on the same catalog locks; those that waited find
+    # the schema applied and skip the DDL. Returns whether it ran
+    cur.execute(
+        "BEGIN; SELECT pg_advisory_xact_lock(%s);", (_SCHEMA_LOCK_ID,)
+    )
+    cur.execute("SELECT to_regclass('schema_version') IS NOT NULL;")
+    if cur.fetchone()[0]:
+        cur.execute("SELECT version FROM schema_version;")
+        row = cur.fetchone()
+        # a newer worker's schema is left alone during rolling deploys
+        if row is not None and row[0] >= SCHEMA_VERSION:
+            cur.execute("COMMIT;")
+            return False
 
+    cur.execute(
+        """
     CREATE TABLE IF NOT EXISTS users (
     id SERIAL PRIMARY KEY,
     name VARCHAR(80) UNIQUE NOT NULL,
@@ -25,6 +92,22 @@ def ensure_exists(cur: cursor) -> None:
     UNIQUE (user_id, tag)
     );
 
+    -- search matches words through the tsvector and typos or partial
+    -- words through trigrams, both served by GIN indexes
+    CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+    ALTER TABLE polls ADD COLUMN IF NOT EXISTS search_text TEXT
+        GENERATED ALWAYS AS (lower(name || ' ' || tag)) STORED;
+    ALTER TABLE polls ADD COLUMN IF NOT EXISTS search_vector TSVECTOR
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('simple', name), 'A')
+            || setweight(to_tsvector('simple', tag), 'B')
+        ) STORED;
+    CREATE INDEX IF NOT EXISTS polls_search_vector_idx
+        ON polls USING GIN (search_vector);
+    CREATE INDEX IF NOT EXISTS polls_search_text_trgm_idx
+        ON polls USING GIN (search_text gin_trgm_ops);
+
     CREATE TABLE IF NOT EXISTS options (
     id SERIAL PRIMARY KEY,
     text VARCHAR(80) NOT NULL,
@@ -33,16 +116,180 @@ def ensure_exists(cur: cursor) -> None:
         ON DELETE CASCADE,
     UNIQUE (text, poll_id)
     );
+    CREATE INDEX IF NOT EXISTS options_poll_id_idx ON options (poll_id);
 
     CREATE TABLE IF NOT EXISTS votes (
-    user_id SERIAL REFERENCES users (id),
+    user_id SERIAL
+        REFERENCES users (id)
+        ON DELETE CASCADE,
     option_id SERIAL
         REFERENCES options (id)
         ON DELETE CASCADE,
     vote_date TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     PRIMARY KEY (user_id, option_id)
     );
+    -- keyset pagination walks votes by id; added here so databases
+    -- created before the column get it too
+    ALTER TABLE votes ADD COLUMN IF NOT EXISTS id SERIAL UNIQUE;
+    -- a user's votes go with them, like their polls; recreated so
+    -- databases created before the cascade get it too
+    ALTER TABLE votes DROP CONSTRAINT IF EXISTS votes_user_id_fkey;
+    ALTER TABLE votes ADD CONSTRAINT votes_user_id_fkey
+        FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE;
 
-    COMMIT;
+    -- vote counts per poll, kept current by a trigger on votes, so
+    -- leaderboards read a few index entries instead of aggregating votes
+    CREATE TABLE IF NOT EXISTS poll_vote_totals (
+    poll_id INTEGER PRIMARY KEY
+        REFERENCES polls (id)
+        ON DELETE CASCADE,
+    tag VARCHAR(80) NOT NULL,
+    votes BIGINT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS poll_vote_totals_tag_idx
+        ON poll_vote_totals (tag, votes, poll_id);
+    CREATE INDEX IF NOT EXISTS poll_vote_totals_votes_idx
+        ON poll_vote_totals (votes, poll_id);
+
+    CREATE OR REPLACE FUNCTION count_poll_votes() RETURNS TRIGGER AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            INSERT INTO poll_vote_totals (poll_id, tag, votes)
+            SELECT polls.id, polls.tag, 1
+            FROM options JOIN polls ON polls.id = options.poll_id
+            WHERE options.id = NEW.option_id
+            ON CONFLICT (poll_id)
+            DO UPDATE SET votes = poll_vote_totals.votes + 1;
+            RETURN NEW;
+        END IF;
+        -- when a poll is deleted its options are gone already and its
+        -- totals row goes with it
+        UPDATE poll_vote_totals SET votes = votes - 1
+        WHERE poll_id = (
+            SELECT poll_id FROM options WHERE id = OLD.option_id
+        );
+        RETURN OLD;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    -- created before the backfill, so votes cast meanwhile wait for the
+    -- trigger instead of being missed
+    DROP TRIGGER IF EXISTS votes_count_poll_votes ON votes;
+    CREATE TRIGGER votes_count_poll_votes
+        AFTER INSERT OR DELETE ON votes
+        FOR EACH ROW EXECUTE FUNCTION count_poll_votes();
+    """
+        + _COUNT_VOTE_TOTALS.format(
+            where="WHERE NOT EXISTS (SELECT 1 FROM poll_vote_totals)"
+        )
+        + """;
+
+    -- votes per option in minute, hour and day buckets, so charts read
+    -- one row per bucket whatever the number of votes behind it. The
+    -- price is on the write side: each vote upserts three rollup rows
+    -- on top of its poll total, and the rows of a busy option are hot
+    -- within their bucket. Minute and hour rows are pruned after their
+    -- retention, so the table grows with days, not votes
+    CREATE TABLE IF NOT EXISTS vote_rollups (
+    option_id INTEGER NOT NULL
+        REFERENCES options (id)
+        ON DELETE CASCADE,
+    resolution CHAR(1) NOT NULL,
+    bucket TIMESTAMP NOT NULL,
+    votes INTEGER NOT NULL,
+    PRIMARY KEY (option_id, resolution, bucket)
+    );
+    CREATE INDEX IF NOT EXISTS vote_rollups_resolution_bucket
+        ON vote_rollups (resolution, bucket);
+
+    CREATE OR REPLACE FUNCTION roll_up_votes() RETURNS TRIGGER AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            INSERT INTO vote_rollups (option_id, resolution, bucket, votes)
+            SELECT NEW.option_id, units.resolution,
+                date_trunc(units.unit, NEW.vote_date), 1
+            FROM (VALUES ('m', 'minute'), ('h', 'hour'), ('d', 'day'))
+                AS units (resolution, unit)
+            ON CONFLICT (option_id, resolution, bucket)
+            DO UPDATE SET votes = vote_rollups.votes + 1;
+            RETURN NEW;
+        END IF;
+        UPDATE vote_rollups SET votes = votes - 1
+        WHERE option_id = OLD.option_id
+            AND (resolution, bucket) IN (
+                ('m', date_trunc('minute', OLD.vote_date)),
+                ('h', date_trunc('hour', OLD.vote_date)),
+                ('d', date_trunc('day', OLD.vote_date))
+            );
+        RETURN OLD;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS votes_roll_up_votes ON votes;
+    CREATE TRIGGER votes_roll_up_votes
+        AFTER INSERT OR DELETE ON votes
+        FOR EACH ROW EXECUTE FUNCTION roll_up_votes();
     """
+        + _COUNT_VOTE_ROLLUPS.format(
+            where="WHERE NOT EXISTS (SELECT 1 FROM vote_rollups)"
+        )
+        + """;
+
+    -- votes cast and retracted, for workers following each other's
+    -- writes. Ids are taken at insert, not at commit, so a reader
+    -- walking ids skips a vote that commits behind a newer one; readers
+    -- here take only the rows of transactions older than their
+    -- snapshot's xmin, which have all committed or aborted. One more row
+    -- per vote write, pruned after its retention
+    CREATE TABLE IF NOT EXISTS vote_changes (
+    seq BIGSERIAL PRIMARY KEY,
+    xid XID8 NOT NULL DEFAULT pg_current_xact_id(),
+    change CHAR(1) NOT NULL,
+    vote_id INTEGER NOT NULL,
+    poll_id INTEGER,
+    option_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS vote_changes_xid_idx
+        ON vote_changes (xid);
+    CREATE INDEX IF NOT EXISTS vote_changes_changed_at_idx
+        ON vote_changes (changed_at);
+
+    -- votes deleted with their poll find their options gone already and
+    -- are recorded without a poll
+    CREATE OR REPLACE FUNCTION record_vote_change() RETURNS TRIGGER AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            INSERT INTO vote_changes
+                (change, vote_id, poll_id, option_id, user_id)
+            VALUES ('i', NEW.id,
+                (SELECT poll_id FROM options WHERE id = NEW.option_id),
+                NEW.option_id, NEW.user_id);
+            RETURN NEW;
+        END IF;
+        INSERT INTO vote_changes
+            (change, vote_id, poll_id, option_id, user_id)
+        VALUES ('d', OLD.id,
+            (SELECT poll_id FROM options WHERE id = OLD.option_id),
+            OLD.option_id, OLD.user_id);
+        RETURN OLD;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS votes_record_vote_change ON votes;
+    CREATE TRIGGER votes_record_vote_change
+        AFTER INSERT OR DELETE ON votes
+        FOR EACH ROW EXECUTE FUNCTION record_vote_change();
+
+    CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER NOT NULL
+    );
+    DELETE FROM schema_version;
+    INSERT INTO schema_version (version) VALUES (%(version)s);
+
+    COMMIT;
+    """,
+        {"version": SCHEMA_VERSION},
     )
+    return True
@@ -0,0 +1,242 @@
+import itertools
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+from typing import Any, Callable, Iterable, Iterator
+
+_FRAME_HEADER = struct.Struct("<I")
+_SNAPSHOT_FILE = "snapshot.bin"
+_SEGMENT_FILE = re.compile(r"journal\.(\d+)\.log")
+_SNAPSHOT_CHUNK = 4096
+
+Record = list[Any]
+# folds records into those of the state they leave behind
+Compact = Callable[[Iterable[Record]], Iterable[Record]]
+
+
+class Journal:
+    # the log is split into numbered segments. Reaching the threshold
+    # starts a new segment, and a background thread folds the snapshot and
+    # the finished segments into a new snapshot. The snapshot names the
+    # last segment it covers, so segments left behind by a crash are never
+    # replayed on top of it
+    def __init__(
+        self,
+        directory: str,
+        fsync_interval_ms: int = 10,
+        snapshot_threshold: int = 1_000_000,
+    ) -> None:
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.snapshot_path = os.path.join(directory, _SNAPSHOT_FILE)
+        self.fsync_interval_ms = fsync_interval_ms
+        self.snapshot_threshold = snapshot_threshold
+        self.records_since_snapshot = 0
+        self._lock = threading.Lock()
+        self._snapshot_lock = threading.Lock()
+        self._log = None
+        self._dirty = False
+        self._segment = 0
+        self._covered = -1
+        self._compact: Compact | None = None
+        self._compaction: threading.Thread | None = None
+        self._closed = threading.Event()
+        self._flusher: threading.Thread | None = None
+
+    @property
+    def log_path(self) -> str:
+        return self._segment_path(self._segment)
+
+    def replay(self) -> Iterator[Record]:
+        self._covered, chunks = self._read_snapshot()
+        for chunk in chunks:
+            yield from chunk
+
+        segments = self._segments()
+        for segment in segments:
+            path = self._segment_path(segment)
+            if segment <= self._covered:
+                os.remove(path)
+                continue
+            valid_length = 0
+            for record, end in _read_frames_with_offsets(path):
+                valid_length = end
+                self.records_since_snapshot += 1
+                yield record
+            # a crash can leave a partially written frame at the end
+            if os.path.getsize(path) != valid_length:
+                with open(path, "r+b") as log:
+                    log.truncate(valid_length)
+        self._segment = max([self._covered + 1, *segments])
+
+    def append(self, record: Record, compact: Compact) -> None:
+        frame = _encode(record)
+        with self._lock:
+            self._ensure_open()
+            self._log.write(frame)
+            if self.fsync_interval_ms <= 0:
+                self._sync()
+            else:
+                self._dirty = True
+            self.records_since_snapshot += 1
+            if self.records_since_snapshot < self.snapshot_threshold:
+                return
+            self._compact = compact
+            self._rotate()
+            if self._compaction is None:
+                self._compaction = threading.Thread(
+                    target=self._compact_segments, daemon=True
+                )
+                self._compaction.start()
+
+    def write_snapshot(self, records: Iterable[Record]) -> None:
+        # records hold the whole current state, so nothing may be appended
+        # while they are read
+        with self._snapshot_lock:
+            with self._lock:
+                self._rotate()
+                covered = self._segment - 1
+            self._write_snapshot(records, covered)
+
+    def sync(self) -> None:
+        with self._lock:
+            if self._log is not None:
+                self._sync()
+
+    def close(self) -> None:
+        with self._lock:
+            compaction = self._compaction
+        if compaction is not None:
+            compaction.join()
+        self._closed.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        with self._lock:
+            if self._log is not None:
+                self._sync()
+                self._log.close()
+                self._log = None
+
+    def _compact_segments(self) -> None:
+        while True:
+            with self._lock:
+                covered = self._segment - 1
+                if covered <= self._covered:
+                    self._compaction = None
+                    return
+                compact = self._compact
+            with self._snapshot_lock:
+                _, chunks = self._read_snapshot()
+                records = itertools.chain(
+                    itertools.chain.from_iterable(chunks),
+                    *(
+                        _read_frames(self._segment_path(segment))
+                        for segment in range(self._covered + 1, covered + 1)
+                    ),
+                )
+                self._write_snapshot(compact(records), covered)
+
+    def _read_snapshot(self) -> tuple[int, Iterator[list[Record]]]:
+        # a header frame, then frames holding whole chunks of records, one
+        # decode per chunk
+        frames = _read_frames(self.snapshot_path)
+        header = next(frames, None)
+        if header is None:
+            return -1, iter(())
+        return header["covered"], frames
+
+    def _write_snapshot(self, records: Iterable[Record], covered: int) -> None:
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "wb", buffering=1 << 20) as snapshot:
+            snapshot.write(_encode({"covered": covered}))
+            chunk = list()
+            for record in records:
+                chunk.append(record)
+                if len(chunk) == _SNAPSHOT_CHUNK:
+                    snapshot.write(_encode(chunk))
+                    chunk = list()
+            if len(chunk) > 0:
+                snapshot.write(_encode(chunk))
+            snapshot.flush()
+            os.fsync(snapshot.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        with self._lock:
+            self._covered = covered
+        for segment in self._segments():
+            if segment <= covered:
+                os.remove(self._segment_path(segment))
+
+    def _rotate(self) -> None:
+        if self._log is not None:
+            self._sync()
+            self._log.close()
+            self._log = None
+        self._segment += 1
+        self.records_since_snapshot = 0
+
+    def _segments(self) -> list[int]:
+        segments = list()
+        for name in os.listdir(self.directory):
+            match = _SEGMENT_FILE.fullmatch(name)
+            if match is not None:
+                segments.append(int(match.group(1)))
+        return sorted(segments)
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"journal.{segment}.log")
+
+    def _ensure_open(self) -> None:
+        if self._log is not None:
+            return
+        self._log = open(self.log_path, "ab", buffering=1 << 16)
+        if self.fsync_interval_ms > 0 and self._flusher is None:
+            self._flusher = threading.Thread(
+                target=self._flush_periodically, daemon=True
+            )
+            self._flusher.start()
+
+    def _flush_periodically(self) -> None:
+        interval = self.fsync_interval_ms / 1000
+        while not self._closed.wait(interval):
+            with self._lock:
+                if self._dirty and self._log is not None:
+                    self._sync()
+
+    def _sync(self) -> None:
+        self._log.flush()
+        os.fsync(self._log.fileno())
+        self._dirty = False
+
+
+def _encode(record: Record) -> bytes:
+    payload = json.dumps(record, separators=(",", ":")).encode()
+    return _FRAME_HEADER.pack(len(payload)) + payload
+
+
+def _read_frames(path: str) -> Iterator[Record]:
+    for record, _ in _read_frames_with_offsets(path):
+        yield record
+
+
+def _read_frames_with_offsets(path: str) -> Iterator[tuple[Record, int]]:
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return
+    with open(path, "rb") as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            size = len(data)
+            offset = 0
+            while offset + _FRAME_HEADER.size <= size:
+                (length,) = _FRAME_HEADER.unpack_from(data, offset)
+                start = offset + _FRAME_HEADER.size
+                end = start + length
+                if end > size:
+                    return
+                try:
+                    record = json.loads(data[start:end])
+                except ValueError:
+                    return
+                yield record, end
+                offset = end
@@ -0,0 +1,83 @@
+from collections.abc import Sequence
+from dataclasses import dataclass
+from typing import Any, Callable, Iterator
+
+SELECTIN = "selectin"
+JOINED = "joined"
+LAZY = "lazy"
+
+
+@dataclass(frozen=True)
+class LoadOption:
+    # path is a relationship of the entities read, such as "options", or
+    # a dotted path through one, such as "created_polls.options"
+    path: str
+    strategy: str
+
+
+def selectin(path: str) -> LoadOption:
+    # one extra query for the whole result set, keyed by = ANY
+    return LoadOption(path, SELECTIN)
+
+
+def joined(path: str) -> LoadOption:
+    # joined into the read itself, best for single entities
+    return LoadOption(path, JOINED)
+
+
+def lazy(path: str) -> LoadOption:
+    # queried on first access, never if the field is not touched
+    return LoadOption(path, LAZY)
+
+
+def strategy_for(load: Sequence[LoadOption], path: str) -> str | None:
+    # None leaves the field unloaded
+    for option in load:
+        if option.path == path:
+            return option.strategy
+    return None
+
+
+def nested(load: Sequence[LoadOption], path: str) -> tuple[LoadOption, ...]:
+    # the options below path, relative to the entities it leads to
+    prefix = path + "."
+    return tuple(
+        LoadOption(option.path[len(prefix) :], option.strategy)
+        for option in load
+        if option.path.startswith(prefix)
+    )
+
+
+class LazyList(Sequence):
+    # stands in for a relationship list until it is first read
+    def __init__(self, load: Callable[[], list]) -> None:
+        self._load = load
+        self._items: list | None = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._items is not None
+
+    def __getitem__(self, index: Any) -> Any:
+        return self._materialize()[index]
+
+    def __len__(self) -> int:
+        return len(self._materialize())
+
+    def __iter__(self) -> Iterator:
+        return iter(self._materialize())
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, LazyList):
+            other = other._materialize()
+        return self._materialize() == other
+
+    def __repr__(self) -> str:
+        if self._items is None:
+            return "LazyList(<not loaded>)"
+        return f"LazyList({self._items!r})"
+
+    def _materialize(self) -> list:
+        if self._items is None:
+            self._items = self._load()
+        return self._items
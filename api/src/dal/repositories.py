@@ -1,22 +1,185 @@
+import functools
+import io
+import sys
+import time
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Any
+from typing import IO, TYPE_CHECKING, Any, Iterator, Sequence
 
+from psycopg2 import Error as PsycopgError
 from psycopg2._psycopg import cursor
-from psycopg2.errors import UniqueViolation, ForeignKeyViolation
+from psycopg2.errors import (
+    UniqueViolation,
+    ForeignKeyViolation,
+    QueryCanceled,
+)
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
 from psycopg2.extras import execute_values
 
-from .dal_entities import UserEntity, PollEntity, OptionEntity, VoteEntity
+from .dal_entities import (
+    UserEntity,
+    PollEntity,
+    OptionEntity,
+    VoteEntity,
+    PollSearchHit,
+    PollVoteTotal,
+)
 from .exceptions import (
+    NotFoundException,
     DalUniqueViolationException,
     DalForeignKeyViolationException,
     DalUnexpectedError,
     DalNotFound,
+    DalDeadlineExceeded,
 )
+from .loading import (
+    LoadOption,
+    LazyList,
+    SELECTIN,
+    JOINED,
+    LAZY,
+    joined,
+    strategy_for,
+    nested,
+)
+from .slow_query_log import SlowQueryLog, normalize_statement
+from src.metrics import DB_QUERY_SECONDS, DB_QUERY_ROWS
+from src.tracing import current_span, record_sql
+from src.deadline import remaining_s, record_query
+
+if TYPE_CHECKING:
+    import numpy as np
+
+_POLL_COLUMNS = """polls.id, polls.name, polls.tag, polls.user_id,
+            polls.anonymous_voting, polls.multiple_choice,
+            polls.creation_date"""
+# per-option counts summed from the daily rollups, a few rows per option
+# instead of one per vote. Every count read goes through this, so polls
+# and results never disagree; day rows are kept for good
+_OPTION_VOTES = """(
+                SELECT COALESCE(SUM(vote_rollups.votes), 0)
+                FROM vote_rollups
+                WHERE vote_rollups.option_id = options.id
+                    AND vote_rollups.resolution = 'd'
+            )"""
+
+_COPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+
+
+class TimedCursor:
+    # wraps a cursor and times execute and fetch calls, labelled with the
+    # repository method that issued them
+    def __init__(
+        self, crs: cursor, slow_query_log: SlowQueryLog | None = None
+    ):
+        self.cursor = crs
+        self.slow_query_log = slow_query_log
+        # set with SET LOCAL, so it only holds until the transaction ends
+        self._statement_timeout_ms = 0
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.cursor, name)
+
+    def execute(self, query, vars=None) -> None:
+        with self._statement(query, vars):
+            self.cursor.execute(self._with_deadline(query), vars)
+
+    def copy_expert(self, sql: str, file: IO) -> None:
+        # COPY has to be sent on its own, so the timeout goes ahead of it
+        with self._statement(sql, None):
+            timeout = self._timeout_statement()
+            if timeout is not None:
+                self.cursor.execute(timeout)
+            self.cursor.copy_expert(sql, file)
+
+    @contextmanager
+    def _statement(self, query, vars) -> Iterator[None]:
+        record_query()
+        start = time.perf_counter_ns()
+        try:
+            yield
+        except DalDeadlineExceeded:
+            # out of time before the statement was sent; earlier writes of
+            # the transaction must not be committed by the next request
+            self.cursor.connection.rollback()
+            raise
+        except QueryCanceled:
+            # the transaction is aborted either way, so the connection
+            # is made usable again for the next request
+            self.cursor.connection.rollback()
+            raise DalDeadlineExceeded(_caller())
+        except PsycopgError:
+            # likewise for constraint violations and any other failed
+            # statement; the caller still sees the original error
+            self.cursor.connection.rollback()
+            raise
+        finally:
+            duration = (time.perf_counter_ns() - start) / 1e9
+            method = _caller()
+            DB_QUERY_SECONDS.observe((method, "execute"), duration)
+            if self.slow_query_log is not None:
+                self.slow_query_log.record(query, vars, duration, method)
+            if current_span() is not None:
+                record_sql(normalize_statement(query), method, start)
+
+    def _with_deadline(self, query: str | bytes) -> str | bytes:
+        # the timeout travels in the same round trip as the statement
+        timeout = self._timeout_statement()
+        if timeout is None:
+            return query
+        if isinstance(query, bytes):
+            return timeout.encode() + b" " + query
+        return f"{timeout} {query}"
+
+    def _timeout_statement(self) -> str | None:
+        remaining = remaining_s()
+        status = self.cursor.connection.info.transaction_status
+        if status == TRANSACTION_STATUS_IDLE:
+            # committed or rolled back, which undid the last SET LOCAL
+            self._statement_timeout_ms = 0
+        if remaining is None:
+            if self._statement_timeout_ms == 0:
+                return None
+            timeout_ms = 0
+        elif remaining <= 0:
+            raise DalDeadlineExceeded(_caller())
+        else:
+            timeout_ms = max(1, int(remaining * 1000))
+        self._statement_timeout_ms = timeout_ms
+        return f"SET LOCAL statement_timeout = {timeout_ms};"
+
+    def fetchone(self) -> tuple | None:
+        start = time.perf_counter()
+        row = self.cursor.fetchone()
+        self._observe_fetch(start, 0 if row is None else 1)
+        return row
+
+    def fetchmany(self, size: int | None = None) -> list[tuple]:
+        start = time.perf_counter()
+        if size is None:
+            rows = self.cursor.fetchmany()
+        else:
+            rows = self.cursor.fetchmany(size)
+        self._observe_fetch(start, len(rows))
+        return rows
+
+    def fetchall(self) -> list[tuple]:
+        start = time.perf_counter()
+        rows = self.cursor.fetchall()
+        self._observe_fetch(start, len(rows))
+        return rows
+
+    def _observe_fetch(self, start: float, rows: int) -> None:
+        method = _caller()
+        DB_QUERY_SECONDS.observe(
+            (method, "fetch"), time.perf_counter() - start
+        )
+        DB_QUERY_ROWS.inc((method,), rows)
 
 
 class GenericRepository:
     def __init__(self, crs: cursor):
-        self.cur = crs
+        self.cur = crs if isinstance(crs, TimedCursor) else TimedCursor(crs)
 
     def commit(self) -> None:
         self.cur.connection.commit()
@@ -25,8 +188,10 @@ class GenericRepository:
 class UserRepository(GenericRepository):
     def __init__(self, crs: cursor):
         super().__init__(crs)
+        # reads created polls, on the same cursor
+        self._poll_repository: PollRepository | None = None
 
-    def update_user(self, user: UserEntity) -> None:
+    def update_user(self, user: UserEntity, commit: bool = True) -> None:
         found_user = self.get_user_by_id(user_id=user.id)
         _ensure_found(
             found_user,
@@ -34,55 +199,71 @@ class UserRepository(GenericRepository):
             column_name="id",
             identifier=user.id,
         )
-        self.cur.execute(
-            """
-        UPDATE users
-        SET name = %s, password_hash = %s
-        WHERE id = %s;
-        """,
-            (user.name, user.password_hash, user.id),
-        )
+        try:
+            self.cur.execute(
+                """
+            UPDATE users
+            SET name = %s, password_hash = %s
+            WHERE id = %s;
+            """,
+                (user.name, user.password_hash, user.id),
+            )
+        except UniqueViolation:
+            raise DalUniqueViolationException("users", "name", user.name)
+
+        if commit:
+            self.commit()
 
     def create_user(
             self, name: str, password_hash: str, commit: bool = True
-    ) -> None:
+    ) -> UserEntity:
         try:
             self.cur.execute(
                 """
                 INSERT INTO users
                 (name, password_hash)
                 VALUES (%s, %s)
+                RETURNING id;
                 """,
                 (name, password_hash),
             )
         except UniqueViolation:
             raise DalUniqueViolationException("users", "name", name)
+        user_id = self.cur.fetchone()[0]
 
         if commit:
             self.commit()
+        return UserEntity(id=user_id, name=name, password_hash=password_hash)
 
     def get_users(
-            self, user_ids: list[int] | None = None
+            self,
+            user_ids: list[int] | None = None,
+            load: Sequence[LoadOption] = (),
     ) -> list[UserEntity]:
+        if user_ids is None:
+            return self._read_users("TRUE", {}, load)
+        return self._read_users(
+            "users.id = ANY(%(user_ids)s)", {"user_ids": list(user_ids)}, load
+        )
+
+    def get_user_rows(
+            self, user_ids: list[int] | None = None
+    ) -> list[tuple[int, str]]:
         if user_ids is None:
             self.cur.execute(
                 """
-            SELECT id, name, password_hash FROM users;
+            SELECT id, name FROM users;
             """
             )
         else:
             self.cur.execute(
                 """
-            SELECT id, name, password_hash FROM users
+            SELECT id, name FROM users
             WHERE id IN %s;
             """,
                 (tuple(user_ids),),
             )
-        rows = self.cur.fetchall()
-        return [
-            UserEntity(id=row[0], name=row[1], password_hash=row[2])
-            for row in rows
-        ]
+        return self.cur.fetchall()
 
     def delete_user(self, user_id: int, commit: bool = True) -> None:
         self.cur.execute(
@@ -95,32 +276,93 @@ class UserRepository(GenericRepository):
         if commit:
             self.commit()
 
-    def get_user_by_id(self, user_id: int) -> UserEntity | None:
-        self.cur.execute(
-            """
-        SELECT id, name, password_hash FROM users
-        WHERE id = %s;
-        """,
-            (user_id,),
+    def get_user(self, user_id: int) -> UserEntity:
+        user = self.get_user_by_id(user_id)
+        if user is None:
+            raise NotFoundException(UserEntity, user_id)
+        return user
+
+    def get_user_by_id(
+            self, user_id: int, load: Sequence[LoadOption] = ()
+    ) -> UserEntity | None:
+        return _first(
+            self._read_users(
+                "users.id = %(user_id)s", {"user_id": user_id}, load
+            )
+        )
+
+    def get_user_by_name(
+            self, name: str, load: Sequence[LoadOption] = ()
+    ) -> UserEntity | None:
+        return _first(
+            self._read_users("users.name = %(name)s", {"name": name}, load)
         )
-        return self._fetch_user()
 
-    def get_user_by_name(self, name: str) -> UserEntity | None:
+    def _read_users(
+            self, where: str, params: dict, load: Sequence[LoadOption]
+    ) -> list[UserEntity]:
+        strategy = strategy_for(load, "created_polls")
+        poll_load = nested(load, "created_polls")
+        if self._poll_repository is None:
+            self._poll_repository = PollRepository(self.cur)
+        polls = self._poll_repository
+
+        if strategy == JOINED:
+            self.cur.execute(
+                f"""
+            SELECT users.id, users.name, users.password_hash, {_POLL_COLUMNS}
+            FROM users
+            LEFT JOIN polls ON polls.user_id = users.id
+            WHERE {where}
+            ORDER BY users.id, polls.id;
+            """,
+                params,
+            )
+            users = list()
+            created_polls = list()
+            for row in self.cur.fetchall():
+                if len(users) == 0 or users[-1].id != row[0]:
+                    users.append(self._to_user(row[:3]))
+                    users[-1].created_polls = list()
+                if row[3] is not None:
+                    poll = PollRepository._to_poll(row[3:])
+                    users[-1].created_polls.append(poll)
+                    created_polls.append(poll)
+            polls._load_options(
+                created_polls, strategy_for(poll_load, "options")
+            )
+            return users
+
         self.cur.execute(
-            """
-        SELECT id, name, password_hash FROM users
-        WHERE name = %s;
+            f"""
+        SELECT users.id, users.name, users.password_hash
+        FROM users
+        WHERE {where};
         """,
-            (name,),
+            params,
         )
-        return self._fetch_user()
+        users = [self._to_user(row) for row in self.cur.fetchall()]
+        if strategy == LAZY:
+            for user in users:
+                user.created_polls = LazyList(
+                    functools.partial(
+                        polls.get_polls_by_user, user.id, poll_load
+                    )
+                )
+        elif strategy == SELECTIN:
+            created_polls = {user.id: list() for user in users}
+            if len(created_polls) > 0:
+                for poll in polls.get_polls_by_users(
+                    list(created_polls), poll_load
+                ):
+                    created_polls[poll.user_id].append(poll)
+            for user in users:
+                user.created_polls = created_polls[user.id]
+        return users
 
-    def _fetch_user(self) -> UserEntity | None:
-        rows = self.cur.fetchmany(1)
-        if len(rows) == 0:
-            return None
-        row = rows[0]
-        return UserEntity(id=row[0], name=row[1], password_hash=row[2])
+    @staticmethod
+    def _to_user(data: tuple[int, str, str]) -> UserEntity:
+        return UserEntity(id=data[0], name=data[1], password_hash=data[2])
 
 
 class PollRepository(GenericRepository):
@@ -172,60 +414,153 @@ class PollRepository(GenericRepository):
             self.commit()
 
     def get_polls(
-            self, poll_ids: list[int] | None = None
+            self,
+            poll_ids: list[int] | None = None,
+            load: Sequence[LoadOption] = (),
     ) -> list[PollEntity]:
         if poll_ids is None:
-            self.cur.execute(
-                """
-            SELECT id, name, tag, user_id, anonymous_voting, multiple_choice, creation_date
-            FROM polls;
-            """
-            )
-        else:
-            self.cur.execute(
-                """
-            SELECT id, name, tag, user_id, anonymous_voting, multiple_choice, creation_date
-            FROM polls
-            WHERE id IN %s;
-            """,
-                (tuple(poll_ids),),
-            )
-        return self._fetch_polls()
+            return self._read_polls("TRUE", {}, load)
+        return self._read_polls(
+            "polls.id = ANY(%(poll_ids)s)", {"poll_ids": list(poll_ids)}, load
+        )
 
-    def get_poll_by_id(self, poll_id: int) -> PollEntity | None:
+    def get_polls_with_options(
+            self,
+            poll_ids: list[int] | None = None,
+            user_id: int | None = None,
+            with_counts: bool = False,
+    ) -> list[PollEntity]:
+        # polls of the given ids or user with their options joined in, so
+        # polls, options and counts share a snapshot
+        conditions = list()
+        if poll_ids is not None:
+            conditions.append("polls.id = ANY(%(poll_ids)s)")
+        if user_id is not None:
+            conditions.append("polls.user_id = %(user_id)s")
+        return self._read_polls(
+            " AND ".join(conditions) or "TRUE",
+            {"poll_ids": list(poll_ids or []), "user_id": user_id},
+            (joined("options"),),
+            with_counts,
+        )
+
+    def search_polls(
+            self,
+            query: str,
+            limit: int,
+            cursor: tuple[float, int] | None = None,
+    ) -> list[PollSearchHit]:
+        # ranks can't be indexed, so the matches are ranked and the page
+        # continues after the (rank, id) of the last hit of the previous one
+        after_rank, after_id = cursor if cursor is not None else (None, None)
         self.cur.execute(
             """
-        SELECT id, name, tag, user_id, anonymous_voting, multiple_choice, creation_date
-        FROM polls
-        WHERE id = %s;
+        WITH matches AS (
+            SELECT id, name, tag, user_id, anonymous_voting, multiple_choice,
+                creation_date,
+                greatest(
+                    ts_rank(search_vector, query),
+                    similarity(search_text, lower(%(query)s))
+                )::float8 AS rank
+            FROM polls, websearch_to_tsquery('simple', %(query)s) AS query
+            WHERE search_vector @@ query
+                OR search_text %% lower(%(query)s)
+        )
+        SELECT id, name, tag, user_id, anonymous_voting, multiple_choice,
+            creation_date, rank
+        FROM matches
+        WHERE %(after_rank)s::float8 IS NULL
+            OR (rank, id) < (%(after_rank)s::float8, %(after_id)s::int)
+        ORDER BY rank DESC, id DESC
+        LIMIT %(limit)s;
         """,
-            (poll_id,),
+            {
+                "query": query,
+                "after_rank": after_rank,
+                "after_id": after_id,
+                "limit": limit,
+            },
         )
-        return self._fetch_poll()
+        rows = self.cur.fetchall()
+        return [
+            PollSearchHit(poll=self._to_poll(row[:7]), rank=row[7])
+            for row in rows
+        ]
 
-    def get_polls_by_user(self, user_id: int) -> list[PollEntity]:
+    def get_leaderboard(
+            self,
+            tag: str | None,
+            limit: int,
+            cursor: tuple[int, int] | None = None,
+    ) -> list[PollVoteTotal]:
+        # walks poll_vote_totals_tag_idx (or _votes_idx) backwards from
+        # the (votes, poll_id) of the previous page
+        conditions = list()
+        if tag is not None:
+            conditions.append("totals.tag = %(tag)s")
+        if cursor is not None:
+            conditions.append(
+                "(totals.votes, totals.poll_id) < (%(votes)s, %(poll_id)s)"
+            )
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
         self.cur.execute(
-            """
-        SELECT id, name, tag, user_id, anonymous_voting, multiple_choice
-        FROM polls
-        WHERE user_id = %s;
+            f"""
+        SELECT totals.poll_id, polls.name, totals.tag, totals.votes
+        FROM poll_vote_totals AS totals
+        JOIN polls ON polls.id = totals.poll_id
+        {where}
+        ORDER BY totals.votes DESC, totals.poll_id DESC
+        LIMIT %(limit)s;
         """,
-            (user_id,),
+            {
+                "tag": tag,
+                "votes": None if cursor is None else cursor[0],
+                "poll_id": None if cursor is None else cursor[1],
+                "limit": limit,
+            },
+        )
+        return [
+            PollVoteTotal(
+                poll_id=row[0], name=row[1], tag=row[2], votes=row[3]
+            )
+            for row in self.cur.fetchall()
+        ]
+
+    def get_poll_by_id(
+            self, poll_id: int, load: Sequence[LoadOption] = ()
+    ) -> PollEntity | None:
+        return _first(
+            self._read_polls(
+                "polls.id = %(poll_id)s", {"poll_id": poll_id}, load
+            )
+        )
+
+    def get_polls_by_user(
+            self, user_id: int, load: Sequence[LoadOption] = ()
+    ) -> list[PollEntity]:
+        return self._read_polls(
+            "polls.user_id = %(user_id)s", {"user_id": user_id}, load
+        )
+
+    def get_polls_by_users(
+            self, user_ids: list[int], load: Sequence[LoadOption] = ()
+    ) -> list[PollEntity]:
+        return self._read_polls(
+            "polls.user_id = ANY(%(user_ids)s)",
+            {"user_ids": list(user_ids)},
+            load,
         )
-        return self._fetch_polls()
 
     def get_poll_by_user_and_tag(
-            self, user_id: int, tag: str
+            self, user_id: int, tag: str, load: Sequence[LoadOption] = ()
     ) -> PollEntity | None:
-        self.cur.execute(
-            """
-        SELECT id, name, tag, user_id, anonymous_voting, multiple_choice, creation_date
-        FROM polls
-        WHERE tag = %s AND user_id = %s;
-        """,
-            (tag, user_id),
+        return _first(
+            self._read_polls(
+                "polls.tag = %(tag)s AND polls.user_id = %(user_id)s",
+                {"tag": tag, "user_id": user_id},
+                load,
+            )
         )
-        return self._fetch_poll()
 
     def delete_poll(self, poll_id: int, commit: bool = True) -> None:
         self.cur.execute(
@@ -274,6 +609,80 @@ class PollRepository(GenericRepository):
             return None
         return OptionEntity(id=row[0], text=row[1], poll_id=row[2])
 
+    def _read_polls(
+            self,
+            where: str,
+            params: dict,
+            load: Sequence[LoadOption],
+            with_counts: bool = False,
+    ) -> list[PollEntity]:
+        strategy = strategy_for(load, "options")
+        if strategy != JOINED:
+            self.cur.execute(
+                f"""
+            SELECT {_POLL_COLUMNS}
+            FROM polls
+            WHERE {where};
+            """,
+                params,
+            )
+            polls = self._fetch_polls()
+            self._load_options(polls, strategy)
+            return polls
+
+        self.cur.execute(
+            f"""
+        SELECT {_POLL_COLUMNS}, options.id, options.text,
+            {_OPTION_VOTES if with_counts else "NULL"}
+        FROM polls
+        LEFT JOIN options ON options.poll_id = polls.id
+        WHERE {where}
+        ORDER BY polls.id, options.id;
+        """,
+            params,
+        )
+        polls = list()
+        for row in self.cur.fetchall():
+            if len(polls) == 0 or polls[-1].id != row[0]:
+                polls.append(self._to_poll(row[:7]))
+                polls[-1].options = list()
+            if row[7] is not None:
+                polls[-1].options.append(
+                    OptionEntity(
+                        id=row[7], poll_id=row[0], text=row[8], votes=row[9]
+                    )
+                )
+        return polls
+
+    def _load_options(
+            self, polls: list[PollEntity], strategy: str | None
+    ) -> None:
+        if strategy == LAZY:
+            for poll in polls:
+                poll.options = LazyList(
+                    functools.partial(self.get_options_for_poll, poll.id)
+                )
+        elif strategy == SELECTIN:
+            options = {poll.id: list() for poll in polls}
+            if len(options) > 0:
+                self.cur.execute(
+                    """
+                SELECT id, text, poll_id
+                FROM options
+                WHERE poll_id = ANY(%s)
+                ORDER BY id;
+                """,
+                    (list(options),),
+                )
+                for row in self.cur.fetchall():
+                    options[row[2]].append(
+                        OptionEntity(id=row[0], text=row[1], poll_id=row[2])
+                    )
+            for poll in polls:
+                poll.options = options[poll.id]
+        elif strategy is not None:
+            raise ValueError(f"Options can't be loaded {strategy} here")
+
     def _fetch_polls(self) -> list[PollEntity]:
         rows = self.cur.fetchall()
         return [self._to_poll(row) for row in rows]
@@ -324,14 +733,19 @@ class VoteRepository(GenericRepository):
             identifier=option_id,
         )
 
-        self.cur.execute(
-            """
-        INSERT INTO votes
-        (user_id, option_id)
-        values (%s, %s);
-        """,
-            (user_id, option_id),
-        )
+        try:
+            self.cur.execute(
+                """
+            INSERT INTO votes
+            (user_id, option_id)
+            values (%s, %s);
+            """,
+                (user_id, option_id),
+            )
+        except UniqueViolation:
+            raise DalUniqueViolationException(
+                "votes", "user_id, option_id", f"{user_id}, {option_id}"
+            )
 
         if commit:
             self.commit()
@@ -398,6 +812,165 @@ class VoteRepository(GenericRepository):
 
         return self.fetch_votes()
 
+    def get_vote_changes(
+            self, since: int | None
+    ) -> tuple[int, list[tuple[str, int, int | None, int, int]]]:
+        # (position, changes) where changes are the votes inserted ("i")
+        # and deleted ("d") since the given position, as (change, vote_id,
+        # poll_id, option_id, user_id). The position is the snapshot's
+        # xmin: every transaction below it has committed or aborted, so
+        # passing it back as since neither skips nor repeats a change
+        if since is None:
+            self.cur.execute(
+                """
+        SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint;
+        """
+            )
+            return self.cur.fetchall()[0][0], []
+        self.cur.execute(
+            """
+        WITH horizon AS (
+            SELECT pg_snapshot_xmin(pg_current_snapshot()) AS xmin
+        )
+        SELECT horizon.xmin::text::bigint, vote_changes.change,
+            vote_changes.vote_id, vote_changes.poll_id,
+            vote_changes.option_id, vote_changes.user_id
+        FROM horizon
+        LEFT JOIN vote_changes
+            ON vote_changes.xid >= %s::text::xid8
+            AND vote_changes.xid < horizon.xmin
+        ORDER BY vote_changes.xid, vote_changes.seq;
+        """,
+            (since,),
+        )
+        rows = self.cur.fetchall()
+        return rows[0][0], [
+            tuple(row[1:]) for row in rows if row[1] is not None
+        ]
+
+    def get_vote_counts_by_poll(self, poll_id: int) -> dict[int, int]:
+        self.cur.execute(
+            f"""
+        SELECT options.id, {_OPTION_VOTES} FROM options
+        WHERE options.poll_id = %s;
+        """,
+            (poll_id,),
+        )
+
+        return {row[0]: row[1] for row in self.cur.fetchall()}
+
+    def get_vote_counts_by_polls(
+            self, poll_ids: list[int]
+    ) -> dict[int, dict[int, int]]:
+        # poll_id -> option_id -> votes, options in id order
+        self.cur.execute(
+            f"""
+        SELECT options.poll_id, options.id, {_OPTION_VOTES}
+        FROM options
+        WHERE options.poll_id = ANY(%s)
+        ORDER BY options.poll_id, options.id;
+        """,
+            (list(poll_ids),),
+        )
+        counts = dict()
+        for poll_id, option_id, votes in self.cur.fetchall():
+            counts.setdefault(poll_id, dict())[option_id] = votes
+        return counts
+
+    def get_vote_rollups(
+            self,
+            poll_id: int,
+            resolution: str,
+            start: datetime,
+            end: datetime,
+    ) -> list[tuple[int, datetime, int]]:
+        # (option_id, bucket, votes) for the non-empty buckets in range
+        self.cur.execute(
+            """
+        SELECT vote_rollups.option_id, vote_rollups.bucket, vote_rollups.votes
+        FROM options
+        JOIN vote_rollups ON vote_rollups.option_id = options.id
+        WHERE options.poll_id = %s
+            AND vote_rollups.resolution = %s
+            AND vote_rollups.bucket >= %s
+            AND vote_rollups.bucket < %s;
+        """,
+            (poll_id, resolution, start, end),
+        )
+        return [(row[0], row[1], row[2]) for row in self.cur.fetchall()]
+
+    def delete_vote_rollups_before(
+            self, resolution: str, before: datetime, commit: bool = True
+    ) -> None:
+        self.cur.execute(
+            """
+        DELETE FROM vote_rollups
+        WHERE resolution = %s AND bucket < %s;
+        """,
+            (resolution, before),
+        )
+
+        if commit:
+            self.commit()
+
+    def delete_vote_changes_before(
+            self, before: datetime, commit: bool = True
+    ) -> None:
+        self.cur.execute(
+            """
+        DELETE FROM vote_changes WHERE changed_at < %s;
+        """,
+            (before,),
+        )
+
+        if commit:
+            self.commit()
+
+    def get_poll_voters(
+            self, poll_id: int
+    ) -> tuple["np.ndarray", "np.ndarray"]:
+        # (user_ids, option_ids) of every vote in the poll, copied in
+        # binary straight into arrays instead of one tuple per row
+        query = self.cur.mogrify(
+            """
+        COPY (
+            SELECT votes.user_id, votes.option_id FROM votes
+            JOIN options ON votes.option_id = options.id
+            WHERE options.poll_id = %s
+        ) TO STDOUT WITH (FORMAT binary);
+        """,
+            (poll_id,),
+        )
+        buffer = io.BytesIO()
+        self.cur.copy_expert(query.decode(), buffer)
+        rows = _decode_int_pairs(buffer.getbuffer())
+        return (
+            rows["first"].astype("int64"),
+            rows["second"].astype("int64"),
+        )
+
+    def iter_option_voters(
+            self, batch_size: int = 50_000
+    ) -> Iterator[tuple[int, int]]:
+        # (option_id, user_id) ordered by option, streamed through a
+        # server-side cursor so the whole table is never held in memory
+        named = self.cur.connection.cursor(name="option_voters")
+        try:
+            named.execute(
+                """
+            SELECT option_id, user_id FROM votes
+            ORDER BY option_id, user_id;
+            """
+            )
+            while True:
+                rows = named.fetchmany(batch_size)
+                if len(rows) == 0:
+                    break
+                yield from rows
+        finally:
+            named.close()
+            self.commit()
+
     def fetch_votes(self) -> list[VoteEntity]:
         rows = self.cur.fetchall()
         return [self._to_vote(row) for row in rows]
@@ -415,8 +988,60 @@ class VoteRepository(GenericRepository):
         )
 
 
+@functools.cache
+def _copy_int_pair() -> "np.dtype":
+    # binary COPY rows of two int4 columns: field count, then length and
+    # value per field, all big-endian. numpy is only imported by the
+    # analytics reads that need it
+    import numpy as np
+
+    return np.dtype(
+        [
+            ("fields", ">i2"),
+            ("first_length", ">i4"),
+            ("first", ">i4"),
+            ("second_length", ">i4"),
+            ("second", ">i4"),
+        ]
+    )
+
+
+def _decode_int_pairs(data: memoryview) -> "np.ndarray":
+    import numpy as np
+
+    if bytes(data[:11]) != _COPY_SIGNATURE:
+        raise DalUnexpectedError("Unexpected binary COPY header")
+    # signature, flags and the header extension, then the rows and a
+    # two byte trailer
+    row = _copy_int_pair()
+    extension = int.from_bytes(data[15:19], "big")
+    offset = 19 + extension
+    count = (len(data) - offset - 2) // row.itemsize
+    return np.frombuffer(data, row, count=count, offset=offset)
+
+
+def _first(entities: list) -> Any:
+    return entities[0] if len(entities) > 0 else None
+
+
 def _ensure_found(
         obj: Any, table_name: str, column_name: str, identifier: str | int
 ) -> None:
     if obj is None:
         raise DalNotFound(table_name, column_name, identifier)
+
+
+def _caller() -> str:
+    # the nearest public method of this module is the repository method;
+    # private helpers and execute_values may sit in between
+    frame = sys._getframe(2)
+    while frame is not None:
+        code = frame.f_code
+        if (
+            code.co_filename == __file__
+            and not code.co_name.startswith("_")
+            and not code.co_qualname.startswith("TimedCursor.")
+        ):
+            return code.co_qualname
+        frame = frame.f_back
+    return "unknown"
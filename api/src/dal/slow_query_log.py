@@ -0,0 +1,174 @@
+import logging
+import os
+import queue
+import re
+import sys
+import threading
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+_DAL_DIR = os.path.dirname(os.path.abspath(__file__))
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![\w$%.])-?\d+(?:\.\d+)?\b")
+# a run of identical tuples, as left by execute_values once the literals
+# are masked
+_REPEATED_TUPLE = re.compile(r"(\([^()]*\))(?: ?, ?\1)+")
+
+
+@dataclass
+class SlowQuery:
+    statement: str
+    parameters: list[str]
+    method: str
+    origin: str
+    duration_ms: float
+    logged_at: datetime
+    plan: str | None = None
+
+
+class SlowQueryLog:
+    def __init__(
+        self,
+        threshold_ms: float,
+        capacity: int = 100,
+        explain_connect: Callable[[], Any] | None = None,
+    ) -> None:
+        self.threshold_ms = threshold_ms
+        self.capacity = capacity
+        self._entries: deque[SlowQuery] = deque(maxlen=capacity)
+        # least recently logged statements are dropped past capacity
+        self._explained: OrderedDict[str, str | None] = OrderedDict()
+        self._explain_connect = explain_connect
+        self._explain_queue: queue.Queue = queue.Queue(maxsize=capacity)
+        self._lock = threading.Lock()
+        self._explainer: threading.Thread | None = None
+
+    def record(
+        self, query: str | bytes, vars: Any, duration_s: float, method: str
+    ) -> None:
+        duration_ms = duration_s * 1000
+        if duration_ms < self.threshold_ms:
+            return
+
+        statement = normalize_statement(query)
+        entry = SlowQuery(
+            statement=statement,
+            parameters=_redact(vars),
+            method=method,
+            origin=_origin(),
+            duration_ms=duration_ms,
+            logged_at=datetime.now(),
+            plan=self._explained.get(statement),
+        )
+        logger.warning(
+            "slow query %.1f ms in %s from %s: %s %s",
+            duration_ms,
+            entry.method,
+            entry.origin,
+            statement,
+            entry.parameters,
+        )
+        with self._lock:
+            self._entries.append(entry)
+            if self._explain_connect is None:
+                return
+            if statement in self._explained:
+                self._explained.move_to_end(statement)
+                return
+            # one plan per distinct statement; None marks it as queued
+            self._explained[statement] = None
+            if len(self._explained) > self.capacity:
+                self._explained.popitem(last=False)
+        self._ensure_explainer()
+        try:
+            self._explain_queue.put_nowait((statement, query, vars))
+        except queue.Full:
+            with self._lock:
+                self._explained.pop(statement, None)
+
+    def entries(self) -> list[SlowQuery]:
+        with self._lock:
+            entries = list(self._entries)
+        for entry in entries:
+            if entry.plan is None:
+                entry.plan = self._explained.get(entry.statement)
+        return entries
+
+    def wait_for_plans(self) -> None:
+        self._explain_queue.join()
+
+    def _ensure_explainer(self) -> None:
+        with self._lock:
+            if self._explainer is not None:
+                return
+            self._explainer = threading.Thread(
+                target=self._explain_forever, daemon=True
+            )
+        self._explainer.start()
+
+    def _explain_forever(self) -> None:
+        connection = None
+        while True:
+            statement, query, vars = self._explain_queue.get()
+            try:
+                if connection is None or connection.closed:
+                    connection = self._explain_connect()
+                plan = _explain(connection, query, vars)
+            except Exception as e:
+                plan = f"EXPLAIN failed: {type(e).__name__}: {e}".strip()
+            finally:
+                self._explain_queue.task_done()
+            with self._lock:
+                if statement in self._explained:
+                    self._explained[statement] = plan
+
+
+def _explain(connection, query: str | bytes, vars: Any) -> str:
+    # ANALYZE runs the statement, so it happens in a transaction on a side
+    # connection that is always rolled back, writes included
+    cur = connection.cursor()
+    try:
+        if isinstance(query, bytes):
+            query = query.decode()
+        cur.execute(f"EXPLAIN (ANALYZE, BUFFERS) {query}", vars)
+        return "\n".join(row[0] for row in cur.fetchall())
+    finally:
+        connection.rollback()
+        cur.close()
+
+
+def normalize_statement(query: str | bytes) -> str:
+    # statements built by execute_values arrive with their values inlined,
+    # so literals are masked and their rows collapsed into one
+    if isinstance(query, bytes):
+        query = query.decode(errors="replace")
+    statement = _STRING_LITERAL.sub("'?'", " ".join(query.split()))
+    statement = _NUMBER_LITERAL.sub("?", statement)
+    return _REPEATED_TUPLE.sub(r"\1, ...", statement)
+
+
+def _redact(vars: Any) -> list[str]:
+    if vars is None:
+        return []
+    if isinstance(vars, dict):
+        vars = vars.values()
+    return [f"<{type(value).__name__}>" for value in vars]
+
+
+def _origin() -> str:
+    # the first frame outside the DAL is the service method or endpoint
+    # that issued the query
+    frame = sys._getframe(2)
+    while frame is not None:
+        code = frame.f_code
+        if not code.co_filename.startswith(_DAL_DIR):
+            return (
+                f"{code.co_qualname} "
+                f"({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+            )
+        frame = frame.f_back
+    return "unknown"
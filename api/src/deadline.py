@@ -0,0 +1,46 @@
+import time
+from contextvars import ContextVar
+
+# absolute time.monotonic() by which the current request must be done
+_deadline: ContextVar[float | None] = ContextVar("deadline", default=None)
+
+
+def set_deadline(deadline: float | None):
+    return _deadline.set(deadline)
+
+
+def reset_deadline(token) -> None:
+    _deadline.reset(token)
+
+
+def get_deadline() -> float | None:
+    return _deadline.get()
+
+
+def remaining_s() -> float | None:
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+# statements run by the current request, counted so admission control
+# only learns from requests that reached the database
+_queries: ContextVar[list[int] | None] = ContextVar("queries", default=None)
+
+
+def count_queries() -> tuple[object, list[int]]:
+    # the list is shared with contexts copied from this one, so queries
+    # run on the database thread are counted too
+    counter = [0]
+    return _queries.set(counter), counter
+
+
+def reset_query_count(token) -> None:
+    _queries.reset(token)
+
+
+def record_query() -> None:
+    counter = _queries.get()
+    if counter is not None:
+        counter[0] += 1
@@ -1,27 +1,328 @@
-from fastapi import FastAPI, status, HTTPException
+import asyncio
+import contextvars
+import logging
+import os
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Literal,
+)
+
+from fastapi import (
+    FastAPI,
+    status,
+    HTTPException,
+    Response,
+    Request,
+    Depends,
+)
+from fastapi.responses import PlainTextResponse, JSONResponse
 from psycopg2 import connect
 
-from dal import (
+from src.bll.poll_service import PollService
+from src.bll.read_cache import ReadCache
+from src.bll.trending import TrendingPolls
+from src.bll.voter_index import VoterIndex
+from src.bll.bll_models import PollModel
+from src.bll.bll_exceptions import NotFound, NotAllowed, PollExistsException
+from src.dal import (
     NotFoundException,
-    InMemoryUserRepository,
+    DalDeadlineExceeded,
     UserEntity,
-    ensure_exists,
+    UserRepository,
+    PollRepository,
+    VoteRepository,
+    prepare_schema,
+    TimedCursor,
+    SlowQueryLog,
 )
-from view import (
+from src.dal.exceptions import DalUniqueViolationException
+from src.view import (
     CreateUserDto,
     GetUserDto,
     UpdateUserDto,
     DeleteUserDto,
     ChangePasswordDto,
+    GetPollDto,
+    GetPollResultsDto,
+    GetPollWithResultsDto,
+    PollSearchPageDto,
+    TrendingPollDto,
+    LeaderboardPageDto,
+    VoteSeriesDto,
+    OptionOverlapDto,
+    PollMembershipDto,
+    CrossTabDto,
+    PollStatisticsDto,
+    CreatePollDto,
+    CreateVoteDto,
+    PollCredentialsDto,
+    SlowQueryDto,
+    AllocationStatDto,
+)
+from src.view.poll_response_cache import PollResponseCache
+from src.view.metrics_middleware import MetricsMiddleware
+from src.view.tracing_middleware import TracingMiddleware
+from src.view.rate_limiter import (
+    RateLimiter,
+    RateLimitRule,
+    InMemoryBucketBackend,
+    SharedMemoryBucketBackend,
+    parse_rules,
 )
-from mapper import to_get_user_dto
-from configuration import DB_NAME, DB_USER
+from src.view.batch_loader import BatchLoader
+from src.view.admission import AdmissionController, AimdLimit, VegasLimit
+from src.metrics import render_prometheus
+from src.tracing import Tracer, FileExporter, OtlpHttpExporter
+from src.profiling import (
+    ProfilerBusy,
+    profiler,
+    allocation_tracker,
+    to_collapsed,
+    to_speedscope,
+)
+from src.mapper import (
+    to_get_user_dto,
+    user_rows_to_json,
+    to_get_poll_dto,
+    to_get_poll_results_dto,
+    to_get_poll_with_results_dto,
+    to_poll_search_page_dto,
+    from_search_cursor,
+    to_trending_poll_dto,
+    to_leaderboard_page_dto,
+    from_leaderboard_cursor,
+    to_vote_series_dto,
+    to_option_overlap_dto,
+    to_poll_membership_dto,
+    to_cross_tab_dto,
+    to_poll_statistics_dto,
+    to_slow_query_dto,
+    to_allocation_stat_dto,
+)
+from src import configuration
+
+if TYPE_CHECKING:
+    from src.bll.analytics import AnalyticsService
+
+db_connection = None
+slow_query_log: SlowQueryLog | None = None
+user_repository: UserRepository | None = None
+poll_service: PollService | None = None
+analytics_service: "AnalyticsService | None" = None
+poll_response_cache: PollResponseCache | None = None
+rate_limiter: RateLimiter | None = None
+admission: AdmissionController | None = None
+poll_loader: BatchLoader[int, PollModel] | None = None
+# the cursor is shared, so database work runs on one thread off the loop
+db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db")
+tracer = Tracer(sample_rate=0.0)
+logger = logging.getLogger(__name__)
+
+DEFAULT_RATE_LIMITS = {
+    "signup": RateLimitRule(rate_per_s=1, burst=10, per_user=False),
+    "credentials": RateLimitRule(rate_per_s=0.5, burst=5),
+    "votes": RateLimitRule(rate_per_s=5, burst=20, per_user=False),
+}
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    global db_connection, slow_query_log, user_repository
+    global poll_service, poll_response_cache, rate_limiter, admission
+    global poll_loader, analytics_service
+    # numpy backed, kept off the import of this module
+    from src.bll.analytics import AnalyticsService
+    from src.bll.result_stats import ResultStatistics
+
+    dsn = f"dbname={configuration.DB_NAME} user={configuration.DB_USER}"
+    db_connection = connect(dsn)
+    slow_query_log = SlowQueryLog(
+        threshold_ms=configuration.SLOW_QUERY_MS,
+        capacity=configuration.SLOW_QUERY_LOG_SIZE,
+        explain_connect=(
+            (lambda: connect(dsn))
+            if configuration.SLOW_QUERY_EXPLAIN
+            else None
+        ),
+    )
+    db_cursor = TimedCursor(db_connection.cursor(), slow_query_log)
+    # a single read when the schema is current; DDL only runs after a
+    # version bump, serialized across workers
+    prepare_schema(db_cursor)
+
+    # users live next to the polls and votes that reference them
+    user_repository = UserRepository(db_cursor)
+    poll_repository = PollRepository(db_cursor)
+    vote_repository = VoteRepository(
+        db_cursor, user_repository, poll_repository
+    )
+    voter_index = None
+    if configuration.VOTER_INDEX_PATH is not None:
+        voter_index = VoterIndex(
+            configuration.VOTER_INDEX_PATH,
+            max_age_s=configuration.VOTE_CHANGE_RETENTION_MIN * 60,
+        )
+    poll_service = PollService(
+        poll_repository=poll_repository,
+        vote_repository=vote_repository,
+        read_cache=ReadCache(
+            ttl_s=configuration.POLL_READ_TTL_MS / 1000,
+            stale_s=configuration.POLL_READ_STALE_MS / 1000,
+            executor=db_executor,
+        ),
+        trending=TrendingPolls(
+            half_life_s=configuration.TRENDING_HALF_LIFE_S,
+            top_k=configuration.TRENDING_TOP_K,
+        ),
+        voter_index=voter_index,
+        result_statistics=ResultStatistics(
+            draws=configuration.RESULT_STATS_DRAWS
+        ),
+        follow_votes=configuration.VOTE_FEED_INTERVAL_MS > 0,
+        rollup_retention={
+            "m": timedelta(days=configuration.VOTE_ROLLUP_MINUTE_DAYS),
+            "h": timedelta(days=configuration.VOTE_ROLLUP_HOUR_DAYS),
+        },
+        change_retention=timedelta(
+            minutes=configuration.VOTE_CHANGE_RETENTION_MIN
+        ),
+    )
+    # the first call catches a loaded voter index up from where it was
+    # saved, or else only marks where following starts. Taken before the
+    # index build, so no vote is missed; replaying a change the build
+    # already has is a no-op
+    db_executor.submit(poll_service.apply_new_votes)
+    if voter_index is not None and not voter_index.loaded:
+        # queued ahead of any request, so reads wait for the build
+        db_executor.submit(
+            lambda: voter_index.build(vote_repository.iter_option_voters())
+        )
+    analytics_service = AnalyticsService(
+        poll_repository=poll_repository,
+        vote_repository=vote_repository,
+        poll_versions=poll_service.poll_versions,
+        read_cache=ReadCache(
+            ttl_s=configuration.ANALYTICS_CACHE_TTL_MS / 1000,
+            max_entries=1000,
+        ),
+    )
+    poll_loader = BatchLoader(
+        "polls",
+        poll_service.get_polls_by_id,
+        max_batch_size=configuration.BATCH_LOADER_MAX_SIZE,
+        window_s=configuration.BATCH_LOADER_WINDOW_US / 1e6,
+        executor=db_executor,
+    )
+    poll_response_cache = PollResponseCache(
+        max_bytes=configuration.POLL_CACHE_MAX_BYTES,
+        max_age_s=configuration.POLL_READ_TTL_MS / 1000,
+    )
+
+    if configuration.TRACE_OTLP_ENDPOINT is not None:
+        tracer.exporter = OtlpHttpExporter(configuration.TRACE_OTLP_ENDPOINT)
+    elif configuration.TRACE_FILE is not None:
+        tracer.exporter = FileExporter(configuration.TRACE_FILE)
+    tracer.sample_rate = configuration.TRACE_SAMPLE_RATE
+
+    if configuration.RATE_LIMIT_SHARED_PATH is not None:
+        rate_limit_backend = SharedMemoryBucketBackend(
+            configuration.RATE_LIMIT_SHARED_PATH
+        )
+    else:
+        rate_limit_backend = InMemoryBucketBackend()
+    rate_limiter = RateLimiter(
+        rate_limit_backend,
+        parse_rules(configuration.RATE_LIMITS, DEFAULT_RATE_LIMITS),
+    )
+    admission = AdmissionController(
+        limit=configuration.ADMISSION_LIMIT,
+        max_queue=configuration.ADMISSION_MAX_QUEUE,
+        default_timeout_s=configuration.ADMISSION_DEFAULT_TIMEOUT_MS / 1000,
+        max_timeout_s=configuration.ADMISSION_MAX_TIMEOUT_MS / 1000,
+        algorithm={
+            "aimd": AimdLimit(),
+            "vegas": VegasLimit(),
+        }.get(configuration.ADMISSION_ALGORITHM),
+    )
+
+    background = list()
+    if poll_service.follow_votes:
+        # votes cast by other workers reach trending, the voter index
+        # and the cached results through the table
+        background.append(
+            asyncio.create_task(
+                _repeat(
+                    poll_service.apply_new_votes,
+                    configuration.VOTE_FEED_INTERVAL_MS / 1000,
+                )
+            )
+        )
+    if configuration.VOTE_ROLLUP_PRUNE_INTERVAL_S > 0:
+        background.append(
+            asyncio.create_task(
+                _repeat(
+                    poll_service.prune_vote_history,
+                    configuration.VOTE_ROLLUP_PRUNE_INTERVAL_S,
+                )
+            )
+        )
+
+    try:
+        yield
+    finally:
+        for task in background:
+            task.cancel()
+        if voter_index is not None:
+            db_executor.submit(poll_service.save_voter_index).result()
+            voter_index.close()
+        if isinstance(rate_limit_backend, SharedMemoryBucketBackend):
+            rate_limit_backend.close()
+        db_connection.close()
+
+
+async def _repeat(function: Callable, interval_s: float) -> None:
+    while True:
+        await asyncio.sleep(interval_s)
+        try:
+            await _run_db(function)
+        except Exception:
+            logger.exception("%s failed", function.__name__)
+
+
+def rate_limited(rule_name: str) -> Any:
+    async def check(request: Request) -> None:
+        if rate_limiter is not None:
+            rate_limiter.check(rule_name, request, await _caller_id(request))
+
+    return Depends(check)
+
+
+async def _caller_id(request: Request) -> int | None:
+    # the user whose credentials the poll and vote routes carry in the
+    # body; the user routes name theirs in the path, which the rate
+    # limiter reads itself. The body is cached on the request, so the
+    # route still gets it
+    if "user_id" in request.path_params:
+        return None
+    try:
+        body = await request.json()
+    except ValueError:
+        return None
+    user_id = body.get("user_id") if isinstance(body, dict) else None
+    return user_id if isinstance(user_id, int) else None
 
-app = FastAPI()
-db_connection = connect(f"dbname={DB_NAME} user={DB_USER}")
-db_cursor = db_connection.cursor()
-ensure_exists(db_cursor)
-user_repository = InMemoryUserRepository()
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware, tracer=tracer)
 
 
 @app.get("/")
@@ -29,15 +330,112 @@ async def root() -> str:
     return "Hellow Wordle!"
 
 
-@app.get("/users", status_code=status.HTTP_200_OK)
-async def get_all_users() -> list[GetUserDto]:
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> PlainTextResponse:
+    return PlainTextResponse(
+        render_prometheus(), media_type="text/plain; version=0.0.4"
+    )
+
+
+@app.get("/admin/slow_queries", response_model=list[SlowQueryDto])
+async def get_slow_queries(request: Request) -> list[SlowQueryDto]:
+    global slow_query_log
+
+    _ensure_admin(request)
+    return [to_slow_query_dto(entry) for entry in slow_query_log.entries()]
+
+
+@app.get("/admin/profile/cpu")
+async def profile_cpu(
+    request: Request,
+    seconds: float = 10,
+    interval_ms: float = 5,
+    format: Literal["collapsed", "speedscope"] = "collapsed",
+) -> Response:
+    _ensure_admin(request)
+    if not 0 < seconds <= 60 or not 1 <= interval_ms <= seconds * 1000:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
+    try:
+        # sampled from a worker thread so the event loop keeps serving and
+        # shows up in the profile
+        stacks = await asyncio.to_thread(
+            profiler.profile, seconds, interval_ms / 1000
+        )
+    except ProfilerBusy as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT, detail=e.msg
+        )
+
+    if format == "collapsed":
+        return PlainTextResponse(to_collapsed(stacks))
+    return JSONResponse(
+        to_speedscope(stacks, f"pid {os.getpid()}", interval_ms / 1000),
+        headers={
+            "Content-Disposition": (
+                'attachment; filename="profile.speedscope.json"'
+            )
+        },
+    )
+
+
+@app.post(
+    "/admin/profile/allocations", status_code=status.HTTP_204_NO_CONTENT
+)
+async def start_allocation_tracking(
+    request: Request, frames: int = 25
+) -> None:
+    _ensure_admin(request)
+    allocation_tracker.start(frames)
+
+
+@app.get(
+    "/admin/profile/allocations", response_model=list[AllocationStatDto]
+)
+async def get_allocations(
+    request: Request,
+    key_type: Literal["lineno", "filename", "traceback"] = "lineno",
+    limit: int = 50,
+    diff: bool = True,
+) -> list[AllocationStatDto]:
+    _ensure_admin(request)
+    if not allocation_tracker.active:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Allocation tracking is not running",
+        )
+    statistics = await asyncio.to_thread(
+        allocation_tracker.snapshot, key_type, limit, diff
+    )
+    return [to_allocation_stat_dto(statistic) for statistic in statistics]
+
+
+@app.delete(
+    "/admin/profile/allocations", status_code=status.HTTP_204_NO_CONTENT
+)
+async def stop_allocation_tracking(request: Request) -> None:
+    _ensure_admin(request)
+    allocation_tracker.stop()
+
+
+@app.get(
+    "/users",
+    status_code=status.HTTP_200_OK,
+    response_model=list[GetUserDto],
+)
+async def get_all_users(request: Request) -> list[GetUserDto] | Response:
     global user_repository
 
-    users = []
-    for user in user_repository.get_users():
-        users.append(to_get_user_dto(user))
+    if configuration.BULK_LIST_SERIALIZATION:
+        async with _admitted(request):
+            rows = await _run_db(user_repository.get_user_rows)
+        return Response(
+            content=user_rows_to_json(rows),
+            media_type="application/json",
+        )
 
-    return users
+    async with _admitted(request):
+        users = await _run_db(user_repository.get_users)
+    return [to_get_user_dto(user) for user in users]
 
 
 @app.get(
@@ -45,83 +443,531 @@ async def get_all_users() -> list[GetUserDto]:
     status_code=status.HTTP_200_OK,
     response_model=GetUserDto,
 )
-async def get_user(user_id: int) -> GetUserDto:
+async def get_user(user_id: int, request: Request) -> GetUserDto:
     global user_repository
     try:
-        user = user_repository.get_user(user_id)
+        async with _admitted(request):
+            user = await _run_db(user_repository.get_user, user_id)
         return to_get_user_dto(user)
     except NotFoundException:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
 
 
 @app.post(
-    "/users", status_code=status.HTTP_201_CREATED, response_model=GetUserDto
+    "/users",
+    status_code=status.HTTP_201_CREATED,
+    response_model=GetUserDto,
+    dependencies=[rate_limited("signup")],
 )
-async def create_user(create_user_dto: CreateUserDto) -> GetUserDto:
+async def create_user(
+    request: Request, create_user_dto: CreateUserDto
+) -> GetUserDto:
     global user_repository
 
-    seeked_user: UserEntity | None = None
-    for user in user_repository.get_users():
-        if user.name == create_user_dto.name:
-            seeked_user = user
-            break
-
-    if seeked_user is not None:
+    try:
+        async with _admitted(request):
+            user = await _run_db(
+                user_repository.create_user,
+                create_user_dto.name,
+                create_user_dto.password,
+            )
+    except DalUniqueViolationException:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
-            detail=f"User {seeked_user.name} already exists.",
+            detail=f"User {create_user_dto.name} already exists.",
         )
-    else:
-        user = user_repository.create_user(
-            create_user_dto.name, create_user_dto.password
-        )
-        return to_get_user_dto(user)
+    return to_get_user_dto(user)
 
 
-@app.delete("/users/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_user(user_id: int, delete_user_dto: DeleteUserDto) -> None:
+@app.delete(
+    "/users/{user_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    dependencies=[rate_limited("credentials")],
+)
+async def delete_user(
+    user_id: int, request: Request, delete_user_dto: DeleteUserDto
+) -> None:
     global user_repository
 
-    try:
-        user = user_repository.get_user(user_id)
-        if user.password_hash != delete_user_dto.password:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
-        else:
-            user_repository.delete_user(user.id)
-            return None
-    except NotFoundException:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    async with _admitted(request):
+        await _authenticate(user_id, delete_user_dto.password)
+        await _run_db(user_repository.delete_user, user_id)
 
 
 @app.post(
-    "/users/{user_id}/change_password", status_code=status.HTTP_204_NO_CONTENT
+    "/users/{user_id}/change_password",
+    status_code=status.HTTP_204_NO_CONTENT,
+    dependencies=[rate_limited("credentials")],
 )
 async def change_password(
-    user_id: int, change_password_dto: ChangePasswordDto
+    user_id: int, request: Request, change_password_dto: ChangePasswordDto
 ) -> None:
     global user_repository
 
-    try:
-        user = user_repository.get_user(user_id)
-        if user.password_hash == change_password_dto.old_password:
-            user.password_hash = change_password_dto.new_password
-            user_repository.update_user(user)
-            return None
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
-    except NotFoundException:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    async with _admitted(request):
+        user = await _authenticate(user_id, change_password_dto.old_password)
+        user.password_hash = change_password_dto.new_password
+        await _run_db(user_repository.update_user, user)
 
 
-@app.put("/users/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def update_user(user_id: int, update_user_dto: UpdateUserDto) -> None:
+@app.put(
+    "/users/{user_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    dependencies=[rate_limited("credentials")],
+)
+async def update_user(
+    user_id: int, request: Request, update_user_dto: UpdateUserDto
+) -> None:
     global user_repository
 
     try:
-        user = user_repository.get_user(user_id)
-        if user.password_hash == update_user_dto.password:
+        async with _admitted(request):
+            user = await _authenticate(user_id, update_user_dto.password)
             user.name = update_user_dto.name
-            user_repository.update_user(user)
+            await _run_db(user_repository.update_user, user)
+    except DalUniqueViolationException:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"User {update_user_dto.name} already exists.",
+        )
+
+
+@app.get(
+    "/polls",
+    status_code=status.HTTP_200_OK,
+    response_model=list[GetPollWithResultsDto],
+)
+async def get_polls(
+    request: Request, ids: str
+) -> list[GetPollWithResultsDto]:
+    global poll_service
+
+    poll_ids = _parse_ids(ids)
+    async with _admitted(request):
+        polls = await _run_db(poll_service.get_polls, poll_ids)
+    return [to_get_poll_with_results_dto(poll) for poll in polls]
+
+
+@app.post(
+    "/polls",
+    status_code=status.HTTP_201_CREATED,
+    response_model=GetPollDto,
+    dependencies=[rate_limited("credentials")],
+)
+async def create_poll(
+    request: Request, create_poll_dto: CreatePollDto
+) -> GetPollDto:
+    global poll_service
+
+    async with _admitted(request):
+        await _authenticate(create_poll_dto.user_id, create_poll_dto.password)
+        poll = await _run_write(
+            poll_service.create_poll,
+            create_poll_dto.name,
+            create_poll_dto.tag,
+            create_poll_dto.anonymous_voting,
+            create_poll_dto.multiple_choice,
+            create_poll_dto.options,
+            create_poll_dto.user_id,
+        )
+    return to_get_poll_dto(poll)
+
+
+# registered before /polls/{poll_id}, which would match them too
+@app.get(
+    "/polls/trending",
+    status_code=status.HTTP_200_OK,
+    response_model=list[TrendingPollDto],
+)
+async def get_trending_polls(limit: int = 10) -> list[TrendingPollDto]:
+    global poll_service
+
+    if not 0 < limit <= poll_service.trending.top_k:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
+    return [
+        to_trending_poll_dto(poll_id, votes_per_s)
+        for poll_id, votes_per_s in poll_service.trending.trending(limit)
+    ]
+
+
+@app.get(
+    "/polls/leaderboard",
+    status_code=status.HTTP_200_OK,
+    response_model=LeaderboardPageDto,
+)
+async def get_leaderboard(
+    request: Request,
+    tag: str | None = None,
+    limit: int = 20,
+    cursor: str | None = None,
+) -> LeaderboardPageDto:
+    global poll_service
+
+    if not 0 < limit <= 100:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
+    try:
+        after = None if cursor is None else from_leaderboard_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
+
+    async with _admitted(request):
+        page = await _run_db(poll_service.get_leaderboard, tag, limit, after)
+    return to_leaderboard_page_dto(page)
+
+
+@app.get(
+    "/polls/statistics",
+    status_code=status.HTTP_200_OK,
+    response_model=list[PollStatisticsDto],
+)
+async def get_polls_statistics(
+    request: Request, ids: str
+) -> list[PollStatisticsDto]:
+    global poll_service
+
+    poll_ids = _parse_ids(ids)
+    async with _admitted(request):
+        statistics = await _run_db(poll_service.get_poll_statistics, poll_ids)
+    return [to_poll_statistics_dto(poll) for poll in statistics]
+
+
+@app.get(
+    "/polls/search",
+    status_code=status.HTTP_200_OK,
+    response_model=PollSearchPageDto,
+)
+async def search_polls(
+    request: Request, q: str, limit: int = 20, cursor: str | None = None
+) -> PollSearchPageDto:
+    global poll_service
+
+    if len(q.strip()) == 0 or not 0 < limit <= 100:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
+    try:
+        after = None if cursor is None else from_search_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
+
+    async with _admitted(request):
+        page = await _run_db(poll_service.search_polls, q, limit, after)
+    return to_poll_search_page_dto(page)
+
+
+@app.get(
+    "/polls/{poll_id}",
+    status_code=status.HTTP_200_OK,
+    response_model=GetPollDto,
+)
+async def get_poll(poll_id: int, request: Request) -> Response:
+    global poll_loader
+
+    async def render() -> bytes | None:
+        poll = await poll_loader.load(poll_id)
+        if poll is None:
+            return None
+        return to_get_poll_dto(poll).model_dump_json().encode()
+
+    return await _conditional_poll_response("poll", poll_id, request, render)
+
+
+@app.delete(
+    "/polls/{poll_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    dependencies=[rate_limited("credentials")],
+)
+async def delete_poll(
+    poll_id: int, request: Request, credentials_dto: PollCredentialsDto
+) -> None:
+    global poll_service
+
+    async with _admitted(request):
+        await _authenticate(credentials_dto.user_id, credentials_dto.password)
+        await _run_write(
+            poll_service.delete_poll_by_id, poll_id, credentials_dto.user_id
+        )
+
+
+@app.post(
+    "/polls/{poll_id}/votes",
+    status_code=status.HTTP_204_NO_CONTENT,
+    dependencies=[rate_limited("votes")],
+)
+async def create_vote(
+    poll_id: int, request: Request, create_vote_dto: CreateVoteDto
+) -> None:
+    global poll_service
+
+    async with _admitted(request):
+        await _authenticate(create_vote_dto.user_id, create_vote_dto.password)
+        await _run_write(
+            poll_service.create_vote,
+            poll_id,
+            create_vote_dto.option_id,
+            create_vote_dto.user_id,
+        )
+
+
+@app.delete(
+    "/polls/{poll_id}/votes/{option_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    dependencies=[rate_limited("votes")],
+)
+async def retract_vote(
+    poll_id: int,
+    option_id: int,
+    request: Request,
+    credentials_dto: PollCredentialsDto,
+) -> None:
+    global poll_service
+
+    async with _admitted(request):
+        await _authenticate(credentials_dto.user_id, credentials_dto.password)
+        await _run_write(
+            poll_service.retract_vote,
+            poll_id,
+            option_id,
+            credentials_dto.user_id,
+        )
+
+
+@app.get(
+    "/polls/{poll_id}/results",
+    status_code=status.HTTP_200_OK,
+    response_model=GetPollResultsDto,
+)
+async def get_poll_results(poll_id: int, request: Request) -> Response:
+    global poll_service
+
+    async def render() -> bytes | None:
+        poll = await _run_db(poll_service.get_poll_results, poll_id)
+        if poll is None:
             return None
+        return to_get_poll_results_dto(poll).model_dump_json().encode()
+
+    return await _conditional_poll_response(
+        "results", poll_id, request, render
+    )
+
+
+@app.get(
+    "/polls/{poll_id}/votes",
+    status_code=status.HTTP_200_OK,
+    response_model=VoteSeriesDto,
+)
+async def get_vote_series(
+    poll_id: int,
+    request: Request,
+    start: datetime,
+    end: datetime | None = None,
+    points: int = 200,
+) -> VoteSeriesDto:
+    global poll_service
+
+    # vote dates are stored without a time zone, in the database's
+    # time zone, which is UTC unless configured otherwise
+    start = _to_naive_utc(start)
+    end = _to_naive_utc(end or datetime.now(timezone.utc))
+    if (
+        not 0 < points <= 1000
+        or start >= end
+        or end - start > timedelta(days=points)
+    ):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
+
+    async with _admitted(request):
+        series = await _run_db(
+            poll_service.get_vote_series, poll_id, start, end, points
+        )
+    if series is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    return to_vote_series_dto(series)
+
+
+@app.get(
+    "/polls/{poll_id}/statistics",
+    status_code=status.HTTP_200_OK,
+    response_model=PollStatisticsDto,
+)
+async def get_poll_statistics(
+    poll_id: int, request: Request
+) -> PollStatisticsDto:
+    global poll_service
+
+    async with _admitted(request):
+        statistics = await _run_db(poll_service.get_poll_statistics, [poll_id])
+    if len(statistics) == 0:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    return to_poll_statistics_dto(statistics[0])
+
+
+@app.get(
+    "/polls/{poll_id}/overlap",
+    status_code=status.HTTP_200_OK,
+    response_model=OptionOverlapDto,
+)
+async def get_option_overlap(
+    poll_id: int, request: Request
+) -> OptionOverlapDto:
+    global poll_service
+
+    if poll_service.voter_index is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    async with _admitted(request):
+        overlap = await _run_db(poll_service.get_option_overlap, poll_id)
+    if overlap is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    return to_option_overlap_dto(overlap)
+
+
+@app.get(
+    "/polls/{poll_id}/voters/{user_id}",
+    status_code=status.HTTP_200_OK,
+    response_model=PollMembershipDto,
+)
+async def get_poll_membership(
+    poll_id: int, user_id: int, request: Request
+) -> PollMembershipDto:
+    global poll_service
+
+    if poll_service.voter_index is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    async with _admitted(request):
+        membership = await _run_db(
+            poll_service.get_poll_membership, poll_id, user_id
+        )
+    if membership is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    return to_poll_membership_dto(membership)
+
+
+@app.get(
+    "/polls/{poll_id}/crosstab/{other_poll_id}",
+    status_code=status.HTTP_200_OK,
+    response_model=CrossTabDto,
+)
+async def get_cross_tab(
+    poll_id: int, other_poll_id: int, request: Request
+) -> CrossTabDto:
+    global analytics_service
+
+    if poll_id == other_poll_id:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
+    async with _admitted(request):
+        cross_tab = await _run_db(
+            analytics_service.get_cross_tab, poll_id, other_poll_id
+        )
+    if cross_tab is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    return to_cross_tab_dto(cross_tab)
+
+
+def _parse_ids(ids: str, max_ids: int = 200) -> list[int]:
+    # comma separated, duplicates dropped, order kept
+    try:
+        poll_ids = list(dict.fromkeys(int(part) for part in ids.split(",")))
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
+    if not 0 < len(poll_ids) <= max_ids:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
+    return poll_ids
+
+
+def _to_naive_utc(moment: datetime) -> datetime:
+    if moment.tzinfo is None:
+        return moment
+    return moment.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+async def _conditional_poll_response(
+    kind: str,
+    poll_id: int,
+    request: Request,
+    render: Callable[[], Awaitable[bytes | None]],
+) -> Response:
+    global poll_service, poll_response_cache
+
+    key = (kind, poll_id)
+    etag = poll_response_cache.etag(poll_service.get_poll_version(poll_id))
+    if_none_match = request.headers.get("if-none-match")
+    accept_encoding = request.headers.get("accept-encoding")
+    cached = poll_response_cache.get(key, etag, accept_encoding)
+    if cached is not None:
+        return poll_response_cache.not_modified(etag, if_none_match) or cached
+
+    # only requests that reach the database are admitted, cache hits
+    # stay cheap under overload
+    async with _admitted(request):
+        body = await render()
+    if body is None:
+        poll_response_cache.discard(key)
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+
+    previous = poll_response_cache.peek(key)
+    if previous is not None and previous == (etag, body):
+        response = poll_response_cache.put(key, etag, body, accept_encoding)
+        not_modified = poll_response_cache.not_modified(etag, if_none_match)
+        return not_modified or response
+    if previous is not None and previous[0] == etag:
+        # changed without a local write, so the etag has to move too
+        etag = poll_response_cache.etag(
+            poll_service.poll_versions.bump(poll_id)
+        )
+    # without an unchanged earlier body there is nothing to say the
+    # client's copy is current
+    return poll_response_cache.put(key, etag, body, accept_encoding)
+
+
+@asynccontextmanager
+async def _admitted(request: Request) -> AsyncIterator[None]:
+    global admission
+
+    deadline = admission.deadline(request.headers.get("x-request-timeout-ms"))
+    try:
+        async with admission.admit(deadline):
+            yield
+    except DalDeadlineExceeded:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers={"Retry-After": "1"},
+        )
+
+
+async def _run_db(function: Callable, *args) -> Any:
+    return await asyncio.get_running_loop().run_in_executor(
+        db_executor, contextvars.copy_context().run, function, *args
+    )
+
+
+async def _run_write(function: Callable, *args) -> Any:
+    try:
+        return await _run_db(function, *args)
+    except NotFound:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    except NotAllowed as e:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail=e.msg
+        )
+    except PollExistsException as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT, detail=e.msg
+        )
+
+
+async def _authenticate(user_id: int, password: str) -> UserEntity:
+    global user_repository
+
+    user = await _run_db(user_repository.get_user_by_id, user_id)
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    if user.password_hash != password:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
-    except NotFoundException:
+    return user
+
+
+def _ensure_admin(request: Request) -> None:
+    admin_token = configuration.ADMIN_TOKEN
+    if admin_token is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    token = request.headers.get("x-admin-token", "")
+    if not secrets.compare_digest(token.encode(), admin_token.encode()):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
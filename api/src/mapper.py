@@ -1,8 +1,257 @@
-from dal import UserEntity
-from view import GetUserDto
+import base64
+import struct
+import tracemalloc
+
+from pydantic import TypeAdapter
+
+from src.bll.bll_models import (
+    PollModel,
+    PollSearchPage,
+    LeaderboardPage,
+    VoteSeriesModel,
+    OptionOverlapModel,
+    PollMembershipModel,
+    CrossTabModel,
+    PollStatisticsModel,
+)
+from src.dal import UserEntity, SlowQuery
+from src.view import (
+    GetUserDto,
+    GetUserRow,
+    GetPollDto,
+    GetOptionDto,
+    GetPollResultsDto,
+    GetPollWithResultsDto,
+    GetOptionResultDto,
+    PollSummaryDto,
+    PollSearchPageDto,
+    TrendingPollDto,
+    RankedPollDto,
+    LeaderboardPageDto,
+    OptionSeriesDto,
+    VoteSeriesDto,
+    OptionOverlapDto,
+    PollMembershipDto,
+    CrossTabDto,
+    OptionStatisticsDto,
+    PollStatisticsDto,
+    SlowQueryDto,
+    AllocationStatDto,
+)
+
+_user_rows_adapter = TypeAdapter(list[GetUserRow])
+_search_cursor = struct.Struct("<dq")
+_leaderboard_cursor = struct.Struct("<qq")
 
 
 def to_get_user_dto(user_entity: UserEntity) -> GetUserDto:
     data = {"id": user_entity.id, "name": user_entity.name}
     user_dto: GetUserDto = GetUserDto(**data)
     return user_dto
+
+
+def user_rows_to_json(rows: list[tuple[int, str]]) -> bytes:
+    return _user_rows_adapter.dump_json(
+        [{"id": user_id, "name": name} for user_id, name in rows]
+    )
+
+
+def to_get_poll_dto(poll_model: PollModel) -> GetPollDto:
+    return GetPollDto(
+        id=poll_model.id,
+        name=poll_model.name,
+        tag=poll_model.tag,
+        user_id=poll_model.user_id,
+        creation_date=poll_model.creation_date,
+        anonymous_voting=poll_model.anonymous_voting,
+        multiple_choice=poll_model.multiple_choice,
+        options=[
+            GetOptionDto(id=option.id, text=option.text)
+            for option in poll_model.options
+        ],
+    )
+
+
+def to_get_poll_results_dto(poll_model: PollModel) -> GetPollResultsDto:
+    options = [
+        GetOptionResultDto(id=option.id, text=option.text, votes=option.votes)
+        for option in poll_model.options
+    ]
+    return GetPollResultsDto(
+        poll_id=poll_model.id,
+        total_votes=sum(option.votes for option in options),
+        options=options,
+    )
+
+
+def to_get_poll_with_results_dto(
+    poll_model: PollModel,
+) -> GetPollWithResultsDto:
+    options = [
+        GetOptionResultDto(id=option.id, text=option.text, votes=option.votes)
+        for option in poll_model.options
+    ]
+    return GetPollWithResultsDto(
+        id=poll_model.id,
+        name=poll_model.name,
+        tag=poll_model.tag,
+        user_id=poll_model.user_id,
+        creation_date=poll_model.creation_date,
+        anonymous_voting=poll_model.anonymous_voting,
+        multiple_choice=poll_model.multiple_choice,
+        total_votes=sum(option.votes for option in options),
+        options=options,
+    )
+
+
+def to_poll_search_page_dto(page: PollSearchPage) -> PollSearchPageDto:
+    return PollSearchPageDto(
+        polls=[
+            PollSummaryDto(
+                id=poll.id,
+                name=poll.name,
+                tag=poll.tag,
+                user_id=poll.user_id,
+                creation_date=poll.creation_date,
+            )
+            for poll in page.polls
+        ],
+        next_cursor=_encode_cursor(_search_cursor, page.next_cursor),
+    )
+
+
+def from_search_cursor(cursor: str) -> tuple[float, int]:
+    return _decode_cursor(_search_cursor, cursor)
+
+
+def to_leaderboard_page_dto(page: LeaderboardPage) -> LeaderboardPageDto:
+    return LeaderboardPageDto(
+        polls=[
+            RankedPollDto(
+                poll_id=poll.poll_id,
+                name=poll.name,
+                tag=poll.tag,
+                votes=poll.votes,
+            )
+            for poll in page.polls
+        ],
+        next_cursor=_encode_cursor(_leaderboard_cursor, page.next_cursor),
+    )
+
+
+def from_leaderboard_cursor(cursor: str) -> tuple[int, int]:
+    return _decode_cursor(_leaderboard_cursor, cursor)
+
+
+def to_vote_series_dto(series: VoteSeriesModel) -> VoteSeriesDto:
+    return VoteSeriesDto(
+        poll_id=series.poll_id,
+        resolution=series.resolution,
+        buckets=series.buckets,
+        options=[
+            OptionSeriesDto(id=option.id, text=option.text, votes=option.votes)
+            for option in series.options
+        ],
+    )
+
+
+def to_option_overlap_dto(overlap: OptionOverlapModel) -> OptionOverlapDto:
+    return OptionOverlapDto(
+        poll_id=overlap.poll_id,
+        option_ids=overlap.option_ids,
+        voters=overlap.voters,
+    )
+
+
+def to_poll_membership_dto(
+    membership: PollMembershipModel,
+) -> PollMembershipDto:
+    return PollMembershipDto(
+        poll_id=membership.poll_id,
+        user_id=membership.user_id,
+        voted=membership.voted,
+        option_ids=membership.option_ids,
+    )
+
+
+def to_cross_tab_dto(cross_tab: CrossTabModel) -> CrossTabDto:
+    return CrossTabDto(
+        poll_id=cross_tab.poll_id,
+        other_poll_id=cross_tab.other_poll_id,
+        option_ids=cross_tab.option_ids,
+        other_option_ids=cross_tab.other_option_ids,
+        counts=cross_tab.counts,
+        voters=cross_tab.voters,
+        other_voters=cross_tab.other_voters,
+        overlap=cross_tab.overlap,
+        chi_square=cross_tab.chi_square,
+        degrees_of_freedom=cross_tab.degrees_of_freedom,
+        p_value=cross_tab.p_value,
+        cramers_v=cross_tab.cramers_v,
+    )
+
+
+def to_poll_statistics_dto(
+    statistics: PollStatisticsModel,
+) -> PollStatisticsDto:
+    return PollStatisticsDto(
+        poll_id=statistics.poll_id,
+        votes=statistics.votes,
+        options=[
+            OptionStatisticsDto(
+                id=option.id,
+                votes=option.votes,
+                share=option.share,
+                lower=option.lower,
+                upper=option.upper,
+                margin_of_error=option.margin_of_error,
+                win_probability=option.win_probability,
+            )
+            for option in statistics.options
+        ],
+    )
+
+
+def to_trending_poll_dto(poll_id: int, votes_per_s: float) -> TrendingPollDto:
+    return TrendingPollDto(poll_id=poll_id, votes_per_minute=votes_per_s * 60)
+
+
+def to_slow_query_dto(slow_query: SlowQuery) -> SlowQueryDto:
+    return SlowQueryDto(
+        statement=slow_query.statement,
+        parameters=slow_query.parameters,
+        method=slow_query.method,
+        origin=slow_query.origin,
+        duration_ms=slow_query.duration_ms,
+        logged_at=slow_query.logged_at,
+        plan=slow_query.plan,
+    )
+
+
+def to_allocation_stat_dto(
+    statistic: tracemalloc.Statistic | tracemalloc.StatisticDiff,
+) -> AllocationStatDto:
+    return AllocationStatDto(
+        location=[
+            f"{frame.filename}:{frame.lineno}"
+            for frame in statistic.traceback
+        ],
+        size_bytes=statistic.size,
+        count=statistic.count,
+        size_diff_bytes=getattr(statistic, "size_diff", None),
+        count_diff=getattr(statistic, "count_diff", None),
+    )
+
+
+def _encode_cursor(layout: struct.Struct, values: tuple | None) -> str | None:
+    if values is None:
+        return None
+    return base64.urlsafe_b64encode(layout.pack(*values)).decode()
+
+
+def _decode_cursor(layout: struct.Struct, cursor: str) -> tuple:
+    # raises ValueError for anything _encode_cursor did not make
+    try:
+        return layout.unpack(base64.urlsafe_b64decode(cursor))
+    except (struct.error, TypeError) as error:
+        raise ValueError(f"Invalid cursor: {cursor}") from error
@@ -0,0 +1,198 @@
+import threading
+from bisect import bisect_left
+
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+class _Metric:
+    # every thread writes only to its own shard, so recording needs no lock;
+    # a scrape sums the shards, which may miss an update still in progress
+    kind = ""
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: tuple[str, ...] = ()
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._local = threading.local()
+        self._shards: list[dict] = list()
+        self._shards_lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _shard(self) -> dict:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = dict()
+            self._local.shard = shard
+            with self._shards_lock:
+                self._shards.append(shard)
+            return shard
+
+    def _labels(self, labels: tuple, extra: str = "") -> str:
+        pairs = [
+            f'{name}="{_escape(str(value))}"'
+            for name, value in zip(self.labelnames, labels)
+        ]
+        if extra:
+            pairs.append(extra)
+        if len(pairs) == 0:
+            return ""
+        return "{" + ",".join(pairs) + "}"
+
+    def collect(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, labels: tuple = (), amount: float = 1) -> None:
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def value(self, labels: tuple = ()) -> float:
+        return sum(shard.get(labels, 0) for shard in list(self._shards))
+
+    def collect(self) -> list[str]:
+        totals: dict[tuple, float] = dict()
+        for shard in list(self._shards):
+            for labels, value in list(shard.items()):
+                totals[labels] = totals.get(labels, 0) + value
+        return [
+            f"{self.name}{self._labels(labels)} {value}"
+            for labels, value in sorted(totals.items())
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, labels: tuple = (), amount: float = 1) -> None:
+        self.inc(labels, -amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+
+    def observe(self, labels: tuple, value: float) -> None:
+        shard = self._shard()
+        series = shard.get(labels)
+        if series is None:
+            # one count per bucket plus +Inf, then the sum
+            series = [0] * (len(self.buckets) + 1) + [0.0]
+            shard[labels] = series
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def count(self, labels: tuple = ()) -> int:
+        return sum(
+            sum(shard[labels][:-1])
+            for shard in list(self._shards)
+            if labels in shard
+        )
+
+    def collect(self) -> list[str]:
+        totals: dict[tuple, list] = dict()
+        for shard in list(self._shards):
+            for labels, series in list(shard.items()):
+                total = totals.setdefault(labels, [0] * len(series))
+                for i, value in enumerate(series):
+                    total[i] += value
+
+        lines = list()
+        for labels, series in sorted(totals.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(
+                    f"{self.name}_bucket{self._labels(labels, le)} "
+                    f"{cumulative}"
+                )
+            lines.append(f"{self.name}_sum{self._labels(labels)} {series[-1]}")
+            lines.append(
+                f"{self.name}_count{self._labels(labels)} {cumulative}"
+            )
+        return lines
+
+
+REGISTRY: list[_Metric] = list()
+
+
+def render_prometheus() -> str:
+    lines = list()
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.collect())
+    return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+DB_QUERY_SECONDS = Histogram(
+    "db_query_duration_seconds",
+    "Time spent in cursor calls, by repository method and phase",
+    ("method", "phase"),
+)
+DB_QUERY_ROWS = Counter(
+    "db_query_rows_total",
+    "Rows fetched, by repository method",
+    ("method",),
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency, by method, route template and status",
+    ("method", "route", "status"),
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "HTTP requests currently being served",
+)
+HTTP_REQUEST_ALLOCATED_BYTES = Histogram(
+    "http_request_allocated_bytes",
+    "Traced memory growth while serving a request, by route, recorded "
+    "only while allocation tracking is on",
+    ("route",),
+    buckets=tuple(1024 * 4**i for i in range(10)),
+)
+ADMISSION_REJECTED = Counter(
+    "admission_rejected_total",
+    "Requests shed by admission control, by reason",
+    ("reason",),
+)
+BATCH_LOADER_BATCH_SIZE = Histogram(
+    "batch_loader_batch_size",
+    "Distinct keys per batched lookup, by loader",
+    ("loader",),
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512),
+)
@@ -0,0 +1,124 @@
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+
+class ProfilerBusy(BaseException):
+    def __init__(self):
+        self.msg = "A profile is already being taken"
+
+
+class SamplingProfiler:
+    # samples the stacks of every other thread from a helper thread; no
+    # hook is installed, so nothing runs while no profile is being taken
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+
+    def profile(self, duration_s: float, interval_s: float) -> Counter:
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy()
+        try:
+            return self._sample(duration_s, interval_s)
+        finally:
+            self._lock.release()
+
+    @staticmethod
+    def _sample(duration_s: float, interval_s: float) -> Counter:
+        own_thread = threading.get_ident()
+        stacks: Counter = Counter()
+        deadline = time.perf_counter() + duration_s
+        while time.perf_counter() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+                stack = list()
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                stacks[";".join(reversed(stack))] += 1
+            # never past the deadline, whatever the interval
+            time.sleep(
+                max(0.0, min(interval_s, deadline - time.perf_counter()))
+            )
+        return stacks
+
+
+def to_collapsed(stacks: Counter) -> str:
+    return "".join(
+        f"{stack} {count}\n" for stack, count in stacks.most_common()
+    )
+
+
+def to_speedscope(stacks: Counter, name: str, interval_s: float) -> dict:
+    frames: dict[str, int] = dict()
+    samples = list()
+    for stack, count in stacks.items():
+        indexes = [
+            frames.setdefault(frame, len(frames)) for frame in stack.split(";")
+        ]
+        samples.append((indexes, count))
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "shared": {"frames": [{"name": frame} for frame in frames]},
+        "profiles": [
+            {
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(count for _, count in samples) * interval_s,
+                "samples": [indexes for indexes, _ in samples],
+                "weights": [count * interval_s for _, count in samples],
+            }
+        ],
+    }
+
+
+class AllocationTracker:
+    def __init__(self) -> None:
+        self.active = False
+        self._baseline: tracemalloc.Snapshot | None = None
+        self._lock = threading.Lock()
+
+    def start(self, frames: int) -> None:
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(frames)
+            self._baseline = tracemalloc.take_snapshot()
+            self.active = True
+
+    def stop(self) -> None:
+        with self._lock:
+            self.active = False
+            self._baseline = None
+            tracemalloc.stop()
+
+    def snapshot(
+        self, key_type: str, limit: int, diff: bool
+    ) -> list[tracemalloc.StatisticDiff] | list[tracemalloc.Statistic]:
+        with self._lock:
+            if not self.active:
+                return []
+            snapshot = tracemalloc.take_snapshot().filter_traces(
+                [tracemalloc.Filter(False, tracemalloc.__file__)]
+            )
+            baseline = self._baseline
+            self._baseline = snapshot
+        if diff:
+            return snapshot.compare_to(baseline, key_type)[:limit]
+        return snapshot.statistics(key_type)[:limit]
+
+    def traced_bytes(self) -> int:
+        return tracemalloc.get_traced_memory()[0]
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_qualname} ({os.path.basename(code.co_filename)})"
+
+
+profiler = SamplingProfiler()
+allocation_tracker = AllocationTracker()
@@ -0,0 +1,238 @@
+import functools
+import inspect
+import json
+import logging
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterator
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Span:
+    trace_id: str
+    span_id: str
+    parent: "Span | None" = field(repr=False, compare=False)
+    name: str
+    kind: str
+    start_unix_ns: int
+    start_ns: int
+    duration_ns: int = 0
+    db_round_trips: int = 0
+    attributes: dict[str, Any] = field(default_factory=dict)
+    # finished spans of the whole trace, shared by all of its spans
+    finished: list["Span"] = field(
+        default_factory=list, repr=False, compare=False
+    )
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": None if self.parent is None else self.parent.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_unix_ns": self.start_unix_ns,
+            "duration_ns": self.duration_ns,
+            "db_round_trips": self.db_round_trips,
+            "attributes": self.attributes,
+        }
+
+
+class FileExporter:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans: list[Span]) -> None:
+        lines = "".join(json.dumps(span.to_dict()) + "\n" for span in spans)
+        with self._lock, open(self.path, "a") as file:
+            file.write(lines)
+
+
+class OtlpHttpExporter:
+    # posts OTLP/HTTP JSON from a background thread; traces are dropped
+    # rather than queued without bound when the collector falls behind
+    def __init__(self, endpoint: str, max_queued: int = 1000) -> None:
+        self.endpoint = endpoint
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queued)
+        self._sender = threading.Thread(target=self._send_forever, daemon=True)
+        self._sender.start()
+
+    def export(self, spans: list[Span]) -> None:
+        try:
+            self._queue.put_nowait(spans)
+        except queue.Full:
+            pass
+
+    def _send_forever(self) -> None:
+        import urllib.request
+
+        while True:
+            spans = self._queue.get()
+            request = urllib.request.Request(
+                self.endpoint,
+                data=json.dumps(_to_otlp(spans)).encode(),
+                headers={"Content-Type": "application/json"},
+            )
+            try:
+                urllib.request.urlopen(request, timeout=5).close()
+            except OSError as e:
+                logger.warning("could not export trace: %s", e)
+
+
+class Tracer:
+    def __init__(self, sample_rate: float, exporter=None) -> None:
+        self.sample_rate = sample_rate
+        self.exporter = exporter
+        self._rng = random.Random()
+
+    @contextmanager
+    def start_trace(self, name: str, **attributes) -> Iterator[Span | None]:
+        # unsampled requests leave the context empty, so every nested span
+        # costs a single ContextVar lookup
+        if self.exporter is None or self._rng.random() >= self.sample_rate:
+            yield None
+            return
+        root = _new_span(name, "server", None, attributes)
+        token = _current_span.set(root)
+        try:
+            yield root
+        finally:
+            _current_span.reset(token)
+            _finish(root)
+            self.exporter.export(root.finished)
+
+
+_current_span: ContextVar[Span | None] = ContextVar(
+    "current_span", default=None
+)
+
+
+def current_span() -> Span | None:
+    return _current_span.get()
+
+
+@contextmanager
+def span(name: str, kind: str = "internal", **attributes) -> Iterator:
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = _new_span(name, kind, parent, attributes)
+    token = _current_span.set(child)
+    try:
+        yield child
+    finally:
+        _current_span.reset(token)
+        _finish(child)
+
+
+def record_sql(statement: str, method: str, start_ns: int) -> None:
+    parent = _current_span.get()
+    if parent is None:
+        return
+    sql = _new_span(method, "client", parent, {"db.statement": statement})
+    sql.start_unix_ns -= time.perf_counter_ns() - start_ns
+    sql.start_ns = start_ns
+    _finish(sql)
+    ancestor = parent
+    while ancestor is not None:
+        ancestor.db_round_trips += 1
+        ancestor = ancestor.parent
+
+
+def traced(cls: type) -> type:
+    for name, attribute in list(vars(cls).items()):
+        if not name.startswith("_") and inspect.isfunction(attribute):
+            setattr(cls, name, _traced_method(attribute))
+    return cls
+
+
+def _traced_method(method: Callable) -> Callable:
+    name = method.__qualname__
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        if _current_span.get() is None:
+            return method(*args, **kwargs)
+        with span(name):
+            return method(*args, **kwargs)
+
+    return wrapper
+
+
+def _new_span(
+    name: str, kind: str, parent: Span | None, attributes: dict
+) -> Span:
+    return Span(
+        trace_id=(
+            f"{random.getrandbits(128):032x}"
+            if parent is None
+            else parent.trace_id
+        ),
+        span_id=f"{random.getrandbits(64):016x}",
+        parent=parent,
+        name=name,
+        kind=kind,
+        start_unix_ns=time.time_ns(),
+        start_ns=time.perf_counter_ns(),
+        attributes=attributes,
+        finished=list() if parent is None else parent.finished,
+    )
+
+
+def _finish(span: Span) -> None:
+    span.duration_ns = time.perf_counter_ns() - span.start_ns
+    span.finished.append(span)
+
+
+_OTLP_KINDS = {"internal": 1, "server": 2, "client": 3}
+
+
+def _to_otlp(spans: list[Span]) -> dict:
+    return {
+        "resourceSpans": [
+            {
+                "resource": {
+                    "attributes": [_otlp_attribute("service.name", "api")]
+                },
+                "scopeSpans": [
+                    {
+                        "scope": {"name": "src.tracing"},
+                        "spans": [_otlp_span(span) for span in spans],
+                    }
+                ],
+            }
+        ]
+    }
+
+
+def _otlp_span(span: Span) -> dict:
+    attributes = {**span.attributes, "db.round_trips": span.db_round_trips}
+    return {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "parentSpanId": "" if span.parent is None else span.parent.span_id,
+        "name": span.name,
+        "kind": _OTLP_KINDS[span.kind],
+        "startTimeUnixNano": str(span.start_unix_ns),
+        "endTimeUnixNano": str(span.start_unix_ns + span.duration_ns),
+        "attributes": [
+            _otlp_attribute(key, value) for key, value in attributes.items()
+        ],
+    }
+
+
+def _otlp_attribute(key: str, value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    return {"key": key, "value": {"stringValue": str(value)}}
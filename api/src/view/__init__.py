@@ -1,7 +1,31 @@
 from .user_dtos import (
     CreateUserDto,
     GetUserDto,
+    GetUserRow,
     UpdateUserDto,
     DeleteUserDto,
     ChangePasswordDto,
 )
+from .poll_dtos import (
+    GetOptionDto,
+    GetPollDto,
+    GetOptionResultDto,
+    GetPollResultsDto,
+    GetPollWithResultsDto,
+    PollSummaryDto,
+    PollSearchPageDto,
+    TrendingPollDto,
+    RankedPollDto,
+    LeaderboardPageDto,
+    OptionSeriesDto,
+    VoteSeriesDto,
+    OptionOverlapDto,
+    PollMembershipDto,
+    CrossTabDto,
+    OptionStatisticsDto,
+    PollStatisticsDto,
+    CreatePollDto,
+    CreateVoteDto,
+    PollCredentialsDto,
+)
+from .admin_dtos import SlowQueryDto, AllocationStatDto
@@ -0,0 +1,21 @@
+from datetime import datetime
+
+from pydantic import BaseModel
+
+
+class SlowQueryDto(BaseModel):
+    statement: str
+    parameters: list[str]
+    method: str
+    origin: str
+    duration_ms: float
+    logged_at: datetime
+    plan: str | None
+
+
+class AllocationStatDto(BaseModel):
+    location: list[str]
+    size_bytes: int
+    count: int
+    size_diff_bytes: int | None = None
+    count_diff: int | None = None
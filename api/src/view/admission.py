@@ -0,0 +1,198 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from fastapi import HTTPException, status
+from psycopg2 import Error as PsycopgError
+
+from src.dal.exceptions import DalDeadlineExceeded
+from src.deadline import (
+    set_deadline,
+    reset_deadline,
+    count_queries,
+    reset_query_count,
+)
+from src.metrics import ADMISSION_REJECTED
+
+# what counts against capacity; client errors such as a 404 or 409 do not
+_DROPS = (DalDeadlineExceeded, PsycopgError)
+
+
+class AimdLimit:
+    # grows by one slot per window of fast requests and backs off by a
+    # factor as soon as one is slow or fails
+    def __init__(self, backoff: float = 0.9, tolerance: float = 2.0):
+        self.backoff = backoff
+        self.tolerance = tolerance
+
+    def update(
+        self, limit: float, latency_s: float, min_latency_s: float, ok: bool
+    ) -> float:
+        if not ok or latency_s > min_latency_s * self.tolerance:
+            return limit * self.backoff
+        return limit + 1 / limit
+
+
+class VegasLimit:
+    # estimates how many requests wait inside the database from how far
+    # the latency is above the best seen and keeps that queue short
+    def __init__(self, alpha: float = 2, beta: float = 4):
+        self.alpha = alpha
+        self.beta = beta
+
+    def update(
+        self, limit: float, latency_s: float, min_latency_s: float, ok: bool
+    ) -> float:
+        if not ok:
+            return limit / 2
+        queued = limit * (1 - min_latency_s / latency_s)
+        if queued < self.alpha:
+            return limit + 1
+        if queued > self.beta:
+            return limit - 1
+        return limit
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        limit: int,
+        max_queue: int,
+        default_timeout_s: float,
+        max_timeout_s: float,
+        algorithm: AimdLimit | VegasLimit | None = None,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        latency_window: int = 50,
+    ) -> None:
+        self.limit = float(limit)
+        self.max_queue = max_queue
+        self.default_timeout_s = default_timeout_s
+        self.max_timeout_s = max_timeout_s
+        self.algorithm = algorithm
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.in_flight = 0
+        self.latency_s = 0.0
+        # the best latency among recent samples, so a one-off fast query
+        # does not hold the baseline down for good
+        self.min_latency_s = float("inf")
+        self._recent_latencies: deque[float] = deque(maxlen=latency_window)
+        self._waiters: deque[asyncio.Future] = deque()
+
+    def deadline(self, timeout_header: str | None) -> float:
+        timeout_s = self.default_timeout_s
+        if timeout_header is not None:
+            try:
+                timeout_s = int(timeout_header) / 1000
+            except ValueError:
+                pass
+        return time.monotonic() + min(timeout_s, self.max_timeout_s)
+
+    @asynccontextmanager
+    async def admit(self, deadline: float) -> AsyncIterator[None]:
+        await self._acquire(deadline)
+        token = set_deadline(deadline)
+        counter_token, queries = count_queries()
+        start = time.monotonic()
+        # cancelled requests are left out, their latency is cut short
+        ok, sampled = True, False
+        try:
+            yield
+            sampled = True
+        except _DROPS:
+            ok, sampled = False, True
+            raise
+        except Exception:
+            sampled = True
+            raise
+        finally:
+            reset_query_count(counter_token)
+            reset_deadline(token)
+            # requests served without a query, e.g. from a cache, say
+            # nothing about the database
+            sampled = sampled and (not ok or queries[0] > 0)
+            self._release(time.monotonic() - start, ok, sampled)
+
+    async def _acquire(self, deadline: float) -> None:
+        if self.in_flight < int(self.limit) and len(self._waiters) == 0:
+            if self._expected_wait_s(0) > deadline - time.monotonic():
+                _reject("deadline")
+            self.in_flight += 1
+            return
+
+        if len(self._waiters) >= self.max_queue:
+            _reject("queue_full")
+        # shed now what would only time out after waiting its turn
+        if self._expected_wait_s(len(self._waiters) + 1) > (
+            deadline - time.monotonic()
+        ):
+            _reject("deadline")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, deadline - time.monotonic())
+        except BaseException as error:
+            if waiter.done() and not waiter.cancelled():
+                # the slot arrived together with the timeout or cancellation
+                self._release_slot()
+            if isinstance(error, asyncio.TimeoutError):
+                _reject("timeout")
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def _release(
+        self, latency_s: float, ok: bool, sampled: bool = True
+    ) -> None:
+        if not sampled:
+            self._release_slot()
+            return
+        if ok:
+            self.latency_s = (
+                latency_s
+                if self.latency_s == 0
+                else 0.9 * self.latency_s + 0.1 * latency_s
+            )
+            self._recent_latencies.append(latency_s)
+            self.min_latency_s = min(self._recent_latencies)
+        if self.algorithm is not None and self.min_latency_s > 0:
+            self.limit = min(
+                self.max_limit,
+                max(
+                    self.min_limit,
+                    self.algorithm.update(
+                        self.limit,
+                        max(latency_s, 1e-9),
+                        self.min_latency_s,
+                        ok,
+                    ),
+                ),
+            )
+        self._release_slot()
+
+    def _release_slot(self) -> None:
+        self.in_flight -= 1
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # the slot passes straight to the waiter
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def _expected_wait_s(self, position: int) -> float:
+        # queued requests drain limit at a time, then this one runs
+        return (position / max(1.0, self.limit) + 1) * self.latency_s
+
+
+def _reject(reason: str) -> None:
+    ADMISSION_REJECTED.inc((reason,))
+    raise HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Server is overloaded, retry later",
+        headers={"Retry-After": "1"},
+    )
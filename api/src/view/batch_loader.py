@@ -0,0 +1,97 @@
+import asyncio
+import contextvars
+from concurrent.futures import Executor
+from typing import Callable, Generic, Hashable, TypeVar
+
+from src.dal.exceptions import DalDeadlineExceeded
+from src.deadline import get_deadline, remaining_s, set_deadline
+from src.metrics import BATCH_LOADER_BATCH_SIZE
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class BatchLoader(Generic[K, V]):
+    # lookups made by any request until the loop gets back to the loader
+    # (or until window_s passes) go to the database as one load_many call
+    def __init__(
+        self,
+        name: str,
+        load_many: Callable[[list[K]], dict[K, V]],
+        max_batch_size: int = 100,
+        window_s: float = 0.0,
+        executor: Executor | None = None,
+    ) -> None:
+        self.name = name
+        self.load_many = load_many
+        self.max_batch_size = max_batch_size
+        self.window_s = window_s
+        self._executor = executor
+        self._pending: dict[K, asyncio.Future] = dict()
+        # the deadlines of the callers in the pending batch
+        self._deadlines: list[float | None] = list()
+        self._handle: asyncio.Handle | None = None
+        self._running: set[asyncio.Task] = set()
+
+    async def load(self, key: K) -> V | None:
+        self._deadlines.append(get_deadline())
+        future = self._pending.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._pending[key] = future
+            if len(self._pending) >= self.max_batch_size:
+                self._dispatch()
+            elif self._handle is None:
+                if self.window_s > 0:
+                    self._handle = loop.call_later(
+                        self.window_s, self._dispatch
+                    )
+                else:
+                    self._handle = loop.call_soon(self._dispatch)
+        # a caller that gives up, or whose deadline passes, must not
+        # cancel the others' result
+        remaining = remaining_s()
+        if remaining is None:
+            return await asyncio.shield(future)
+        try:
+            return await asyncio.wait_for(
+                asyncio.shield(future), max(remaining, 0)
+            )
+        except asyncio.TimeoutError:
+            raise DalDeadlineExceeded(f"{self.name} batch load")
+
+    def _dispatch(self) -> None:
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        batch, self._pending = self._pending, dict()
+        deadlines, self._deadlines = self._deadlines, list()
+        if len(batch) == 0:
+            return
+        # the batch is given as long as its most patient caller
+        deadline = None if None in deadlines else max(deadlines)
+        task = asyncio.ensure_future(self._run(batch, deadline))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _run(
+        self, batch: dict[K, asyncio.Future], deadline: float | None
+    ) -> None:
+        keys = list(batch)
+        BATCH_LOADER_BATCH_SIZE.observe((self.name,), len(keys))
+        # runs with the trace of the request that opened the batch
+        context = contextvars.copy_context()
+        context.run(set_deadline, deadline)
+        try:
+            values = await asyncio.get_running_loop().run_in_executor(
+                self._executor, context.run, self.load_many, keys
+            )
+        except BaseException as error:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(error)
+            return
+        for key, future in batch.items():
+            if not future.done():
+                future.set_result(values.get(key))
@@ -0,0 +1,50 @@
+import time
+
+from src.metrics import (
+    HTTP_REQUEST_SECONDS,
+    HTTP_REQUESTS_IN_FLIGHT,
+    HTTP_REQUEST_ALLOCATED_BYTES,
+)
+from src.profiling import allocation_tracker
+
+
+class MetricsMiddleware:
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        tracking = allocation_tracker.active
+        if tracking:
+            allocated = allocation_tracker.traced_bytes()
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            # the router stores the matched route in the scope; raw paths
+            # would give every poll id its own series
+            route = scope.get("route")
+            route = "unmatched" if route is None else route.path
+            HTTP_REQUEST_SECONDS.observe(
+                (scope["method"], route, status_code),
+                time.perf_counter() - start,
+            )
+            if tracking and allocation_tracker.active:
+                # process wide, so concurrent requests blur into each other
+                HTTP_REQUEST_ALLOCATED_BYTES.observe(
+                    (route,),
+                    max(0, allocation_tracker.traced_bytes() - allocated),
+                )
@@ -0,0 +1,151 @@
+from datetime import datetime
+
+from pydantic import BaseModel
+
+
+class GetOptionDto(BaseModel):
+    id: int
+    text: str
+
+
+class GetPollDto(BaseModel):
+    id: int
+    name: str
+    tag: str
+    user_id: int
+    creation_date: datetime
+    anonymous_voting: bool
+    multiple_choice: bool
+    options: list[GetOptionDto]
+
+
+class PollSummaryDto(BaseModel):
+    id: int
+    name: str
+    tag: str
+    user_id: int
+    creation_date: datetime
+
+
+class PollSearchPageDto(BaseModel):
+    polls: list[PollSummaryDto]
+    next_cursor: str | None
+
+
+class RankedPollDto(BaseModel):
+    poll_id: int
+    name: str
+    tag: str
+    votes: int
+
+
+class LeaderboardPageDto(BaseModel):
+    polls: list[RankedPollDto]
+    next_cursor: str | None
+
+
+class OptionSeriesDto(BaseModel):
+    id: int
+    text: str
+    votes: list[int]
+
+
+class VoteSeriesDto(BaseModel):
+    poll_id: int
+    resolution: str
+    buckets: list[datetime]
+    options: list[OptionSeriesDto]
+
+
+class OptionOverlapDto(BaseModel):
+    poll_id: int
+    option_ids: list[int]
+    voters: list[list[int]]
+
+
+class PollMembershipDto(BaseModel):
+    poll_id: int
+    user_id: int
+    voted: bool
+    option_ids: list[int] | None
+
+
+class CrossTabDto(BaseModel):
+    poll_id: int
+    other_poll_id: int
+    option_ids: list[int]
+    other_option_ids: list[int]
+    counts: list[list[int]]
+    voters: int
+    other_voters: int
+    overlap: int
+    chi_square: float
+    degrees_of_freedom: int
+    p_value: float
+    cramers_v: float
+
+
+class OptionStatisticsDto(BaseModel):
+    id: int
+    votes: int
+    share: float
+    lower: float
+    upper: float
+    margin_of_error: float
+    win_probability: float
+
+
+class PollStatisticsDto(BaseModel):
+    poll_id: int
+    votes: int
+    options: list[OptionStatisticsDto]
+
+
+class TrendingPollDto(BaseModel):
+    poll_id: int
+    votes_per_minute: float
+
+
+class GetOptionResultDto(BaseModel):
+    id: int
+    text: str
+    votes: int
+
+
+class GetPollResultsDto(BaseModel):
+    poll_id: int
+    total_votes: int
+    options: list[GetOptionResultDto]
+
+
+class GetPollWithResultsDto(BaseModel):
+    id: int
+    name: str
+    tag: str
+    user_id: int
+    creation_date: datetime
+    anonymous_voting: bool
+    multiple_choice: bool
+    total_votes: int
+    options: list[GetOptionResultDto]
+
+
+class CreatePollDto(BaseModel):
+    user_id: int
+    password: str
+    name: str
+    tag: str
+    anonymous_voting: bool = False
+    multiple_choice: bool = False
+    options: list[str]
+
+
+class CreateVoteDto(BaseModel):
+    user_id: int
+    password: str
+    option_id: int
+
+
+class PollCredentialsDto(BaseModel):
+    user_id: int
+    password: str
@@ -0,0 +1,148 @@
+import gzip
+import secrets
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from fastapi import Response, status
+
+_MIN_COMPRESSED_SIZE = 512
+
+
+@dataclass
+class CachedBody:
+    etag: str
+    identity: bytes
+    gzip: bytes | None
+    br: bytes | None
+    stored_at: float = 0.0
+
+    @property
+    def size(self) -> int:
+        return len(self.identity) + len(self.gzip or b"") + len(self.br or b"")
+
+
+class PollResponseCache:
+    # versions only change with writes made through this process; past
+    # max_age_s an entry is rendered again and compared, so writes from
+    # anywhere else show up within that bound
+    def __init__(
+        self,
+        max_bytes: int,
+        max_age_s: float = 1.0,
+        epoch: str | None = None,
+    ):
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        # versions restart at 0 with the process, the epoch keeps etags
+        # from a previous process from matching
+        self.epoch = epoch or secrets.token_hex(4)
+        self._entries: OrderedDict[tuple[str, int], CachedBody] = OrderedDict()
+        self._size = 0
+
+    def etag(self, version: int) -> str:
+        return f'W/"{self.epoch}-{version}"'
+
+    def not_modified(
+        self, etag: str, if_none_match: str | None
+    ) -> Response | None:
+        if if_none_match is None:
+            return None
+        for candidate in if_none_match.split(","):
+            candidate = candidate.strip()
+            if candidate == "*" or candidate.removeprefix("W/") == (
+                etag.removeprefix("W/")
+            ):
+                return Response(
+                    status_code=status.HTTP_304_NOT_MODIFIED,
+                    headers={"ETag": etag, "Vary": "Accept-Encoding"},
+                )
+        return None
+
+    def get(
+        self, key: tuple[str, int], etag: str, accept_encoding: str | None
+    ) -> Response | None:
+        entry = self._entries.get(key)
+        if (
+            entry is None
+            or entry.etag != etag
+            or time.monotonic() - entry.stored_at >= self.max_age_s
+        ):
+            return None
+        self._entries.move_to_end(key)
+        return _to_response(entry, accept_encoding)
+
+    def peek(self, key: tuple[str, int]) -> tuple[str, bytes] | None:
+        # the etag and body last stored for key, however old
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        return entry.etag, entry.identity
+
+    def put(
+        self,
+        key: tuple[str, int],
+        etag: str,
+        body: bytes,
+        accept_encoding: str | None,
+    ) -> Response:
+        entry = CachedBody(
+            etag=etag,
+            identity=body,
+            gzip=None,
+            br=None,
+            stored_at=time.monotonic(),
+        )
+        if len(body) >= _MIN_COMPRESSED_SIZE:
+            # imported on the first large body, not on app import
+            import brotli
+
+            entry.gzip = gzip.compress(body, compresslevel=6)
+            entry.br = brotli.compress(body, quality=5)
+
+        self.discard(key)
+        if entry.size <= self.max_bytes:
+            self._entries[key] = entry
+            self._size += entry.size
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.size
+        return _to_response(entry, accept_encoding)
+
+    def discard(self, key: tuple[str, int]) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= entry.size
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+
+def _to_response(entry: CachedBody, accept_encoding: str | None) -> Response:
+    headers = {"ETag": entry.etag, "Vary": "Accept-Encoding"}
+    encodings = _accepted_encodings(accept_encoding)
+    if entry.br is not None and "br" in encodings:
+        headers["Content-Encoding"] = "br"
+        content = entry.br
+    elif entry.gzip is not None and "gzip" in encodings:
+        headers["Content-Encoding"] = "gzip"
+        content = entry.gzip
+    else:
+        content = entry.identity
+    return Response(
+        content=content, media_type="application/json", headers=headers
+    )
+
+
+def _accepted_encodings(accept_encoding: str | None) -> set[str]:
+    if accept_encoding is None:
+        return set()
+    encodings = set()
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        params = params.replace(" ", "")
+        if params in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        encodings.add(name.strip().lower())
+    return encodings
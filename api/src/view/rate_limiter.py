@@ -0,0 +1,219 @@
+import fcntl
+import hashlib
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+from contextlib import ExitStack
+from dataclasses import dataclass
+from typing import Protocol
+
+from fastapi import HTTPException, Request, status
+
+
+@dataclass
+class RateLimitRule:
+    rate_per_s: float
+    burst: float
+    per_user: bool = True
+    per_ip: bool = True
+
+
+class BucketBackend(Protocol):
+    # takes a token from every bucket and returns 0, or takes none and
+    # returns the seconds until all of them have one
+    def acquire_all(
+        self, keys: list[str], rate_per_s: float, burst: float
+    ) -> float: ...
+
+
+class InMemoryBucketBackend:
+    # buckets refill lazily from the time of their last use, so idle ones
+    # cost nothing and dropping the least recently used is always safe:
+    # a bucket that comes back starts full, as it would have refilled
+    def __init__(self, shards: int = 64, max_buckets: int = 1_000_000):
+        self._shards = [OrderedDict() for _ in range(shards)]
+        self._locks = [threading.Lock() for _ in range(shards)]
+        self._max_per_shard = max(1, max_buckets // shards)
+
+    def acquire(self, key: str, rate_per_s: float, burst: float) -> float:
+        return self.acquire_all([key], rate_per_s, burst)
+
+    def acquire_all(
+        self, keys: list[str], rate_per_s: float, burst: float
+    ) -> float:
+        # shard locks are taken in index order, so two requests never
+        # wait on each other's
+        indexes = [hash(key) % len(self._shards) for key in keys]
+        now = time.monotonic()
+        with ExitStack() as stack:
+            for index in sorted(set(indexes)):
+                stack.enter_context(self._locks[index])
+            buckets = [
+                self._bucket(index, key, burst, now)
+                for index, key in zip(indexes, keys)
+            ]
+            return _take_all(buckets, rate_per_s, burst, now)
+
+    def _bucket(self, index: int, key: str, burst: float, now: float) -> list:
+        buckets = self._shards[index]
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = [burst, now]
+            buckets[key] = bucket
+            if len(buckets) > self._max_per_shard:
+                buckets.popitem(last=False)
+        else:
+            buckets.move_to_end(key)
+        return bucket
+
+    def __len__(self) -> int:
+        return sum(len(buckets) for buckets in self._shards)
+
+
+class SharedMemoryBucketBackend:
+    # a fixed table of buckets in a memory-mapped file, shared by all
+    # workers on the host; keys hash to a slot and a slot taken over by
+    # another key starts full, which only errs towards letting through
+    _SLOT = struct.Struct("<Qdd")
+
+    def __init__(self, path: str, slots: int = 1 << 20, stripes: int = 256):
+        self.slots = slots
+        self.stripes = stripes
+        size = slots * self._SLOT.size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self._fd).st_size < size:
+            os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+        # record locks are held per process, not per thread
+        self._locks = [threading.Lock() for _ in range(stripes)]
+
+    def acquire(self, key: str, rate_per_s: float, burst: float) -> float:
+        return self.acquire_all([key], rate_per_s, burst)
+
+    def acquire_all(
+        self, keys: list[str], rate_per_s: float, burst: float
+    ) -> float:
+        # never 0, so a zeroed slot reads as unused
+        key_hashes = [
+            int.from_bytes(
+                hashlib.blake2b(key.encode(), digest_size=8).digest(), "little"
+            )
+            | 1
+            for key in keys
+        ]
+        offsets = [
+            (key_hash % self.slots) * self._SLOT.size for key_hash in key_hashes
+        ]
+        stripes = {
+            (key_hash % self.slots) % self.stripes for key_hash in key_hashes
+        }
+        # wall clock, because monotonic clocks are not shared by processes
+        now = time.time()
+        # stripes are locked in order, so two requests never wait on
+        # each other's
+        with ExitStack() as stack:
+            for stripe in sorted(stripes):
+                stack.enter_context(self._locks[stripe])
+                fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, stripe)
+                stack.callback(fcntl.lockf, self._fd, fcntl.LOCK_UN, 1, stripe)
+            return self._acquire_locked(
+                key_hashes, offsets, rate_per_s, burst, now
+            )
+
+    def _acquire_locked(
+        self,
+        key_hashes: list[int],
+        offsets: list[int],
+        rate_per_s: float,
+        burst: float,
+        now: float,
+    ) -> float:
+        buckets = list()
+        for key_hash, offset in zip(key_hashes, offsets):
+            stored_hash, tokens, last = self._SLOT.unpack_from(
+                self._map, offset
+            )
+            if stored_hash != key_hash:
+                tokens, last = burst, now
+            buckets.append([tokens, last])
+        wait = _take_all(buckets, rate_per_s, burst, now)
+        for key_hash, offset, bucket in zip(key_hashes, offsets, buckets):
+            self._SLOT.pack_into(self._map, offset, key_hash, *bucket)
+        return wait
+
+    def close(self) -> None:
+        self._map.close()
+        os.close(self._fd)
+
+
+class RateLimiter:
+    def __init__(
+        self, backend: BucketBackend, rules: dict[str, RateLimitRule]
+    ) -> None:
+        self.backend = backend
+        self.rules = rules
+
+    def check(
+        self, rule_name: str, request: Request, user_id: int | None = None
+    ) -> None:
+        # user_id is the caller whose credentials the request carries,
+        # taken from the path when not given
+        rule = self.rules.get(rule_name)
+        if rule is None:
+            return
+        keys = list()
+        if user_id is None:
+            user_id = request.path_params.get("user_id")
+        if rule.per_user and user_id is not None:
+            keys.append(f"{rule_name}:user:{user_id}")
+        if rule.per_ip and request.client is not None:
+            keys.append(f"{rule_name}:ip:{request.client.host}")
+        if len(keys) == 0:
+            return
+
+        wait = self.backend.acquire_all(keys, rule.rate_per_s, rule.burst)
+        if wait > 0:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                headers={"Retry-After": str(math.ceil(min(wait, 3600)))},
+            )
+
+
+def parse_rules(
+    value: str, defaults: dict[str, RateLimitRule]
+) -> dict[str, RateLimitRule]:
+    # "signup=1:10,credentials=0.5:5" sets rate per second and burst
+    rules = dict(defaults)
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, _, limits = item.partition("=")
+        rate_per_s, _, burst = limits.partition(":")
+        default = defaults.get(name, RateLimitRule(0, 0))
+        rules[name] = RateLimitRule(
+            rate_per_s=float(rate_per_s),
+            burst=float(burst or rate_per_s),
+            per_user=default.per_user,
+            per_ip=default.per_ip,
+        )
+    return rules
+
+
+def _take_all(
+    buckets: list[list], rate_per_s: float, burst: float, now: float
+) -> float:
+    # every bucket is refilled, and only if all of them hold a token is
+    # one taken from each
+    for bucket in buckets:
+        bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate_per_s)
+        bucket[1] = now
+    tokens = min(bucket[0] for bucket in buckets)
+    if tokens >= 1:
+        for bucket in buckets:
+            bucket[0] -= 1
+        return 0.0
+    if rate_per_s <= 0:
+        return math.inf
+    return (1 - tokens) / rate_per_s
@@ -1,3 +1,5 @@
+from typing_extensions import TypedDict
+
 from pydantic import BaseModel
 
 
@@ -11,6 +13,11 @@ class GetUserDto(BaseModel):
     name: str
 
 
+class GetUserRow(TypedDict):
+    id: int
+    name: str
+
+
 class UpdateUserDto(BaseModel):
     name: str
     password: str
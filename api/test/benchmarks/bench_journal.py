@@ -0,0 +1,70 @@
+import argparse
+import tempfile
+import time
+
+from src.dal import Journal, InMemoryUserRepository
+
+
+def bench_writes(users: int, fsync_interval_ms: int | None) -> float:
+    with tempfile.TemporaryDirectory() as directory:
+        journal = None
+        if fsync_interval_ms is not None:
+            journal = Journal(directory, fsync_interval_ms=fsync_interval_ms)
+        user_repository = InMemoryUserRepository(journal=journal)
+
+        start = time.perf_counter()
+        for i in range(users):
+            user_repository.create_user(name=f"user{i}", password_hash="hash")
+        if journal is not None:
+            journal.close()
+        return users / (time.perf_counter() - start)
+
+
+def bench_startup(users: int, snapshot: bool) -> float:
+    with tempfile.TemporaryDirectory() as directory:
+        journal = Journal(directory, snapshot_threshold=users + 1)
+        user_repository = InMemoryUserRepository(journal=journal)
+        for i in range(users):
+            user_repository.create_user(name=f"user{i}", password_hash="hash")
+        if snapshot:
+            journal.write_snapshot(user_repository._snapshot_records())
+        journal.close()
+
+        start = time.perf_counter()
+        InMemoryUserRepository(journal=Journal(directory))
+        return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Throughput and startup cost of journaled user storage"
+    )
+    parser.add_argument("--users", type=int, default=200_000)
+    parser.add_argument("--fsync-users", type=int, default=2_000)
+    args = parser.parse_args()
+
+    baseline = bench_writes(args.users, fsync_interval_ms=None)
+    print(f"no journal              {baseline:>12,.0f} creates/s")
+    for interval in (100, 10, 1):
+        ops = bench_writes(args.users, fsync_interval_ms=interval)
+        print(
+            f"group commit {interval:>4} ms    {ops:>12,.0f} creates/s"
+            f"  ({ops / baseline:.0%} of baseline)"
+        )
+    ops = bench_writes(args.fsync_users, fsync_interval_ms=0)
+    print(
+        f"fsync every write       {ops:>12,.0f} creates/s"
+        f"  ({ops / baseline:.0%} of baseline)"
+    )
+
+    for snapshot in (True, False):
+        seconds = bench_startup(args.users, snapshot=snapshot)
+        source = "snapshot" if snapshot else "log replay"
+        print(
+            f"startup from {source:<10} {args.users / seconds:>12,.0f} users/s"
+            f"  ({seconds:.2f}s for {args.users:,})"
+        )
+
+
+if __name__ == "__main__":
+    main()
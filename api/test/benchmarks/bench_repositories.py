@@ -0,0 +1,330 @@
+import argparse
+import os
+import random
+import sys
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+from src.bll.poll_service import PollService
+from src.bll.user_service import UserService
+from src.configuration import DB_NAME
+from src.dal import UserRepository, PollRepository, VoteRepository
+from src.dal.init_db import ensure_exists
+from .datagen import (
+    Dataset,
+    connect,
+    load_postgres,
+    poll_owner,
+    poll_of_option,
+)
+from .reporting import summarize, write_results, find_regressions, print_table
+
+
+@dataclass
+class Case:
+    name: str
+    run: Callable[[object], object]
+    writes: bool = False
+    # runs untimed before each operation, its result is passed to run
+    prepare: Callable[[random.Random], object] | None = None
+
+
+def is_seeded(cur, dataset: Dataset) -> bool:
+    cur.execute(
+        "SELECT (SELECT count(*) FROM users), (SELECT count(*) FROM polls), "
+        "(SELECT count(*) FROM votes);"
+    )
+    return cur.fetchone() == (dataset.users, dataset.polls, dataset.votes)
+
+
+def build_cases(cur, dataset: Dataset) -> list[Case]:
+    user_repository = UserRepository(cur)
+    poll_repository = PollRepository(cur)
+    vote_repository = VoteRepository(cur, user_repository, poll_repository)
+    user_service = UserService(user_repository=user_repository)
+    poll_service = PollService(
+        poll_repository=poll_repository, vote_repository=vote_repository
+    )
+
+    def user_id(rng: random.Random) -> int:
+        return rng.randint(1, dataset.users)
+
+    def poll_id(rng: random.Random) -> int:
+        return rng.randint(1, dataset.polls)
+
+    def option_id(rng: random.Random) -> int:
+        return rng.randint(1, dataset.options)
+
+    def vote_id(rng: random.Random) -> int:
+        return rng.randint(1, max(1, dataset.votes))
+
+    def fresh_name(rng: random.Random) -> str:
+        return f"bench{rng.getrandbits(64)}"
+
+    def create_user(rng: random.Random) -> int:
+        name = fresh_name(rng)
+        user_repository.create_user(
+            name=name, password_hash="hash", commit=False
+        )
+        return user_repository.get_user_by_name(name).id
+
+    def update_user(rng: random.Random) -> None:
+        user = user_repository.get_user_by_id(user_id(rng))
+        user.password_hash = "hashother"
+        user_repository.update_user(user, commit=False)
+
+    def create_poll(rng: random.Random) -> None:
+        poll_repository.create_poll(
+            name="bench",
+            tag=fresh_name(rng),
+            user_id=user_id(rng),
+            anonymous_voting=False,
+            multiple_choice=False,
+            options=["a", "b", "c", "d"],
+            commit=False,
+        )
+
+    def new_voter(rng: random.Random) -> tuple[int, int]:
+        # a fresh user never collides with the seeded primary keys
+        return create_user(rng), option_id(rng)
+
+    def create_vote(voter: tuple[int, int]) -> None:
+        user, option = voter
+        vote_repository.create_vote(
+            option_id=option, user_id=user, commit=False
+        )
+
+    def get_poll_by_user_and_tag(rng: random.Random) -> None:
+        poll = poll_id(rng)
+        poll_repository.get_poll_by_user_and_tag(
+            poll_owner(dataset, poll), f"tag{poll}"
+        )
+
+    def service_create_vote(voter: tuple[int, int]) -> None:
+        user, option = voter
+        poll = poll_of_option(dataset, option)
+        poll_service.create_vote(poll_id=poll, option_id=option, user_id=user)
+
+    return [
+        Case(
+            "UserRepository.get_user_by_id",
+            lambda rng: user_repository.get_user_by_id(user_id(rng)),
+        ),
+        Case(
+            "UserRepository.get_user_by_name",
+            lambda rng: user_repository.get_user_by_name(
+                f"user{user_id(rng)}"
+            ),
+        ),
+        Case(
+            "UserRepository.get_users[100]",
+            lambda rng: user_repository.get_users(
+                [user_id(rng) for _ in range(100)]
+            ),
+        ),
+        Case(
+            "UserRepository.get_user_rows[100]",
+            lambda rng: user_repository.get_user_rows(
+                [user_id(rng) for _ in range(100)]
+            ),
+        ),
+        Case("UserRepository.create_user", create_user, True),
+        Case("UserRepository.update_user", update_user, True),
+        Case(
+            "UserRepository.delete_user",
+            lambda user: user_repository.delete_user(user, commit=False),
+            True,
+            create_user,
+        ),
+        Case(
+            "PollRepository.get_poll_by_id",
+            lambda rng: poll_repository.get_poll_by_id(poll_id(rng)),
+        ),
+        Case(
+            "PollRepository.get_polls[100]",
+            lambda rng: poll_repository.get_polls(
+                [poll_id(rng) for _ in range(100)]
+            ),
+        ),
+        Case(
+            "PollRepository.get_polls_with_options[100]",
+            lambda rng: poll_repository.get_polls_with_options(
+                [poll_id(rng) for _ in range(100)], with_counts=True
+            ),
+        ),
+        Case(
+            "PollRepository.get_polls_by_user",
+            lambda rng: poll_repository.get_polls_by_user(user_id(rng)),
+        ),
+        Case(
+            "PollRepository.get_poll_by_user_and_tag", get_poll_by_user_and_tag
+        ),
+        Case(
+            "PollRepository.get_options_for_poll",
+            lambda rng: poll_repository.get_options_for_poll(poll_id(rng)),
+        ),
+        Case(
+            "PollRepository.get_option_by_id",
+            lambda rng: poll_repository.get_option_by_id(option_id(rng)),
+        ),
+        Case("PollRepository.create_poll", create_poll, True),
+        Case(
+            "PollRepository.delete_poll",
+            lambda rng: poll_repository.delete_poll(
+                poll_id(rng), commit=False
+            ),
+            True,
+        ),
+        Case(
+            "VoteRepository.get_vote_by_id",
+            lambda rng: vote_repository.get_vote_by_id(vote_id(rng)),
+        ),
+        Case(
+            "VoteRepository.get_votes_by_poll",
+            lambda rng: vote_repository.get_votes_by_poll(poll_id(rng)),
+        ),
+        Case(
+            "VoteRepository.get_votes_by_user",
+            lambda rng: vote_repository.get_votes_by_user(user_id(rng)),
+        ),
+        Case(
+            "VoteRepository.get_votes_by_user_poll",
+            lambda rng: vote_repository.get_votes_by_user_poll(
+                poll_id(rng), user_id(rng)
+            ),
+        ),
+        Case(
+            "VoteRepository.get_vote_counts_by_poll",
+            lambda rng: vote_repository.get_vote_counts_by_poll(poll_id(rng)),
+        ),
+        Case("VoteRepository.create_vote", create_vote, True, new_voter),
+        Case(
+            "VoteRepository.delete_vote",
+            lambda rng: vote_repository.delete_vote(
+                vote_id(rng), commit=False
+            ),
+            True,
+        ),
+        Case(
+            "UserService.get_user",
+            lambda rng: user_service.get_user(user_id(rng)),
+        ),
+        Case(
+            "UserService.login",
+            lambda rng: user_service.login(user_id(rng), "password"),
+        ),
+        Case(
+            "PollService.get_poll_by_id",
+            lambda rng: poll_service.get_poll_by_id(poll_id(rng)),
+        ),
+        Case(
+            "PollService.get_polls_by_userid",
+            lambda rng: poll_service.get_polls_by_userid(user_id(rng)),
+        ),
+        Case(
+            "PollService.get_poll_results",
+            lambda rng: poll_service.get_poll_results(poll_id(rng)),
+        ),
+        Case("PollService.create_vote", service_create_vote, True, new_voter),
+    ]
+
+
+def run_case(connection, case: Case, iterations: int, warmup: int, seed: int):
+    rng = random.Random(seed)
+    prepare = case.prepare or (lambda r: r)
+    try:
+        for _ in range(warmup):
+            case.run(prepare(rng))
+        latencies = list()
+        for _ in range(iterations):
+            argument = prepare(rng)
+            op_start = time.perf_counter_ns()
+            case.run(argument)
+            latencies.append(time.perf_counter_ns() - op_start)
+        return summarize(latencies, sum(latencies) / 1e9)
+    except KeyboardInterrupt:
+        raise
+    except BaseException as e:
+        return {"error": f"{type(e).__name__}: {e}".strip()}
+    finally:
+        # repository writes run inside one transaction that is thrown
+        # away; service flows commit, so their rows are removed afterwards
+        connection.rollback()
+        if case.writes:
+            remove_benchmark_rows(connection)
+
+
+def remove_benchmark_rows(connection) -> None:
+    cur = connection.cursor()
+    cur.execute("""
+    DELETE FROM votes
+    WHERE user_id IN (SELECT id FROM users WHERE name LIKE 'bench%');
+    DELETE FROM users WHERE name LIKE 'bench%';
+    """)
+    connection.commit()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Time repository and service methods on a seeded database"
+    )
+    parser.add_argument("--dbname", default=DB_NAME)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--polls", type=int, default=10_000)
+    parser.add_argument("--options-per-poll", type=int, default=4)
+    parser.add_argument("--votes", type=int, default=1_000_000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--reseed", action="store_true")
+    parser.add_argument("--iterations", type=int, default=1_000)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--filter", default="")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="bench_repositories.json")
+    parser.add_argument("--baseline")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    args = parser.parse_args()
+
+    dataset = Dataset(
+        users=args.users,
+        polls=args.polls,
+        options_per_poll=args.options_per_poll,
+        votes=args.votes,
+        seed=args.seed,
+    )
+    connection = connect(args.dbname)
+    cur = connection.cursor()
+    ensure_exists(cur)
+    if args.reseed or not is_seeded(cur, dataset):
+        # the loader truncates from its own connections
+        connection.commit()
+        start = time.perf_counter()
+        load_postgres(
+            args.dbname, dataset, args.workers, defer_constraints=True
+        )
+        print(
+            f"seeded {dataset.users:,} users, {dataset.polls:,} polls, "
+            f"{dataset.options:,} options, {dataset.votes:,} votes "
+            f"in {time.perf_counter() - start:.1f}s"
+        )
+
+    results = dict()
+    for case in build_cases(cur, dataset):
+        if args.filter not in case.name:
+            continue
+        results[case.name] = run_case(
+            connection, case, args.iterations, args.warmup, args.seed
+        )
+    print_table(results)
+
+    write_results(args.output, results, vars(args))
+    if args.baseline is not None:
+        regressions = find_regressions(results, args.baseline, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if len(regressions) > 0:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import argparse
+import os
+import random
+import sys
+import time
+from typing import Callable
+
+from src.configuration import DB_NAME
+from src.dal import PollRepository
+from src.dal.init_db import ensure_exists
+from .datagen import Dataset, connect, load_postgres, poll_name
+from .reporting import summarize, write_results, find_regressions, print_table
+
+
+def build_queries(
+    dataset: Dataset, rng: random.Random
+) -> dict[str, Callable[[], str]]:
+    def words() -> list[str]:
+        return poll_name(dataset, rng.randint(1, dataset.polls)).split()
+
+    def typo() -> str:
+        word = rng.choice(words())
+        position = rng.randrange(len(word))
+        return word[:position] + word[position + 1 :]
+
+    return {
+        "one word": lambda: rng.choice(words()),
+        "two words": lambda: " ".join(words()[:2]),
+        "whole name": lambda: " ".join(words()),
+        "typo": typo,
+    }
+
+
+def is_seeded(cur, dataset: Dataset) -> bool:
+    cur.execute("SELECT count(*) FROM polls;")
+    return cur.fetchone()[0] == dataset.polls
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Time ranked poll search with keyset pagination"
+    )
+    parser.add_argument("--dbname", default=DB_NAME)
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--polls", type=int, default=10_000_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--reseed", action="store_true")
+    parser.add_argument("--explain", action="store_true")
+    parser.add_argument("--output", default="bench_search.json")
+    parser.add_argument("--baseline")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    args = parser.parse_args()
+
+    dataset = Dataset(
+        users=args.users,
+        polls=args.polls,
+        options_per_poll=2,
+        votes=0,
+        seed=args.seed,
+    )
+    connection = connect(args.dbname)
+    cur = connection.cursor()
+    ensure_exists(cur)
+    if args.reseed or not is_seeded(cur, dataset):
+        connection.commit()
+        load_postgres(args.dbname, dataset, args.workers, False)
+    connection.rollback()
+
+    poll_repository = PollRepository(cur)
+    rng = random.Random(args.seed)
+    results = dict()
+    for name, make_query in build_queries(dataset, rng).items():
+        if args.explain:
+            query = make_query()
+            cur.execute(
+                "EXPLAIN (ANALYZE, BUFFERS) SELECT id FROM polls, "
+                "websearch_to_tsquery('simple', %(q)s) AS query "
+                "WHERE search_vector @@ query "
+                "OR search_text %% lower(%(q)s);",
+                {"q": query},
+            )
+            print(f"-- {name}: {query}")
+            print("\n".join(row[0] for row in cur.fetchall()))
+            connection.rollback()
+
+        for page in ("first page", "next page"):
+            latencies = list()
+            start = time.perf_counter()
+            for _ in range(args.queries):
+                query = make_query()
+                cursor = None
+                if page == "next page":
+                    hits = poll_repository.search_polls(query, args.limit)
+                    if len(hits) < args.limit:
+                        continue
+                    cursor = (hits[-1].rank, hits[-1].poll.id)
+                began = time.perf_counter_ns()
+                poll_repository.search_polls(query, args.limit, cursor)
+                latencies.append(time.perf_counter_ns() - began)
+                connection.rollback()
+            results[f"{name}, {page}"] = summarize(
+                latencies, time.perf_counter() - start
+            )
+    connection.close()
+    print_table(results)
+
+    write_results(args.output, results, vars(args))
+    if args.baseline is not None:
+        regressions = find_regressions(results, args.baseline, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if len(regressions) > 0:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+from .reporting import summarize, write_results, find_regressions, print_table
+
+_IMPORT = """
+import time
+start = time.perf_counter_ns()
+import src.main
+print(time.perf_counter_ns() - start)
+"""
+
+# startup and shutdown of the lifespan, as uvicorn runs them before the
+# first request; needs the database the configuration points at
+_LIFESPAN = """
+import asyncio, time
+start = time.perf_counter_ns()
+import src.main
+
+async def boot():
+    async with src.main.app.router.lifespan_context(src.main.app):
+        print(time.perf_counter_ns() - start)
+
+asyncio.run(boot())
+"""
+
+
+def measure(code: str, runs: int, env: dict[str, str]) -> list[int]:
+    latencies = list()
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            capture_output=True,
+            text=True,
+            env=env,
+            check=True,
+        )
+        latencies.append(int(result.stdout.split()[-1]))
+    return latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Time cold imports and lifespan startup in fresh processes"
+    )
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--lifespan", action="store_true")
+    parser.add_argument("--output", default="bench_startup.json")
+    parser.add_argument("--baseline")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    args = parser.parse_args()
+
+    env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+    cases = {"import src.main": _IMPORT}
+    if args.lifespan:
+        cases["lifespan startup"] = _LIFESPAN
+
+    results = dict()
+    for name, code in cases.items():
+        start = time.perf_counter()
+        latencies = measure(code, args.runs, env)
+        results[name] = summarize(latencies, time.perf_counter() - start)
+    print_table(results)
+
+    write_results(args.output, results, vars(args))
+    if args.baseline is not None:
+        regressions = find_regressions(results, args.baseline, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if len(regressions) > 0:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
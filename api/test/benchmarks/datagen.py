@@ -0,0 +1,533 @@
+import argparse
+import io
+import math
+import multiprocessing
+import os
+import random
+import time
+from array import array
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Iterator
+
+import psycopg2
+
+from src.configuration import DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, DB_NAME
+from src.dal import (
+    InMemoryUserRepository,
+    InMemoryPollRepository,
+    InMemoryVoteRepository,
+    Journal,
+    UserEntity,
+    PollEntity,
+    VoteEntity,
+)
+from src.dal.dal_entities import OptionEntity
+from src.dal.init_db import ensure_exists, rebuild_vote_totals
+
+_COPY_CHUNK_ROWS = 200_000
+_BASE_DATE = datetime(2024, 1, 1)
+_VOTE_WINDOW_S = 30 * 24 * 3600
+_MASK64 = (1 << 64) - 1
+_SYLLABLES = (
+    "ba be bi bo bu da de di do du ka ke ki ko ku la "
+    "le li lo lu ma me mi mo mu na ne ni no nu ra re"
+).split()
+_VOCABULARY = len(_SYLLABLES) ** 3
+
+# the constraints ensure_exists creates on votes, dropped while loading
+# with --defer-constraints and recreated (and validated) afterwards
+_VOTE_CONSTRAINTS = {
+    "votes_pkey": "PRIMARY KEY (user_id, option_id)",
+    "votes_id_key": "UNIQUE (id)",
+    "votes_user_id_fkey": (
+        "FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE"
+    ),
+    "votes_option_id_fkey": (
+        "FOREIGN KEY (option_id) REFERENCES options (id) ON DELETE CASCADE"
+    ),
+}
+
+
+@dataclass
+class Dataset:
+    users: int
+    polls: int
+    options_per_poll: int
+    votes: int
+    zipf_s: float = 1.1
+    multiple_choice_share: float = 0.2
+    anonymous_share: float = 0.3
+    seed: int = 42
+
+    @property
+    def options(self) -> int:
+        return self.polls * self.options_per_poll
+
+
+def poll_owner(dataset: Dataset, poll_id: int) -> int:
+    return (poll_id - 1) % dataset.users + 1
+
+
+def poll_of_option(dataset: Dataset, option_id: int) -> int:
+    return (option_id - 1) // dataset.options_per_poll + 1
+
+
+def is_multiple_choice(dataset: Dataset, poll_id: int) -> bool:
+    return _unit(dataset.seed, poll_id, 1) < dataset.multiple_choice_share
+
+
+def is_anonymous(dataset: Dataset, poll_id: int) -> bool:
+    return _unit(dataset.seed, poll_id, 2) < dataset.anonymous_share
+
+
+def poll_name(dataset: Dataset, poll_id: int) -> str:
+    # three words from a skewed vocabulary, so searches for common words
+    # match many polls and rare words only a few
+    return " ".join(
+        _word(int(_unit(dataset.seed, poll_id, 10 + i) ** 3 * _VOCABULARY))
+        for i in range(3)
+    )
+
+
+def poll_creation_date(dataset: Dataset, poll_id: int) -> datetime:
+    return _BASE_DATE + timedelta(minutes=poll_id - 1)
+
+
+class VotePlan:
+    # votes per poll follow a Zipf law over a seeded ranking of the polls,
+    # capped by how many distinct votes a poll can hold; first_ids are the
+    # prefix sums, so every poll knows its vote ids without coordination
+    def __init__(self, dataset: Dataset) -> None:
+        self.dataset = dataset
+        polls = dataset.polls
+        self.ranks = _affine_permutation(polls, dataset.seed)
+        harmonic = sum(
+            1 / rank**dataset.zipf_s for rank in range(1, polls + 1)
+        )
+        self.counts = array("q", bytes(8 * polls))
+        capacities = array("q", bytes(8 * polls))
+        total = 0
+        for index in range(polls):
+            capacity = self._capacity(index + 1)
+            weight = 1 / self.ranks[index] ** dataset.zipf_s
+            count = min(capacity, int(dataset.votes * weight / harmonic))
+            self.counts[index] = count
+            capacities[index] = capacity
+            total += count
+
+        # hand out what rounding and the caps left over, most popular first
+        by_rank = sorted(range(polls), key=lambda index: self.ranks[index])
+        while total < dataset.votes:
+            open_polls = [
+                index
+                for index in by_rank
+                if self.counts[index] < capacities[index]
+            ]
+            if len(open_polls) == 0:
+                raise ValueError(
+                    f"{dataset.votes} votes do not fit into {polls} polls "
+                    f"with {dataset.users} users"
+                )
+            share = max(1, (dataset.votes - total) // len(open_polls))
+            for index in open_polls:
+                extra = min(
+                    share,
+                    capacities[index] - self.counts[index],
+                    dataset.votes - total,
+                )
+                self.counts[index] += extra
+                total += extra
+
+        self.first_ids = array("q", bytes(8 * polls))
+        next_id = 1
+        for index in range(polls):
+            self.first_ids[index] = next_id
+            next_id += self.counts[index]
+
+    def count(self, poll_id: int) -> int:
+        return self.counts[poll_id - 1]
+
+    def shard_of(self, poll_id: int, shards: int) -> int:
+        # dealing polls out by rank keeps the heavy head spread evenly
+        return (self.ranks[poll_id - 1] - 1) % shards
+
+    def _capacity(self, poll_id: int) -> int:
+        if is_multiple_choice(self.dataset, poll_id):
+            return self.dataset.users * self.dataset.options_per_poll
+        return self.dataset.users
+
+
+def user_rows(
+    dataset: Dataset, start: int, stop: int
+) -> Iterator[tuple[int, str, str]]:
+    for user_id in range(start, stop):
+        yield user_id, f"user{user_id}", "hashpassword"
+
+
+def poll_rows(
+    dataset: Dataset, start: int, stop: int
+) -> Iterator[tuple[int, str, str, int, datetime, bool, bool]]:
+    for poll_id in range(start, stop):
+        yield (
+            poll_id,
+            poll_name(dataset, poll_id),
+            f"tag{poll_id}",
+            poll_owner(dataset, poll_id),
+            poll_creation_date(dataset, poll_id),
+            is_anonymous(dataset, poll_id),
+            is_multiple_choice(dataset, poll_id),
+        )
+
+
+def option_rows(
+    dataset: Dataset, start: int, stop: int
+) -> Iterator[tuple[int, str, int]]:
+    per_poll = dataset.options_per_poll
+    for poll_id in range(start, stop):
+        first = (poll_id - 1) * per_poll + 1
+        for k in range(per_poll):
+            yield first + k, f"option {k}", poll_id
+
+
+def vote_rows(
+    dataset: Dataset, plan: VotePlan, shard: int, shards: int
+) -> Iterator[tuple[int, int, int, datetime]]:
+    per_poll = dataset.options_per_poll
+    for poll_id in range(1, dataset.polls + 1):
+        count = plan.count(poll_id)
+        if count == 0 or plan.shard_of(poll_id, shards) != shard:
+            continue
+        rng = random.Random(dataset.seed * 1_000_003 + poll_id)
+        first_option = (poll_id - 1) * per_poll + 1
+        vote_id = plan.first_ids[poll_id - 1]
+        created = poll_creation_date(dataset, poll_id)
+        multiple_choice = is_multiple_choice(dataset, poll_id)
+        # walking an affine permutation of the users (or of all user and
+        # option pairs) gives distinct primary keys without remembering any
+        space = dataset.users * (per_poll if multiple_choice else 1)
+        step = _coprime(rng, space)
+        offset = rng.randrange(space)
+        for k in range(count):
+            slot = (step * k + offset) % space
+            if multiple_choice:
+                user_id, option = divmod(slot, per_poll)
+            else:
+                user_id = slot
+                option = int(per_poll * rng.random() ** 2)
+            delay = int(_VOTE_WINDOW_S * rng.random() ** 3)
+            yield (
+                vote_id + k,
+                user_id + 1,
+                first_option + option,
+                created + timedelta(seconds=delay),
+            )
+
+
+def connect(dbname: str) -> psycopg2.extensions.connection:
+    return psycopg2.connect(
+        user=DB_USER,
+        password=DB_PASSWORD,
+        host=DB_HOST,
+        port=DB_PORT,
+        dbname=dbname,
+    )
+
+
+def load_postgres(
+    dbname: str, dataset: Dataset, workers: int, defer_constraints: bool
+) -> None:
+    connection = connect(dbname)
+    cur = connection.cursor()
+    ensure_exists(cur)
+    cur.execute(
+        "TRUNCATE votes, options, polls, users RESTART IDENTITY CASCADE;"
+    )
+    connection.commit()
+
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(workers) as pool:
+        for table, total in (
+            ("users", dataset.users),
+            ("polls", dataset.polls),
+            ("options", dataset.polls),
+        ):
+            _timed(
+                table,
+                pool.starmap,
+                _copy_range,
+                [
+                    (dbname, dataset, table, start, stop)
+                    for start, stop in _ranges(total, workers)
+                ],
+            )
+
+        # one aggregate afterwards instead of trigger calls per vote
+        cur.execute("ALTER TABLE votes DISABLE TRIGGER USER;")
+        connection.commit()
+        if defer_constraints:
+            for name in _VOTE_CONSTRAINTS:
+                cur.execute(
+                    f"ALTER TABLE votes DROP CONSTRAINT IF EXISTS {name};"
+                )
+            connection.commit()
+        _timed(
+            "votes",
+            pool.starmap,
+            _copy_votes,
+            [(dbname, dataset, shard, workers) for shard in range(workers)],
+        )
+
+    if defer_constraints:
+        _timed(
+            "votes constraints",
+            cur.execute,
+            "ALTER TABLE votes "
+            + ", ".join(
+                f"ADD CONSTRAINT {name} {definition}"
+                for name, definition in _VOTE_CONSTRAINTS.items()
+            )
+            + ";",
+        )
+    cur.execute("ALTER TABLE votes ENABLE TRIGGER USER;")
+    _timed("vote totals", rebuild_vote_totals, cur)
+    for table in ("users", "polls", "options", "votes"):
+        cur.execute(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+            f"(SELECT coalesce(max(id), 0) + 1 FROM {table}), false);"
+        )
+    connection.commit()
+    connection.autocommit = True
+    _timed(
+        "analyze",
+        cur.execute,
+        "ANALYZE users, polls, options, votes, poll_vote_totals, "
+        "vote_rollups;",
+    )
+    connection.close()
+
+
+def load_in_memory(
+    dataset: Dataset,
+    user_repository: InMemoryUserRepository,
+    poll_repository: InMemoryPollRepository,
+    vote_repository: InMemoryVoteRepository,
+) -> None:
+    user_repository.load(
+        UserEntity(id=user_id, name=name, password_hash=password_hash)
+        for user_id, name, password_hash in user_rows(
+            dataset, 1, dataset.users + 1
+        )
+    )
+    options = option_rows(dataset, 1, dataset.polls + 1)
+    poll_repository.load(
+        PollEntity(
+            id=poll_id,
+            name=name,
+            tag=tag,
+            user_id=user_id,
+            creation_date=creation_date,
+            anonymous_voting=anonymous_voting,
+            multiple_choice=multiple_choice,
+            options=[
+                OptionEntity(id=option_id, poll_id=poll_id, text=text)
+                for option_id, text, _ in (
+                    next(options) for _ in range(dataset.options_per_poll)
+                )
+            ],
+        )
+        for (
+            poll_id,
+            name,
+            tag,
+            user_id,
+            creation_date,
+            anonymous_voting,
+            multiple_choice,
+        ) in poll_rows(dataset, 1, dataset.polls + 1)
+    )
+    vote_repository.load(
+        VoteEntity(
+            id=vote_id, user_id=user_id, option_id=option_id, vote_date=date
+        )
+        for vote_id, user_id, option_id, date in vote_rows(
+            dataset, VotePlan(dataset), 0, 1
+        )
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Generate a seeded, skewed dataset and bulk load it"
+    )
+    parser.add_argument("--target", choices=["postgres", "memory"])
+    parser.add_argument("--dbname", default=DB_NAME)
+    parser.add_argument("--journal-dir")
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--polls", type=int, default=100_000)
+    parser.add_argument("--options-per-poll", type=int, default=4)
+    parser.add_argument("--votes", type=int, default=10_000_000)
+    parser.add_argument("--zipf-s", type=float, default=1.1)
+    parser.add_argument("--multiple-choice-share", type=float, default=0.2)
+    parser.add_argument("--anonymous-share", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--defer-constraints", action="store_true")
+    parser.set_defaults(target="postgres")
+    args = parser.parse_args()
+
+    dataset = Dataset(
+        users=args.users,
+        polls=args.polls,
+        options_per_poll=args.options_per_poll,
+        votes=args.votes,
+        zipf_s=args.zipf_s,
+        multiple_choice_share=args.multiple_choice_share,
+        anonymous_share=args.anonymous_share,
+        seed=args.seed,
+    )
+    start = time.perf_counter()
+    if args.target == "postgres":
+        load_postgres(
+            args.dbname, dataset, args.workers, args.defer_constraints
+        )
+    else:
+        journals = [
+            (
+                None
+                if args.journal_dir is None
+                else Journal(os.path.join(args.journal_dir, name))
+            )
+            for name in ("users", "polls", "votes")
+        ]
+        user_repository = InMemoryUserRepository(journal=journals[0])
+        poll_repository = InMemoryPollRepository(
+            user_repository, journal=journals[1]
+        )
+        vote_repository = InMemoryVoteRepository(
+            user_repository, poll_repository, journal=journals[2]
+        )
+        load_in_memory(
+            dataset, user_repository, poll_repository, vote_repository
+        )
+        for journal in journals:
+            if journal is not None:
+                journal.close()
+    print(
+        f"loaded {dataset.users:,} users, {dataset.polls:,} polls, "
+        f"{dataset.options:,} options, {dataset.votes:,} votes "
+        f"in {time.perf_counter() - start:.1f}s"
+    )
+
+
+def _copy_range(
+    dbname: str, dataset: Dataset, table: str, start: int, stop: int
+) -> None:
+    if table == "users":
+        target = "users (id, name, password_hash)"
+        rows = user_rows(dataset, start, stop)
+    elif table == "polls":
+        target = (
+            "polls (id, name, tag, user_id, creation_date, "
+            "anonymous_voting, multiple_choice)"
+        )
+        rows = poll_rows(dataset, start, stop)
+    else:
+        target = "options (id, text, poll_id)"
+        rows = option_rows(dataset, start, stop)
+    _copy(dbname, target, rows)
+
+
+def _copy_votes(dbname: str, dataset: Dataset, shard: int, shards: int):
+    _copy(
+        dbname,
+        "votes (id, user_id, option_id, vote_date)",
+        vote_rows(dataset, VotePlan(dataset), shard, shards),
+    )
+
+
+def _copy(dbname: str, target: str, rows) -> None:
+    connection = connect(dbname)
+    cur = connection.cursor()
+    cur.execute("SET synchronous_commit = off;")
+    buffer = io.StringIO()
+    count = 0
+    for row in rows:
+        buffer.write("\t".join(map(_format, row)))
+        buffer.write("\n")
+        count += 1
+        if count == _COPY_CHUNK_ROWS:
+            _flush_copy(cur, target, buffer)
+            buffer = io.StringIO()
+            count = 0
+    if count > 0:
+        _flush_copy(cur, target, buffer)
+    connection.commit()
+    connection.close()
+
+
+def _flush_copy(cur, target: str, buffer: io.StringIO) -> None:
+    buffer.seek(0)
+    cur.copy_expert(f"COPY {target} FROM STDIN", buffer)
+
+
+def _format(value) -> str:
+    if value is True:
+        return "t"
+    if value is False:
+        return "f"
+    return str(value)
+
+
+def _timed(label: str, function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    print(f"{label}: {time.perf_counter() - start:.1f}s")
+    return result
+
+
+def _ranges(total: int, parts: int) -> list[tuple[int, int]]:
+    size = math.ceil(total / max(1, parts))
+    return [
+        (start, min(start + size, total + 1))
+        for start in range(1, total + 1, max(1, size))
+    ]
+
+
+def _affine_permutation(size: int, seed: int) -> array:
+    # maps 1..size onto a shuffled 1..size without materialising a shuffle
+    rng = random.Random(seed)
+    step = _coprime(rng, size)
+    offset = rng.randrange(size)
+    return array(
+        "q", ((step * index + offset) % size + 1 for index in range(size))
+    )
+
+
+def _coprime(rng: random.Random, size: int) -> int:
+    if size <= 2:
+        return 1
+    while True:
+        step = rng.randrange(1, size)
+        if math.gcd(step, size) == 1:
+            return step
+
+
+def _word(index: int) -> str:
+    syllables = list()
+    for _ in range(3):
+        index, syllable = divmod(index, len(_SYLLABLES))
+        syllables.append(_SYLLABLES[syllable])
+    return "".join(syllables)
+
+
+def _unit(seed: int, key: int, salt: int) -> float:
+    # splitmix64, a cheap stateless hash for per-row coin flips
+    z = (seed * 0x9E3779B97F4A7C15 + key * 0xBF58476D1CE4E5B9 + salt) & _MASK64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return ((z ^ (z >> 31)) >> 11) / (1 << 53)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import math
+
+
+class LatencyHistogram:
+    # log-linear buckets like HdrHistogram: every power of two is split into
+    # 2 ** precision_bits linear sub-buckets, so the relative error of any
+    # recorded value stays below 2 ** -precision_bits
+    def __init__(self, precision_bits: int = 7) -> None:
+        self.precision_bits = precision_bits
+        self.counts: dict[int, int] = dict()
+        self.total = 0
+        self.min_ns = math.inf
+        self.max_ns = 0
+
+    def record(self, value_ns: int) -> None:
+        value_ns = max(0, int(value_ns))
+        index = self._index(value_ns)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.total += 1
+        self.min_ns = min(self.min_ns, value_ns)
+        self.max_ns = max(self.max_ns, value_ns)
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total += other.total
+        self.min_ns = min(self.min_ns, other.min_ns)
+        self.max_ns = max(self.max_ns, other.max_ns)
+
+    def percentile(self, q: float) -> int:
+        if self.total == 0:
+            return 0
+        rank = max(1, math.ceil(q * self.total))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self._upper_bound(index), self.max_ns)
+        return self.max_ns
+
+    def to_dict(self) -> dict:
+        return {
+            "precision_bits": self.precision_bits,
+            "total": self.total,
+            "min_ns": 0 if self.total == 0 else self.min_ns,
+            "max_ns": self.max_ns,
+            "buckets": [
+                [self._upper_bound(index), self.counts[index]]
+                for index in sorted(self.counts)
+            ],
+        }
+
+    def _index(self, value: int) -> int:
+        sub_buckets = 1 << self.precision_bits
+        if value < sub_buckets:
+            return value
+        exponent = value.bit_length() - self.precision_bits - 1
+        return (exponent + 1) * sub_buckets + (value >> exponent) - sub_buckets
+
+    def _upper_bound(self, index: int) -> int:
+        sub_buckets = 1 << self.precision_bits
+        if index < sub_buckets:
+            return index
+        exponent = index // sub_buckets - 1
+        mantissa = index % sub_buckets + sub_buckets
+        return ((mantissa + 1) << exponent) - 1
@@ -0,0 +1,347 @@
+import argparse
+import asyncio
+import importlib
+import json
+import random
+import sys
+import time
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from typing import Any
+
+import httpx
+
+from .histogram import LatencyHistogram
+from .reporting import write_results, find_regressions
+
+
+@dataclass
+class Step:
+    name: str
+    method: str
+    path: str
+    weight: float = 1.0
+    json: Any = None
+
+
+@dataclass
+class StepStats:
+    histogram: LatencyHistogram = field(default_factory=LatencyHistogram)
+    statuses: dict[int, int] = field(default_factory=dict)
+    exceptions: int = 0
+
+    @property
+    def requests(self) -> int:
+        return sum(self.statuses.values()) + self.exceptions
+
+    def server_errors(self) -> int:
+        return self.exceptions + sum(
+            count for code, count in self.statuses.items() if code >= 500
+        )
+
+    def client_errors(self) -> int:
+        return sum(
+            count for code, count in self.statuses.items() if 400 <= code < 500
+        )
+
+
+# writes sign in as the users datagen loads, whose password is stored as
+# "hashpassword", and vote for options laid out --options-per-poll to a
+# poll as datagen lays them out
+_CREDENTIALS = {"user_id": "{user_id}", "password": "hashpassword"}
+DEFAULT_WORKLOAD = [
+    Step(
+        "signup",
+        "POST",
+        "/users",
+        1,
+        {"name": "loadgen{seq}", "password": "password"},
+    ),
+    Step("get_user", "GET", "/users/{user_id}", 4),
+    Step("list_users", "GET", "/users", 0.2),
+    Step("get_poll", "GET", "/polls/{poll_id}", 6),
+    Step("get_poll_results", "GET", "/polls/{poll_id}/results", 4),
+    Step(
+        "create_poll",
+        "POST",
+        "/polls",
+        0.5,
+        _CREDENTIALS
+        | {
+            "name": "loadgen {seq}",
+            "tag": "loadgen{seq}",
+            "options": ["yes", "no"],
+        },
+    ),
+    Step(
+        "vote",
+        "POST",
+        "/polls/{poll_id}/votes",
+        2,
+        _CREDENTIALS | {"option_id": "{option_id}"},
+    ),
+    Step(
+        "retract_vote",
+        "DELETE",
+        "/polls/{poll_id}/votes/{option_id}",
+        1,
+        _CREDENTIALS,
+    ),
+]
+
+
+class LoadGenerator:
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        workload: list[Step],
+        id_range: int,
+        seed: int,
+        max_in_flight: int,
+        options_per_poll: int = 4,
+    ) -> None:
+        self.client = client
+        self.workload = workload
+        self.weights = [step.weight for step in workload]
+        self.id_range = id_range
+        self.options_per_poll = options_per_poll
+        self.rng = random.Random(seed)
+        self.max_in_flight = max_in_flight
+        self.stats = {step.name: StepStats() for step in workload}
+        self.dropped = 0
+        self._seq = 0
+        self._in_flight: set[asyncio.Task] = set()
+
+    async def run_open_loop(self, rate: float, duration: float) -> float:
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        intended = start
+        while intended < start + duration:
+            delay = intended - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if len(self._in_flight) >= self.max_in_flight:
+                self.dropped += 1
+            else:
+                self._spawn(intended)
+            intended += self.rng.expovariate(rate)
+        await asyncio.gather(*self._in_flight)
+        return loop.time() - start
+
+    async def run_closed_loop(
+        self, concurrency: int, duration: float
+    ) -> float:
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+
+        async def worker() -> None:
+            while loop.time() < start + duration:
+                await self._send(self._choose(), loop.time())
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return loop.time() - start
+
+    def _spawn(self, intended: float) -> None:
+        task = asyncio.create_task(self._send(self._choose(), intended))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+
+    def _choose(self) -> Step:
+        return self.rng.choices(self.workload, weights=self.weights)[0]
+
+    async def _send(self, step: Step, intended: float) -> None:
+        # latency is measured from the intended start, so a stalled server
+        # shows up as queueing delay instead of being hidden
+        stats = self.stats[step.name]
+        self._seq += 1
+        poll_id = self.rng.randint(1, self.id_range)
+        values = {
+            "seq": self._seq,
+            "user_id": self.rng.randint(0, self.id_range),
+            "poll_id": poll_id,
+            "option_id": (poll_id - 1) * self.options_per_poll
+            + self.rng.randint(1, self.options_per_poll),
+        }
+        try:
+            response = await self.client.request(
+                step.method,
+                step.path.format(**values),
+                json=_render(step.json, values),
+            )
+            stats.statuses[response.status_code] = (
+                stats.statuses.get(response.status_code, 0) + 1
+            )
+        except httpx.HTTPError:
+            stats.exceptions += 1
+        loop = asyncio.get_running_loop()
+        stats.histogram.record((loop.time() - intended) * 1e9)
+
+
+def summarize_step(stats: StepStats, elapsed: float) -> dict:
+    histogram = stats.histogram
+    requests = max(1, stats.requests)
+    return {
+        "requests": stats.requests,
+        "ops_per_s": stats.requests / elapsed,
+        "error_rate": stats.server_errors() / requests,
+        "client_error_rate": stats.client_errors() / requests,
+        "statuses": {str(code): n for code, n in stats.statuses.items()},
+        "p50_ms": histogram.percentile(0.50) / 1e6,
+        "p90_ms": histogram.percentile(0.90) / 1e6,
+        "p95_ms": histogram.percentile(0.95) / 1e6,
+        "p99_ms": histogram.percentile(0.99) / 1e6,
+        "p999_ms": histogram.percentile(0.999) / 1e6,
+        "max_ms": histogram.max_ns / 1e6,
+        "histogram": histogram.to_dict(),
+    }
+
+
+def summarize_run(generator: LoadGenerator, elapsed: float) -> dict:
+    results = {
+        name: summarize_step(stats, elapsed)
+        for name, stats in generator.stats.items()
+        if stats.requests > 0
+    }
+    total = StepStats()
+    for stats in generator.stats.values():
+        total.histogram.merge(stats.histogram)
+        total.exceptions += stats.exceptions
+        for code, count in stats.statuses.items():
+            total.statuses[code] = total.statuses.get(code, 0) + count
+    results["total"] = summarize_step(total, elapsed)
+    results["total"]["dropped"] = generator.dropped
+    return results
+
+
+def print_run(label: str, results: dict) -> None:
+    print(f"== {label}")
+    print(
+        f"{'endpoint':<20} {'req/s':>9} {'err %':>7} {'4xx %':>7} "
+        f"{'p50 ms':>9} {'p99 ms':>9} {'p99.9 ms':>9} {'max ms':>9}"
+    )
+    for name, result in results.items():
+        print(
+            f"{name:<20} {result['ops_per_s']:>9,.0f} "
+            f"{result['error_rate']:>7.2%} "
+            f"{result['client_error_rate']:>7.2%} "
+            f"{result['p50_ms']:>9.2f} {result['p99_ms']:>9.2f} "
+            f"{result['p999_ms']:>9.2f} {result['max_ms']:>9.2f}"
+        )
+
+
+def load_workload(path: str | None) -> list[Step]:
+    if path is None:
+        return DEFAULT_WORKLOAD
+    with open(path) as file:
+        return [Step(**step) for step in json.load(file)]
+
+
+def load_app(target: str) -> Any:
+    module_name, _, attribute = target.partition(":")
+    return getattr(importlib.import_module(module_name), attribute or "app")
+
+
+async def run(args: argparse.Namespace) -> dict:
+    workload = load_workload(args.workload)
+    app = None
+    if args.url is None:
+        app = load_app(args.app)
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        base_url = "http://loadgen"
+    else:
+        transport = httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(max_connections=args.max_connections)
+        )
+        base_url = args.url
+
+    results = dict()
+    async with httpx.AsyncClient(
+        transport=transport, base_url=base_url, timeout=args.timeout
+    ) as client:
+        # the ASGI transport does not send lifespan events by itself
+        lifespan = (
+            app.router.lifespan_context(app)
+            if app is not None and hasattr(app, "router")
+            else nullcontext()
+        )
+        async with lifespan:
+            for level in args.levels:
+                generator = LoadGenerator(
+                    client,
+                    workload,
+                    id_range=args.id_range,
+                    seed=args.seed,
+                    max_in_flight=args.max_in_flight,
+                    options_per_poll=args.options_per_poll,
+                )
+                if args.concurrency:
+                    label = f"concurrency={level:g}"
+                    elapsed = await generator.run_closed_loop(
+                        int(level), args.duration
+                    )
+                else:
+                    label = f"rate={level:g}"
+                    elapsed = await generator.run_open_loop(
+                        level, args.duration
+                    )
+                run_results = summarize_run(generator, elapsed)
+                print_run(label, run_results)
+                for name, result in run_results.items():
+                    results[f"{label}/{name}"] = result
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Drive the API with a mixed workload and report latency"
+    )
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--app", default="src.main:app")
+    target.add_argument("--url")
+    parser.add_argument("--workload")
+    parser.add_argument(
+        "--levels",
+        type=lambda s: [float(level) for level in s.split(",")],
+        default=[100.0],
+        help="arrival rates in req/s, or worker counts with --concurrency",
+    )
+    parser.add_argument("--concurrency", action="store_true")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--id-range", type=int, default=1_000)
+    parser.add_argument("--options-per-poll", type=int, default=4)
+    parser.add_argument("--max-in-flight", type=int, default=10_000)
+    parser.add_argument("--max-connections", type=int, default=1_000)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="loadgen.json")
+    parser.add_argument("--baseline")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    args = parser.parse_args()
+
+    started = time.time()
+    results = asyncio.run(run(args))
+    write_results(args.output, results, {**vars(args), "started": started})
+    if args.baseline is not None:
+        regressions = find_regressions(results, args.baseline, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if len(regressions) > 0:
+            sys.exit(1)
+
+
+def _render(template: Any, values: dict[str, Any]) -> Any:
+    if isinstance(template, str):
+        # a lone placeholder keeps its value's type, so ids stay numbers
+        name = template[1:-1]
+        if template == f"{{{name}}}" and name in values:
+            return values[name]
+        return template.format(**values)
+    if isinstance(template, dict):
+        return {key: _render(value, values) for key, value in template.items()}
+    if isinstance(template, list):
+        return [_render(value, values) for value in template]
+    return template
+
+
+if __name__ == "__main__":
+    main()
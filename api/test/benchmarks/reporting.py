@@ -0,0 +1,89 @@
+import json
+import platform
+import subprocess
+from datetime import datetime, timezone
+from typing import Any
+
+
+def summarize(latencies_ns: list[int], elapsed_s: float) -> dict[str, float]:
+    ordered = sorted(latencies_ns)
+    return {
+        "count": len(ordered),
+        "ops_per_s": len(ordered) / elapsed_s if elapsed_s > 0 else 0.0,
+        "p50_ms": _percentile(ordered, 0.50) / 1e6,
+        "p95_ms": _percentile(ordered, 0.95) / 1e6,
+        "p99_ms": _percentile(ordered, 0.99) / 1e6,
+        "max_ms": (ordered[-1] if ordered else 0) / 1e6,
+    }
+
+
+def write_results(
+    path: str, results: dict[str, dict], parameters: dict[str, Any]
+) -> None:
+    document = {
+        "created": datetime.now(tz=timezone.utc).isoformat(),
+        "commit": _current_commit(),
+        "python": platform.python_version(),
+        "parameters": parameters,
+        "results": results,
+    }
+    with open(path, "w") as file:
+        json.dump(document, file, indent=2, sort_keys=True)
+
+
+def find_regressions(
+    results: dict[str, dict], baseline_path: str, threshold: float
+) -> list[str]:
+    with open(baseline_path) as file:
+        baseline = json.load(file)["results"]
+
+    regressions = list()
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None or "error" in current or "error" in previous:
+            continue
+        if current["ops_per_s"] < previous["ops_per_s"] * (1 - threshold):
+            regressions.append(
+                f"{name}: {previous['ops_per_s']:,.0f} -> "
+                f"{current['ops_per_s']:,.0f} ops/s"
+            )
+        if current["p95_ms"] > previous["p95_ms"] * (1 + threshold):
+            regressions.append(
+                f"{name}: p95 {previous['p95_ms']:.3f} -> "
+                f"{current['p95_ms']:.3f} ms"
+            )
+    return regressions
+
+
+def print_table(results: dict[str, dict]) -> None:
+    print(
+        f"{'case':<44} {'ops/s':>10} {'p50 ms':>9} {'p95 ms':>9} "
+        f"{'p99 ms':>9}"
+    )
+    for name, result in results.items():
+        if "error" in result:
+            print(f"{name:<44} error: {result['error']}")
+            continue
+        print(
+            f"{name:<44} {result['ops_per_s']:>10,.0f} "
+            f"{result['p50_ms']:>9.3f} {result['p95_ms']:>9.3f} "
+            f"{result['p99_ms']:>9.3f}"
+        )
+
+
+def _percentile(ordered: list[int], q: float) -> float:
+    if len(ordered) == 0:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _current_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -0,0 +1,204 @@
+import os
+import uuid
+
+import psycopg2
+from fastapi import status
+from fastapi.testclient import TestClient
+from pytest import fixture
+
+from src import configuration, main
+from src.dal.init_db import rebuild_vote_totals
+
+
+@fixture(scope="module")
+def client() -> TestClient:
+    # the app connects with only a database and user name, libpq takes
+    # the rest from the environment
+    os.environ.setdefault("PGHOST", configuration.DB_HOST)
+    os.environ.setdefault("PGPORT", configuration.DB_PORT)
+    if configuration.DB_PASSWORD is not None:
+        os.environ.setdefault("PGPASSWORD", configuration.DB_PASSWORD)
+    connection = psycopg2.connect(dbname="postgres", user=configuration.DB_USER)
+    connection.autocommit = True
+    with connection.cursor() as cur:
+        cur.execute(
+            "SELECT 1 FROM pg_database WHERE datname = %s;",
+            (configuration.DB_NAME,),
+        )
+        if cur.fetchone() is None:
+            cur.execute(f'CREATE DATABASE "{configuration.DB_NAME}";')
+    connection.close()
+
+    with TestClient(main.app) as client:
+        yield client
+
+
+def _create_user(client: TestClient) -> dict:
+    credentials = {"name": f"u{uuid.uuid4().hex[:12]}", "password": "secret"}
+    response = client.post("/users", json=credentials)
+    assert response.status_code == status.HTTP_201_CREATED
+    return {"user_id": response.json()["id"], "password": "secret"}
+
+
+def test_signed_up_user_creates_poll_and_votes(client: TestClient):
+    # Arrange
+    credentials = _create_user(client)
+
+    # Act
+    created = client.post(
+        "/polls",
+        json=credentials
+        | {"name": "Lunch", "tag": "lunch", "options": ["pizza", "soup"]},
+    )
+    poll = created.json()
+    voted = client.post(
+        f"/polls/{poll['id']}/votes",
+        json=credentials | {"option_id": poll["options"][0]["id"]},
+    )
+    results = client.get(f"/polls/{poll['id']}/results")
+
+    # Assert
+    assert created.status_code == status.HTTP_201_CREATED
+    assert voted.status_code == status.HTTP_204_NO_CONTENT
+    assert results.json()["total_votes"] == 1
+
+
+def test_requests_after_a_constraint_violation_still_succeed(
+    client: TestClient,
+):
+    # Arrange
+    credentials = _create_user(client)
+    poll_json = credentials | {
+        "name": "Colours",
+        "tag": "colours",
+        "multiple_choice": True,
+        "options": ["red", "blue"],
+    }
+    poll = client.post("/polls", json=poll_json).json()
+    vote_json = credentials | {"option_id": poll["options"][0]["id"]}
+    client.post(f"/polls/{poll['id']}/votes", json=vote_json)
+
+    # Act
+    duplicate_poll = client.post("/polls", json=poll_json)
+    repeated_vote = client.post(f"/polls/{poll['id']}/votes", json=vote_json)
+    results = client.get(f"/polls/{poll['id']}/results")
+
+    # Assert
+    assert duplicate_poll.status_code == status.HTTP_409_CONFLICT
+    assert repeated_vote.status_code == status.HTTP_403_FORBIDDEN
+    assert results.status_code == status.HTTP_200_OK
+    assert results.json()["total_votes"] == 1
+
+
+def test_vote_changes_carry_votes_cast_and_retracted(client: TestClient):
+    # Arrange
+    credentials = _create_user(client)
+    poll = client.post(
+        "/polls",
+        json=credentials
+        | {"name": "Drinks", "tag": "drinks", "options": ["tea", "coffee"]},
+    ).json()
+    option_id = poll["options"][0]["id"]
+    vote_repository = main.poll_service.vote_repository
+    position, _ = main.db_executor.submit(
+        vote_repository.get_vote_changes, None
+    ).result()
+
+    # Act
+    vote_json = credentials | {"option_id": option_id}
+    client.post(f"/polls/{poll['id']}/votes", json=vote_json)
+    client.request(
+        "DELETE", f"/polls/{poll['id']}/votes/{option_id}", json=credentials
+    )
+    _, changes = main.db_executor.submit(
+        vote_repository.get_vote_changes, position
+    ).result()
+
+    # Assert
+    user_id = credentials["user_id"]
+    assert [
+        (change, poll_id, option, user)
+        for change, _, poll_id, option, user in changes
+        if user == user_id
+    ] == [
+        ("i", poll["id"], option_id, user_id),
+        ("d", poll["id"], option_id, user_id),
+    ]
+
+
+def test_vote_counts_match_a_tally_of_the_votes(client: TestClient):
+    # Arrange
+    credentials, other = _create_user(client), _create_user(client)
+    poll = client.post(
+        "/polls",
+        json=credentials
+        | {
+            "name": "Fruit",
+            "tag": "fruit",
+            "multiple_choice": True,
+            "options": ["apple", "pear", "plum"],
+        },
+    ).json()
+    apple, pear, plum = [option["id"] for option in poll["options"]]
+    votes_url = f"/polls/{poll['id']}/votes"
+    for voter, option_id in ((credentials, apple), (credentials, pear)):
+        client.post(votes_url, json=voter | {"option_id": option_id})
+    client.post(votes_url, json=other | {"option_id": apple})
+    client.request("DELETE", f"{votes_url}/{pear}", json=credentials)
+    connection = psycopg2.connect(
+        dbname=configuration.DB_NAME, user=configuration.DB_USER
+    )
+    with connection.cursor() as cur:
+        # a bulk load, which skips the counting triggers
+        cur.execute("SET session_replication_role = replica;")
+        cur.execute(
+            "INSERT INTO votes (user_id, option_id) VALUES (%s, %s);",
+            (other["user_id"], plum),
+        )
+        cur.execute("SET session_replication_role = DEFAULT;")
+        rebuild_vote_totals(cur)
+        connection.commit()
+        cur.execute(
+            "SELECT option_id, count(*) FROM votes "
+            "WHERE option_id = ANY(%s) GROUP BY option_id;",
+            ([apple, pear, plum],),
+        )
+        tally = dict(cur.fetchall())
+    connection.close()
+
+    # Act
+    results = client.get(f"/polls/{poll['id']}/results").json()
+
+    # Assert
+    counts = {option["id"]: option["votes"] for option in results["options"]}
+    assert counts == {apple: 2, pear: 0, plum: 1}
+    assert counts == {
+        option_id: tally.get(option_id, 0) for option_id in counts
+    }
+    assert results["total_votes"] == sum(tally.values())
+
+
+def test_deleted_user_takes_their_votes_along(client: TestClient):
+    # Arrange
+    owner, voter = _create_user(client), _create_user(client)
+    poll = client.post(
+        "/polls",
+        json=owner
+        | {"name": "Pets", "tag": "pets", "options": ["cat", "dog"]},
+    ).json()
+    client.post(
+        f"/polls/{poll['id']}/votes",
+        json=voter | {"option_id": poll["options"][0]["id"]},
+    )
+
+    # Act
+    deleted = client.request(
+        "DELETE",
+        f"/users/{voter['user_id']}",
+        json={"password": voter["password"]},
+    )
+    results = client.get(f"/polls/{poll['id']}/results")
+
+    # Assert
+    assert deleted.status_code == status.HTTP_204_NO_CONTENT
+    assert results.json()["total_votes"] == 0
@@ -0,0 +1,285 @@
+import asyncio
+import time
+from unittest.mock import MagicMock
+
+import pytest
+from fastapi import HTTPException
+from psycopg2.errors import QueryCanceled
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+from src.dal.exceptions import DalDeadlineExceeded
+from src.dal.repositories import TimedCursor
+from src.deadline import set_deadline, reset_deadline, record_query
+from src.view.admission import AdmissionController, AimdLimit, VegasLimit
+
+
+def _controller(**kwargs) -> AdmissionController:
+    defaults = dict(
+        limit=1, max_queue=1, default_timeout_s=1.0, max_timeout_s=5.0
+    )
+    return AdmissionController(**(defaults | kwargs))
+
+
+def test_queue_overflow_is_rejected_and_waiters_run_in_order():
+    # Arrange
+    controller = _controller(limit=1, max_queue=1)
+    order = list()
+
+    async def request(name: str, hold_s: float) -> None:
+        async with controller.admit(time.monotonic() + 1):
+            order.append(name)
+            await asyncio.sleep(hold_s)
+
+    async def scenario():
+        first = asyncio.create_task(request("first", 0.05))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(request("second", 0))
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as rejected:
+            await request("third", 0)
+        await asyncio.gather(first, second)
+        return rejected.value
+
+    # Act
+    rejected = asyncio.run(scenario())
+
+    # Assert
+    assert rejected.status_code == 503
+    assert rejected.headers["Retry-After"] == "1"
+    assert order == ["first", "second"]
+    assert controller.in_flight == 0
+
+
+def test_requests_that_cannot_finish_in_time_are_rejected_early():
+    # Arrange
+    controller = _controller(limit=1, max_queue=10)
+    controller.latency_s = 0.5
+    controller.in_flight = 1
+
+    async def scenario():
+        start = time.monotonic()
+        with pytest.raises(HTTPException):
+            async with controller.admit(time.monotonic() + 0.2):
+                pass
+        return time.monotonic() - start
+
+    # Act
+    waited = asyncio.run(scenario())
+
+    # Assert
+    assert waited < 0.1
+    assert len(controller._waiters) == 0
+
+
+def test_waiter_times_out_at_its_deadline():
+    # Arrange
+    controller = _controller(limit=1, max_queue=10)
+    controller.in_flight = 1
+
+    async def scenario():
+        async with controller.admit(time.monotonic() + 0.02):
+            pass
+
+    # Act
+    with pytest.raises(HTTPException):
+        asyncio.run(scenario())
+
+    # Assert
+    assert controller.in_flight == 1
+    assert len(controller._waiters) == 0
+
+
+def test_aimd_grows_slowly_and_backs_off_on_slow_or_failed_requests():
+    # Arrange
+    limit = AimdLimit(backoff=0.5, tolerance=2.0)
+
+    # Act
+    grown = limit.update(4, latency_s=0.01, min_latency_s=0.01, ok=True)
+    slow = limit.update(4, latency_s=0.05, min_latency_s=0.01, ok=True)
+    failed = limit.update(4, latency_s=0.01, min_latency_s=0.01, ok=False)
+
+    # Assert
+    assert grown == 4.25
+    assert slow == 2
+    assert failed == 2
+
+
+def test_vegas_keeps_the_estimated_queue_between_alpha_and_beta():
+    # Arrange
+    limit = VegasLimit(alpha=2, beta=4)
+
+    # Act
+    idle = limit.update(10, latency_s=0.01, min_latency_s=0.01, ok=True)
+    steady = limit.update(10, latency_s=0.015, min_latency_s=0.01, ok=True)
+    queued = limit.update(10, latency_s=0.04, min_latency_s=0.01, ok=True)
+
+    # Assert
+    assert (idle, steady, queued) == (11, 10, 9)
+
+
+def test_controller_limit_stays_within_bounds():
+    # Arrange
+    controller = _controller(
+        limit=2, algorithm=AimdLimit(backoff=0.1), min_limit=1, max_limit=2
+    )
+    controller.in_flight = 1
+
+    # Act
+    controller._release(0.01, ok=False)
+
+    # Assert
+    assert controller.limit == 1
+
+
+def test_one_fast_request_does_not_hold_the_limit_down():
+    # Arrange
+    controller = _controller(limit=4, algorithm=AimdLimit(), max_limit=64)
+    controller.in_flight = 201
+
+    # Act
+    controller._release(0.00003, ok=True)
+    for _ in range(200):
+        controller._release(0.005, ok=True)
+
+    # Assert
+    assert controller.min_latency_s == 0.005
+    assert controller.limit > 4
+
+
+def test_only_queries_and_database_failures_move_the_limit():
+    # Arrange
+    # a tolerance no sample exceeds, so only failures back off
+    controller = _controller(
+        limit=4, max_queue=4, algorithm=AimdLimit(backoff=0.5, tolerance=1e9)
+    )
+    deadline = time.monotonic() + 1
+
+    async def run(queried: bool, error: BaseException | None) -> None:
+        async with controller.admit(deadline):
+            if queried:
+                record_query()
+            if error is not None:
+                raise error
+
+    async def scenario() -> list[float]:
+        limits = list()
+        await run(queried=True, error=None)
+        limits.append(controller.limit)
+        await run(queried=False, error=None)
+        limits.append(controller.limit)
+        with pytest.raises(HTTPException):
+            await run(queried=True, error=HTTPException(status_code=404))
+        limits.append(controller.limit)
+        with pytest.raises(DalDeadlineExceeded):
+            await run(queried=True, error=DalDeadlineExceeded("get_poll"))
+        limits.append(controller.limit)
+        return limits
+
+    # Act
+    limits = asyncio.run(scenario())
+
+    # Assert
+    assert limits == [4.25, 4.25, 4.25 + 1 / 4.25, (4.25 + 1 / 4.25) / 2]
+    assert controller.in_flight == 0
+
+
+def test_deadline_header_is_capped():
+    # Arrange
+    controller = _controller(default_timeout_s=1.0, max_timeout_s=5.0)
+    now = time.monotonic()
+
+    # Act
+    default = controller.deadline(None) - now
+    capped = controller.deadline("60000") - now
+    invalid = controller.deadline("soon") - now
+
+    # Assert
+    assert 0.9 < default < 1.1
+    assert 4.9 < capped < 5.1
+    assert 0.9 < invalid < 1.1
+
+
+def test_cursor_sends_the_remaining_time_as_statement_timeout():
+    # Arrange
+    crs = MagicMock()
+    cursor = TimedCursor(crs)
+
+    # Act
+    token = set_deadline(time.monotonic() + 2)
+    try:
+        cursor.execute("SELECT 1")
+    finally:
+        reset_deadline(token)
+    cursor.execute("SELECT 2")
+    cursor.execute("SELECT 3")
+
+    # Assert
+    statements = [call.args[0] for call in crs.execute.call_args_list]
+    assert statements[0].startswith("SET LOCAL statement_timeout = ")
+    assert 1900 <= int(statements[0].split()[4].rstrip(";")) <= 2000
+    assert statements[1] == "SET LOCAL statement_timeout = 0; SELECT 2"
+    assert statements[2] == "SELECT 3"
+
+
+def test_cursor_forgets_the_timeout_when_the_transaction_ends():
+    # Arrange
+    crs = MagicMock()
+    cursor = TimedCursor(crs)
+    token = set_deadline(time.monotonic() + 2)
+    try:
+        cursor.execute("SELECT 1")
+    finally:
+        reset_deadline(token)
+
+    # Act
+    crs.connection.info.transaction_status = TRANSACTION_STATUS_IDLE
+    cursor.execute("SELECT 2")
+
+    # Assert
+    assert crs.execute.call_args.args[0] == "SELECT 2"
+
+
+def test_cursor_raises_deadline_exceeded():
+    # Arrange
+    crs = MagicMock()
+    crs.execute.side_effect = QueryCanceled()
+    cursor = TimedCursor(crs)
+
+    # Act
+    token = set_deadline(time.monotonic() + 1)
+    try:
+        with pytest.raises(DalDeadlineExceeded):
+            cursor.execute("SELECT pg_sleep(2)")
+    finally:
+        reset_deadline(token)
+    expired = set_deadline(time.monotonic() - 1)
+    try:
+        with pytest.raises(DalDeadlineExceeded):
+            cursor.execute("SELECT 1")
+    finally:
+        reset_deadline(expired)
+
+    # Assert
+    assert crs.connection.rollback.call_count == 2
+    assert crs.execute.call_count == 1
+
+
+def test_cursor_copy_sends_the_timeout_first_and_rolls_back_on_cancel():
+    # Arrange
+    crs = MagicMock()
+    crs.copy_expert.side_effect = QueryCanceled()
+    cursor = TimedCursor(crs)
+
+    # Act
+    token = set_deadline(time.monotonic() + 2)
+    try:
+        with pytest.raises(DalDeadlineExceeded):
+            cursor.copy_expert("COPY votes TO STDOUT", MagicMock())
+    finally:
+        reset_deadline(token)
+
+    # Assert
+    assert crs.execute.call_args.args[0].startswith(
+        "SET LOCAL statement_timeout = "
+    )
+    crs.connection.rollback.assert_called_once()
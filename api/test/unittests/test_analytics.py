@@ -0,0 +1,98 @@
+import random
+import struct
+from unittest.mock import MagicMock
+
+import numpy as np
+import pytest
+
+from src.bll.analytics import AnalyticsService, chi_square, contingency_table
+from src.bll.read_cache import ReadCache
+from src.dal import PollRepository, VoteRepository
+from src.dal.dal_entities import OptionEntity
+
+
+def test_contingency_table_pairs_every_vote_of_shared_voters():
+    # Arrange
+    rng = random.Random(5)
+    votes = {(user, rng.randrange(3)) for user in range(300)}
+    votes |= {(user, rng.randrange(3)) for user in range(0, 300, 3)}
+    other_votes = {(user, rng.randrange(4)) for user in range(150, 500)}
+    users, options = map(np.array, zip(*votes))
+    other_users, other_options = map(np.array, zip(*other_votes))
+
+    # Act
+    table, overlap, voters, other_voters = contingency_table(
+        users, options, 3, other_users, other_options, 4
+    )
+
+    # Assert
+    expected = np.zeros((3, 4), np.int64)
+    for user, option in votes:
+        for other_user, other_option in other_votes:
+            if user == other_user:
+                expected[option, other_option] += 1
+    assert table.tolist() == expected.tolist()
+    assert (overlap, voters, other_voters) == (150, 300, 350)
+
+
+def test_chi_square_matches_reference_values():
+    # Act
+    statistic, degrees_of_freedom, p_value = chi_square(
+        np.array([[10, 20, 0], [30, 40, 0]])
+    )
+    _, _, independent = chi_square(np.array([[10, 20], [20, 40]]))
+
+    # Assert
+    assert statistic == pytest.approx(0.79365, rel=1e-4)
+    assert degrees_of_freedom == 1
+    assert p_value == pytest.approx(0.37299, rel=1e-4)
+    assert independent == pytest.approx(1.0)
+
+
+def test_cross_tab_is_cached_until_a_poll_changes():
+    # Arrange
+    poll_repository = MagicMock(spec=PollRepository)
+    vote_repository = MagicMock(spec=VoteRepository)
+    poll_repository.get_options_for_poll.side_effect = lambda poll_id: [
+        OptionEntity(id=poll_id * 10 + i, poll_id=poll_id, text=str(i))
+        for i in range(2)
+    ]
+    vote_repository.get_poll_voters.side_effect = lambda poll_id: (
+        np.array([1, 2, 3]),
+        np.array([poll_id * 10, poll_id * 10 + 1, poll_id * 10 + 1]),
+    )
+    analytics = AnalyticsService(
+        poll_repository, vote_repository, read_cache=ReadCache(ttl_s=60)
+    )
+
+    # Act
+    first = analytics.get_cross_tab(1, 2)
+    cached = analytics.get_cross_tab(1, 2)
+    analytics.poll_versions.bump(2)
+    analytics.get_cross_tab(1, 2)
+
+    # Assert
+    assert first == cached
+    assert first.counts == ((1, 0), (0, 2))
+    assert first.option_ids == (10, 11)
+    assert vote_repository.get_poll_voters.call_count == 4
+
+
+def test_poll_voters_are_decoded_from_binary_copy():
+    # Arrange
+    rows = [(7, 100), (9, 101), (1 << 30, 102)]
+    data = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+    for user_id, option_id in rows:
+        data += struct.pack(">hiiii", 2, 4, user_id, 4, option_id)
+    data += struct.pack(">h", -1)
+    crs = MagicMock()
+    crs.mogrify.return_value = b"COPY ..."
+    crs.copy_expert.side_effect = lambda query, file: file.write(data)
+    vote_repository = VoteRepository(crs, MagicMock(), MagicMock())
+
+    # Act
+    users, options = vote_repository.get_poll_voters(poll_id=1)
+
+    # Assert
+    assert users.tolist() == [7, 9, 1 << 30]
+    assert options.tolist() == [100, 101, 102]
@@ -0,0 +1,157 @@
+import asyncio
+import threading
+import time
+
+from src.dal.exceptions import DalDeadlineExceeded
+from src.deadline import get_deadline, reset_deadline, set_deadline
+from src.metrics import BATCH_LOADER_BATCH_SIZE
+from src.view.batch_loader import BatchLoader
+
+
+def test_lookups_in_one_tick_share_one_load():
+    # Arrange
+    batches = list()
+
+    def load_many(keys: list[int]) -> dict[int, str]:
+        batches.append(sorted(keys))
+        return {key: f"poll {key}" for key in keys if key != 3}
+
+    loader = BatchLoader("test_tick", load_many)
+
+    async def scenario():
+        return await asyncio.gather(
+            *(loader.load(key) for key in (1, 2, 2, 3))
+        )
+
+    # Act
+    results = asyncio.run(scenario())
+
+    # Assert
+    assert results == ["poll 1", "poll 2", "poll 2", None]
+    assert batches == [[1, 2, 3]]
+    assert BATCH_LOADER_BATCH_SIZE.count(("test_tick",)) == 1
+
+
+def test_full_batches_are_sent_without_waiting():
+    # Arrange
+    batches = list()
+
+    def load_many(keys: list[int]) -> dict[int, int]:
+        batches.append(len(keys))
+        return {key: key for key in keys}
+
+    loader = BatchLoader("test_full", load_many, max_batch_size=2, window_s=5)
+
+    async def scenario():
+        return await asyncio.wait_for(
+            asyncio.gather(*(loader.load(key) for key in range(4))), 1
+        )
+
+    # Act
+    results = asyncio.run(scenario())
+
+    # Assert
+    assert results == [0, 1, 2, 3]
+    assert batches == [2, 2]
+
+
+def test_every_caller_sees_the_error_of_its_batch():
+    # Arrange
+    def load_many(keys: list[int]) -> dict[int, int]:
+        raise LookupError("database unavailable")
+
+    loader = BatchLoader("test_error", load_many)
+
+    async def scenario():
+        return await asyncio.gather(
+            loader.load(1), loader.load(2), return_exceptions=True
+        )
+
+    # Act
+    results = asyncio.run(scenario())
+
+    # Assert
+    assert all(isinstance(result, LookupError) for result in results)
+
+
+def test_cancelled_caller_does_not_cancel_the_others():
+    # Arrange
+    loader = BatchLoader(
+        "test_cancel", lambda keys: {1: "poll"}, window_s=0.01
+    )
+
+    async def scenario():
+        abandoned = asyncio.ensure_future(loader.load(1))
+        kept = asyncio.ensure_future(loader.load(1))
+        await asyncio.sleep(0)
+        abandoned.cancel()
+        return await kept
+
+    # Act
+    result = asyncio.run(scenario())
+
+    # Assert
+    assert result == "poll"
+
+
+def test_batch_runs_until_its_latest_caller_deadline():
+    # Arrange
+    seen = list()
+
+    def load_many(keys: list[int]) -> dict[int, int]:
+        seen.append(get_deadline())
+        return {key: key for key in keys}
+
+    loader = BatchLoader("test_deadline", load_many)
+
+    async def load_by(key: int, deadline: float | None) -> int:
+        token = set_deadline(deadline)
+        try:
+            return await loader.load(key)
+        finally:
+            reset_deadline(token)
+
+    async def scenario():
+        now = time.monotonic()
+        await asyncio.gather(load_by(1, now + 5), load_by(2, now + 9))
+        await asyncio.gather(load_by(1, now + 5), load_by(2, None))
+        return now
+
+    # Act
+    now = asyncio.run(scenario())
+
+    # Assert
+    assert seen == [now + 9, None]
+
+
+def test_caller_past_its_deadline_leaves_the_others_their_result():
+    # Arrange
+    release = threading.Event()
+
+    def load_many(keys: list[int]) -> dict[int, str]:
+        release.wait(1)
+        return {1: "poll"}
+
+    loader = BatchLoader("test_caller_deadline", load_many)
+
+    async def impatient() -> str:
+        token = set_deadline(time.monotonic() + 0.01)
+        try:
+            return await loader.load(1)
+        finally:
+            reset_deadline(token)
+
+    async def scenario():
+        results = asyncio.gather(
+            impatient(), loader.load(1), return_exceptions=True
+        )
+        await asyncio.sleep(0.05)
+        release.set()
+        return await results
+
+    # Act
+    timed_out, result = asyncio.run(scenario())
+
+    # Assert
+    assert isinstance(timed_out, DalDeadlineExceeded)
+    assert result == "poll"
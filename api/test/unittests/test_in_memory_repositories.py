@@ -0,0 +1,324 @@
+from datetime import datetime
+
+import pytest
+from pytest import fixture
+
+from src.bll.poll_service import PollService
+from src.dal import (
+    InMemoryUserRepository,
+    InMemoryPollRepository,
+    InMemoryVoteRepository,
+    UserEntity,
+    PollEntity,
+    VoteEntity,
+)
+from src.dal.dal_entities import OptionEntity
+from src.dal.exceptions import (
+    DalUniqueViolationException,
+    DalForeignKeyViolationException,
+    DalNotFound,
+)
+
+
+@fixture
+def user_repository() -> InMemoryUserRepository:
+    user_repository = InMemoryUserRepository()
+    user_repository.create_user(name="bob", password_hash="hashpassword")
+    user_repository.create_user(name="alice", password_hash="hashpassword")
+    return user_repository
+
+
+@fixture
+def poll_repository(
+    user_repository: InMemoryUserRepository,
+) -> InMemoryPollRepository:
+    poll_repository = InMemoryPollRepository(user_repository=user_repository)
+    poll_repository.create_poll(
+        name="Lunch",
+        tag="lunch",
+        user_id=0,
+        anonymous_voting=False,
+        multiple_choice=True,
+        options=["pizza", "sushi", "salad"],
+    )
+    return poll_repository
+
+
+@fixture
+def vote_repository(
+    user_repository: InMemoryUserRepository,
+    poll_repository: InMemoryPollRepository,
+) -> InMemoryVoteRepository:
+    return InMemoryVoteRepository(
+        user_repository=user_repository, poll_repository=poll_repository
+    )
+
+
+def test_create_poll_same_tag_raises_exception(
+    poll_repository: InMemoryPollRepository,
+):
+    # Act & Assert
+    with pytest.raises(DalUniqueViolationException):
+        poll_repository.create_poll(
+            name="Dinner",
+            tag="lunch",
+            user_id=0,
+            anonymous_voting=False,
+            multiple_choice=False,
+            options=[],
+        )
+
+
+def test_create_poll_unknown_user_raises_exception(
+    poll_repository: InMemoryPollRepository,
+):
+    # Act & Assert
+    with pytest.raises(DalForeignKeyViolationException):
+        poll_repository.create_poll(
+            name="Dinner",
+            tag="dinner",
+            user_id=100,
+            anonymous_voting=False,
+            multiple_choice=False,
+            options=[],
+        )
+
+
+def test_create_poll_duplicate_option_raises_options_violation(
+    poll_repository: InMemoryPollRepository,
+):
+    # Act & Assert
+    with pytest.raises(DalUniqueViolationException) as exc_info:
+        poll_repository.create_poll(
+            name="Dinner",
+            tag="dinner",
+            user_id=0,
+            anonymous_voting=False,
+            multiple_choice=False,
+            options=["soup", "soup"],
+        )
+    assert exc_info.value.msg.endswith("options:text:soup")
+    assert poll_repository.get_poll_by_user_and_tag(0, "dinner") is None
+
+
+def test_get_poll_by_user_and_tag_returns_poll_with_options(
+    poll_repository: InMemoryPollRepository,
+):
+    # Act
+    poll = poll_repository.get_poll_by_user_and_tag(user_id=0, tag="lunch")
+    options = poll_repository.get_options_for_poll(poll_id=poll.id)
+
+    # Assert
+    assert poll_repository.get_poll_by_id(poll.id) is poll
+    assert poll_repository.get_polls_by_user(user_id=0) == [poll]
+    assert [opt.text for opt in options] == ["pizza", "sushi", "salad"]
+    assert all(opt.poll_id == poll.id for opt in options)
+
+
+def test_create_vote_updates_indexes_and_counts(
+    poll_repository: InMemoryPollRepository,
+    vote_repository: InMemoryVoteRepository,
+):
+    # Arrange
+    poll = poll_repository.get_poll_by_user_and_tag(user_id=0, tag="lunch")
+    pizza, sushi, salad = poll_repository.get_options_for_poll(poll.id)
+
+    # Act
+    vote_repository.create_vote(option_id=pizza.id, user_id=0)
+    vote_repository.create_vote(option_id=pizza.id, user_id=1)
+    vote_repository.create_vote(option_id=sushi.id, user_id=1)
+
+    # Assert
+    assert vote_repository.get_vote_counts_by_poll(poll.id) == {
+        pizza.id: 2,
+        sushi.id: 1,
+        salad.id: 0,
+    }
+    assert len(vote_repository.get_votes_by_poll(poll.id)) == 3
+    assert len(vote_repository.get_votes_by_user(1)) == 2
+    assert [
+        vote.option_id
+        for vote in vote_repository.get_votes_by_user_poll(poll.id, 1)
+    ] == [pizza.id, sushi.id]
+
+
+def test_create_vote_twice_raises_exception(
+    poll_repository: InMemoryPollRepository,
+    vote_repository: InMemoryVoteRepository,
+):
+    # Arrange
+    option = poll_repository.get_options_for_poll(1)[0]
+    vote_repository.create_vote(option_id=option.id, user_id=0)
+
+    # Act & Assert
+    with pytest.raises(DalUniqueViolationException):
+        vote_repository.create_vote(option_id=option.id, user_id=0)
+
+
+def test_create_vote_unknown_option_raises_exception(
+    vote_repository: InMemoryVoteRepository,
+):
+    # Act & Assert
+    with pytest.raises(DalNotFound):
+        vote_repository.create_vote(option_id=100, user_id=0)
+
+
+def test_delete_vote_updates_counts(
+    poll_repository: InMemoryPollRepository,
+    vote_repository: InMemoryVoteRepository,
+):
+    # Arrange
+    option = poll_repository.get_options_for_poll(1)[0]
+    vote_repository.create_vote(option_id=option.id, user_id=0)
+    vote = vote_repository.get_votes_by_user(0)[0]
+
+    # Act
+    vote_repository.delete_vote(vote.id)
+
+    # Assert
+    assert vote_repository.get_vote_by_id(vote.id) is None
+    assert vote_repository.get_vote_counts_by_poll(1)[option.id] == 0
+    assert vote_repository.get_votes_by_poll(1) == []
+
+
+def test_delete_poll_cascades_to_options_and_votes(
+    poll_repository: InMemoryPollRepository,
+    vote_repository: InMemoryVoteRepository,
+):
+    # Arrange
+    option = poll_repository.get_options_for_poll(1)[0]
+    vote_repository.create_vote(option_id=option.id, user_id=0)
+
+    # Act
+    poll_repository.delete_poll(poll_id=1)
+
+    # Assert
+    assert poll_repository.get_poll_by_id(1) is None
+    assert poll_repository.get_option_by_id(option.id) is None
+    assert poll_repository.get_polls_by_user(user_id=0) == []
+    assert vote_repository.get_votes_by_poll(1) == []
+    assert vote_repository.get_votes_by_user(0) == []
+
+
+def test_delete_user_cascades_to_polls_and_votes(
+    user_repository: InMemoryUserRepository,
+    poll_repository: InMemoryPollRepository,
+    vote_repository: InMemoryVoteRepository,
+):
+    # Arrange
+    pizza = poll_repository.get_options_for_poll(1)[0]
+    poll_repository.create_poll(
+        name="Dinner",
+        tag="dinner",
+        user_id=1,
+        anonymous_voting=False,
+        multiple_choice=False,
+        options=["soup", "stew"],
+    )
+    soup, stew = poll_repository.get_options_for_poll(2)
+    vote_repository.create_vote(option_id=pizza.id, user_id=0)
+    vote_repository.create_vote(option_id=pizza.id, user_id=1)
+    vote_repository.create_vote(option_id=soup.id, user_id=0)
+
+    # Act
+    user_repository.delete_user(user_id=0)
+
+    # Assert
+    assert poll_repository.get_polls_by_user(user_id=0) == []
+    assert poll_repository.get_poll_by_id(1) is None
+    assert poll_repository.get_option_by_id(pizza.id) is None
+    assert vote_repository.get_votes_by_user(0) == []
+    assert vote_repository.get_votes_by_user(1) == []
+    assert vote_repository.get_vote_counts_by_poll(2) == {soup.id: 0, stew.id: 0}
+
+
+def test_vote_changes_follow_inserts_and_deletes_from_a_position(
+    poll_repository: InMemoryPollRepository,
+    vote_repository: InMemoryVoteRepository,
+):
+    # Arrange
+    pizza, sushi, _ = poll_repository.get_options_for_poll(1)
+    vote_repository.create_vote(option_id=pizza.id, user_id=0)
+    position, _ = vote_repository.get_vote_changes(since=None)
+    vote_repository.create_vote(option_id=sushi.id, user_id=1)
+    vote = vote_repository.get_votes_by_user(0)[0]
+    vote_repository.delete_vote(vote.id)
+
+    # Act
+    next_position, changes = vote_repository.get_vote_changes(since=position)
+    vote_repository.delete_vote_changes_before(datetime.max)
+    _, pruned = vote_repository.get_vote_changes(since=position)
+
+    # Assert
+    assert changes == [
+        ("i", vote.id + 1, 1, sushi.id, 1),
+        ("d", vote.id, 1, pizza.id, 0),
+    ]
+    assert next_position == position + 2
+    assert vote_repository.get_vote_changes(since=next_position) == (
+        next_position,
+        [],
+    )
+    assert pruned == []
+
+
+def test_load_bulk_rows_builds_indexes(
+    poll_repository: InMemoryPollRepository,
+    vote_repository: InMemoryVoteRepository,
+):
+    # Arrange
+    user_repository = poll_repository.user_repository
+    now = datetime(2024, 1, 1)
+
+    # Act
+    user_repository.load([UserEntity(id=7, name="carol", password_hash="h")])
+    poll_repository.load(
+        [
+            PollEntity(
+                id=5,
+                name="Dinner",
+                tag="dinner",
+                user_id=7,
+                creation_date=now,
+                anonymous_voting=True,
+                multiple_choice=False,
+                options=[
+                    OptionEntity(id=10, poll_id=5, text="soup"),
+                    OptionEntity(id=11, poll_id=5, text="stew"),
+                ],
+            )
+        ]
+    )
+    vote_repository.load(
+        [VoteEntity(id=3, user_id=7, option_id=11, vote_date=now)]
+    )
+
+    # Assert
+    assert user_repository.get_user_by_name("carol").id == 7
+    assert poll_repository.get_poll_by_user_and_tag(7, "dinner").id == 5
+    assert vote_repository.get_vote_counts_by_poll(5) == {10: 0, 11: 1}
+    assert vote_repository.get_votes_by_user_poll(5, 7)[0].id == 3
+    user_repository.create_user(name="dave", password_hash="h")
+    assert user_repository.get_user_by_name("dave").id == 8
+
+
+def test_poll_service_on_in_memory_repositories_returns_poll(
+    poll_repository: InMemoryPollRepository,
+    vote_repository: InMemoryVoteRepository,
+):
+    # Act
+    poll_service = PollService(
+        poll_repository=poll_repository, vote_repository=vote_repository
+    )
+    poll = poll_service.create_poll(
+        name="Dinner",
+        tag="dinner",
+        user_id=1,
+        anonymous_voting=True,
+        multiple_choice=False,
+        options=["soup", "steak"],
+    )
+
+    # Assert
+    assert poll_service.get_poll_by_id(poll.id) == poll
+    assert [opt.text for opt in poll.options] == ["soup", "steak"]
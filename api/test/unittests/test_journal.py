@@ -0,0 +1,191 @@
+import glob
+import os
+import threading
+
+from pytest import fixture
+
+from src.dal import (
+    Journal,
+    InMemoryUserRepository,
+    InMemoryPollRepository,
+    InMemoryVoteRepository,
+)
+
+
+@fixture
+def journal_dir(tmp_path) -> str:
+    return str(tmp_path)
+
+
+def _reopen_user_repository(journal_dir: str) -> InMemoryUserRepository:
+    return InMemoryUserRepository(
+        journal=Journal(os.path.join(journal_dir, "users"))
+    )
+
+
+def test_user_repository_reload_restores_state(journal_dir: str):
+    # Arrange
+    user_repository = _reopen_user_repository(journal_dir)
+    bob = user_repository.create_user(name="bob", password_hash="hash1")
+    alice = user_repository.create_user(name="alice", password_hash="hash2")
+    carl = user_repository.create_user(name="carl", password_hash="hash3")
+    alice.name = "alicia"
+    user_repository.update_user(alice)
+    user_repository.delete_user(carl.id)
+    user_repository._journal.close()
+
+    # Act
+    reloaded = _reopen_user_repository(journal_dir)
+
+    # Assert
+    assert reloaded.get_users() == user_repository.get_users()
+    assert reloaded.get_user_by_name("alicia").id == alice.id
+    assert reloaded.get_user_by_name("alice") is None
+    assert reloaded.get_user_by_id(carl.id) is None
+    assert reloaded.create_user(name="dave", password_hash="h").id == 3
+    assert reloaded.get_user_by_id(bob.id).password_hash == "hash1"
+
+
+def test_user_repository_snapshot_compacts_log(journal_dir: str):
+    # Arrange
+    journal = Journal(
+        os.path.join(journal_dir, "users"), snapshot_threshold=10
+    )
+    user_repository = InMemoryUserRepository(journal=journal)
+
+    # Act
+    for i in range(25):
+        user_repository.create_user(name=f"user{i}", password_hash="hash")
+    journal.close()
+    reloaded = _reopen_user_repository(journal_dir)
+
+    # Assert
+    assert journal.records_since_snapshot == 5
+    assert len(reloaded.get_users()) == 25
+
+
+def test_journal_torn_tail_is_truncated(journal_dir: str):
+    # Arrange
+    user_repository = _reopen_user_repository(journal_dir)
+    user_repository.create_user(name="bob", password_hash="hash")
+    journal = user_repository._journal
+    journal.close()
+    with open(journal.log_path, "ab") as log:
+        log.write(b"\x40\x00\x00\x00[\"put_us")
+
+    # Act
+    reloaded = _reopen_user_repository(journal_dir)
+    reloaded.create_user(name="alice", password_hash="hash")
+    reloaded._journal.close()
+
+    # Assert
+    users = _reopen_user_repository(journal_dir).get_users()
+    assert [user.name for user in users] == ["bob", "alice"]
+
+
+def test_poll_and_vote_repositories_reload_restores_state(journal_dir: str):
+    # Arrange
+    user_repository = InMemoryUserRepository()
+    user_repository.create_user(name="bob", password_hash="hash")
+    poll_journal = Journal(os.path.join(journal_dir, "polls"))
+    vote_journal = Journal(os.path.join(journal_dir, "votes"))
+    poll_repository = InMemoryPollRepository(
+        user_repository=user_repository, journal=poll_journal
+    )
+    vote_repository = InMemoryVoteRepository(
+        user_repository=user_repository,
+        poll_repository=poll_repository,
+        journal=vote_journal,
+    )
+    for tag in ("lunch", "dinner"):
+        poll_repository.create_poll(
+            name=tag,
+            tag=tag,
+            user_id=0,
+            anonymous_voting=False,
+            multiple_choice=False,
+            options=["a", "b"],
+        )
+        option = poll_repository.get_options_for_poll(
+            poll_repository.get_poll_by_user_and_tag(0, tag)
+        )[0]
+        vote_repository.create_vote(option_id=option.id, user_id=0)
+    poll_repository.delete_poll(poll_id=1)
+    poll_journal.close()
+    vote_journal.close()
+
+    # Act
+    reloaded_polls = InMemoryPollRepository(
+        user_repository=user_repository,
+        journal=Journal(os.path.join(journal_dir, "polls")),
+    )
+    reloaded_votes = InMemoryVoteRepository(
+        user_repository=user_repository,
+        poll_repository=reloaded_polls,
+        journal=Journal(os.path.join(journal_dir, "votes")),
+    )
+
+    # Assert
+    assert reloaded_polls.get_polls() == poll_repository.get_polls()
+    assert reloaded_polls.get_options_for_poll(2) == (
+        poll_repository.get_options_for_poll(2)
+    )
+    assert reloaded_votes.get_votes_by_user(0) == (
+        vote_repository.get_votes_by_user(0)
+    )
+    assert reloaded_votes.get_vote_counts_by_poll(2) == {3: 1, 4: 0}
+
+
+def test_crash_before_segments_are_removed_does_not_replay_them(
+    journal_dir: str,
+):
+    # Arrange
+    user_repository = _reopen_user_repository(journal_dir)
+    first = user_repository.create_user(name="a", password_hash="hash")
+    first.name = "b"
+    user_repository.update_user(first)
+    user_repository.create_user(name="a", password_hash="hash")
+    journal = user_repository._journal
+    journal.sync()
+    segments = {
+        path: open(path, "rb").read()
+        for path in glob.glob(os.path.join(journal.directory, "*.log"))
+    }
+
+    # Act
+    journal.write_snapshot(user_repository._snapshot_records())
+    journal.close()
+    for path, data in segments.items():
+        with open(path, "wb") as segment:
+            segment.write(data)
+    reloaded = _reopen_user_repository(journal_dir)
+
+    # Assert
+    assert reloaded.get_users() == user_repository.get_users()
+    assert [path for path in segments if os.path.exists(path)] == []
+
+
+def test_append_compacts_off_the_calling_thread(journal_dir: str):
+    # Arrange
+    journal = Journal(journal_dir, snapshot_threshold=2)
+    release = threading.Event()
+
+    def compact(records):
+        release.wait()
+        return list(records)
+
+    # Act
+    journal.append(["put", 1], compact)
+    journal.append(["put", 2], compact)
+    snapshot_written_early = os.path.exists(journal.snapshot_path)
+    journal.append(["put", 3], compact)
+    release.set()
+    journal.close()
+
+    # Assert
+    assert not snapshot_written_early
+    assert list(Journal(journal_dir).replay()) == [
+        ["put", 1],
+        ["put", 2],
+        ["put", 3],
+    ]
@@ -0,0 +1,146 @@
+from datetime import datetime
+from unittest.mock import MagicMock
+
+from src.dal import (
+    PollRepository,
+    UserRepository,
+    VoteRepository,
+    joined,
+    lazy,
+    selectin,
+)
+
+CREATED = datetime(2024, 1, 1)
+
+
+def _poll_row(poll_id: int, user_id: int = 1) -> tuple:
+    return (
+        poll_id,
+        f"poll {poll_id}",
+        f"tag{poll_id}",
+        user_id,
+        False,
+        False,
+        CREATED,
+    )
+
+
+def test_lazy_options_are_not_queried_until_read():
+    # Arrange
+    cursor = MagicMock()
+    cursor.fetchall.side_effect = [
+        [_poll_row(1)],
+        [(10, "yes", 1), (11, "no", 1)],
+    ]
+    repository = PollRepository(cursor)
+
+    # Act
+    poll = repository.get_poll_by_id(poll_id=1, load=(lazy("options"),))
+    executed_before = cursor.execute.call_count
+    texts = [option.text for option in poll.options]
+
+    # Assert
+    assert executed_before == 1
+    assert poll.options.loaded
+    assert texts == ["yes", "no"]
+    assert cursor.execute.call_count == 2
+
+
+def test_selectin_options_load_in_one_query_for_all_polls():
+    # Arrange
+    cursor = MagicMock()
+    cursor.fetchall.side_effect = [
+        [_poll_row(1), _poll_row(2), _poll_row(3)],
+        [(10, "yes", 1), (11, "no", 1), (20, "maybe", 3)],
+    ]
+    repository = PollRepository(cursor)
+
+    # Act
+    polls = repository.get_polls(
+        poll_ids=[1, 2, 3], load=(selectin("options"),)
+    )
+
+    # Assert
+    assert cursor.execute.call_count == 2
+    assert cursor.execute.call_args.args[1] == ([1, 2, 3],)
+    assert [len(poll.options) for poll in polls] == [2, 0, 1]
+    assert polls[2].options[0].text == "maybe"
+
+
+def test_joined_options_group_rows_into_polls():
+    # Arrange
+    cursor = MagicMock()
+    cursor.fetchall.return_value = [
+        _poll_row(1) + (10, "yes", None),
+        _poll_row(1) + (11, "no", None),
+        _poll_row(2) + (None, None, None),
+    ]
+    repository = PollRepository(cursor)
+
+    # Act
+    polls = repository.get_polls_by_user(user_id=1, load=(joined("options"),))
+
+    # Assert
+    assert cursor.execute.call_count == 1
+    assert [poll.id for poll in polls] == [1, 2]
+    assert [option.id for option in polls[0].options] == [10, 11]
+    assert polls[1].options == []
+
+
+def test_unloaded_relationships_stay_none():
+    # Arrange
+    cursor = MagicMock()
+    cursor.fetchall.return_value = [(1, "bob", "hashpassword")]
+    repository = UserRepository(cursor)
+
+    # Act
+    user = repository.get_user_by_id(user_id=1)
+
+    # Assert
+    assert user.created_polls is None
+    assert cursor.execute.call_count == 1
+
+
+def test_user_polls_load_nested_options():
+    # Arrange
+    cursor = MagicMock()
+    cursor.fetchall.side_effect = [
+        [(1, "bob", "hashpassword"), (2, "alice", "hashpassword")],
+        [_poll_row(5, user_id=1), _poll_row(6, user_id=2)],
+        [(50, "yes", 5), (60, "no", 6)],
+    ]
+    repository = UserRepository(cursor)
+
+    # Act
+    users = repository.get_users(
+        user_ids=[1, 2],
+        load=(selectin("created_polls"), selectin("created_polls.options")),
+    )
+
+    # Assert
+    assert cursor.execute.call_count == 3
+    assert [poll.id for poll in users[0].created_polls] == [5]
+    assert [option.id for option in users[1].created_polls[0].options] == [60]
+
+
+def test_poll_and_result_counts_read_the_same_rollups():
+    # Arrange
+    cursor = MagicMock()
+    cursor.fetchall.return_value = []
+    poll_repository = PollRepository(cursor)
+    vote_repository = VoteRepository(
+        cursor, UserRepository(cursor), poll_repository
+    )
+
+    # Act
+    poll_repository.get_polls_with_options(poll_ids=[1], with_counts=True)
+    vote_repository.get_vote_counts_by_poll(poll_id=1)
+    vote_repository.get_vote_counts_by_polls(poll_ids=[1])
+
+    # Assert
+    statements = [call.args[0] for call in cursor.execute.call_args_list]
+    assert len(statements) == 3
+    for statement in statements:
+        assert "FROM vote_rollups" in statement
+        assert "resolution = 'd'" in statement
+        assert "JOIN votes" not in statement
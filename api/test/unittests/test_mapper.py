@@ -0,0 +1,32 @@
+import json
+
+from pydantic import TypeAdapter
+
+from src.dal.dal_entities import UserEntity
+from src.mapper import to_get_user_dto, user_rows_to_json
+from src.view import GetUserDto
+
+
+def test_user_rows_to_json_matches_per_row_dtos():
+    # Arrange
+    users = [
+        UserEntity(id=1, name="bob", password_hash="hash"),
+        UserEntity(id=2, name="alïce \"a\"", password_hash="hash"),
+    ]
+
+    # Act
+    body = user_rows_to_json([(user.id, user.name) for user in users])
+
+    # Assert
+    dtos = [to_get_user_dto(user) for user in users]
+    assert body == TypeAdapter(list[GetUserDto]).dump_json(dtos)
+    assert json.loads(body) == [dto.model_dump() for dto in dtos]
+
+
+def test_user_rows_to_json_empty_list():
+    # Act
+    body = user_rows_to_json([])
+
+    # Assert
+    assert body == b"[]"
+    assert json.loads(body) == []
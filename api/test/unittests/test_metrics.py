@@ -0,0 +1,97 @@
+import threading
+from unittest.mock import MagicMock
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.dal import UserRepository
+from src.metrics import (
+    Counter,
+    Histogram,
+    DB_QUERY_SECONDS,
+    DB_QUERY_ROWS,
+    HTTP_REQUEST_SECONDS,
+    render_prometheus,
+)
+from src.view.metrics_middleware import MetricsMiddleware
+
+
+def test_counter_sums_shards_of_all_threads():
+    # Arrange
+    counter = Counter("test_counter_total", "test", ("kind",))
+
+    def work() -> None:
+        for _ in range(1000):
+            counter.inc(("a",))
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+
+    # Act
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Assert
+    assert counter.value(("a",)) == 4000
+
+
+def test_histogram_renders_cumulative_buckets():
+    # Arrange
+    histogram = Histogram(
+        "test_latency_seconds", "test", ("route",), buckets=(0.1, 1.0)
+    )
+
+    # Act
+    histogram.observe(("/a",), 0.05)
+    histogram.observe(("/a",), 0.5)
+    histogram.observe(("/a",), 5)
+    text = render_prometheus()
+
+    # Assert
+    assert "# TYPE test_latency_seconds histogram" in text
+    assert 'test_latency_seconds_bucket{route="/a",le="0.1"} 1' in text
+    assert 'test_latency_seconds_bucket{route="/a",le="1.0"} 2' in text
+    assert 'test_latency_seconds_bucket{route="/a",le="+Inf"} 3' in text
+    assert 'test_latency_seconds_count{route="/a"} 3' in text
+
+
+def test_repository_queries_are_labelled_with_method():
+    # Arrange
+    cursor = MagicMock()
+    cursor.fetchall.return_value = [(1, "bob", "hashpassword")]
+    repository = UserRepository(cursor)
+    labels = ("UserRepository.get_user_by_id", "execute")
+    executed = DB_QUERY_SECONDS.count(labels)
+    rows = DB_QUERY_ROWS.value(("UserRepository.get_user_by_id",))
+
+    # Act
+    user = repository.get_user_by_id(1)
+
+    # Assert
+    assert user.name == "bob"
+    assert DB_QUERY_SECONDS.count(labels) == executed + 1
+    assert DB_QUERY_ROWS.value(("UserRepository.get_user_by_id",)) == rows + 1
+
+
+def test_middleware_labels_requests_with_route_template():
+    # Arrange
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/things/{thing_id}")
+    async def get_thing(thing_id: int) -> int:
+        return thing_id
+
+    labels = ("GET", "/things/{thing_id}", 200)
+    before = HTTP_REQUEST_SECONDS.count(labels)
+
+    # Act
+    with TestClient(app) as client:
+        client.get("/things/1")
+        client.get("/things/2")
+        client.get("/nothing")
+
+    # Assert
+    assert HTTP_REQUEST_SECONDS.count(labels) == before + 2
+    assert HTTP_REQUEST_SECONDS.count(("GET", "unmatched", 404)) >= 1
@@ -0,0 +1,222 @@
+from fastapi import status
+from fastapi.testclient import TestClient
+from pytest import fixture
+
+from src import main
+from src.bll.poll_service import PollService
+from src.bll.trending import TrendingPolls
+from src.dal import (
+    InMemoryUserRepository,
+    InMemoryPollRepository,
+    InMemoryVoteRepository,
+)
+from src.view.admission import AdmissionController
+from src.view.poll_response_cache import PollResponseCache
+from src.view.rate_limiter import (
+    InMemoryBucketBackend,
+    RateLimiter,
+    RateLimitRule,
+)
+
+CREDENTIALS = {"user_id": 0, "password": "secret"}
+
+
+@fixture
+def client() -> TestClient:
+    # the globals lifespan would set, over in-memory repositories
+    user_repository = InMemoryUserRepository()
+    user_repository.create_user(name="bob", password_hash="secret")
+    poll_repository = InMemoryPollRepository(user_repository=user_repository)
+    main.user_repository = user_repository
+    main.poll_service = PollService(
+        poll_repository=poll_repository,
+        vote_repository=InMemoryVoteRepository(
+            user_repository=user_repository, poll_repository=poll_repository
+        ),
+        trending=TrendingPolls(),
+    )
+    main.poll_response_cache = PollResponseCache(
+        max_bytes=1 << 20, max_age_s=60
+    )
+    main.admission = AdmissionController(
+        limit=4, max_queue=8, default_timeout_s=5, max_timeout_s=5
+    )
+    main.rate_limiter = None
+    return TestClient(main.app)
+
+
+def _create_poll(client: TestClient) -> dict:
+    response = client.post(
+        "/polls",
+        json=CREDENTIALS
+        | {"name": "Lunch", "tag": "lunch", "options": ["pizza", "soup"]},
+    )
+    assert response.status_code == status.HTTP_201_CREATED
+    return response.json()
+
+
+def test_vote_through_api_changes_results_etag(client: TestClient):
+    # Arrange
+    poll = _create_poll(client)
+    url = f"/polls/{poll['id']}/results"
+    etag = client.get(url).headers["etag"]
+    unchanged = client.get(url, headers={"If-None-Match": etag})
+
+    # Act
+    voted = client.post(
+        f"/polls/{poll['id']}/votes",
+        json=CREDENTIALS | {"option_id": poll["options"][0]["id"]},
+    )
+    response = client.get(url, headers={"If-None-Match": etag})
+
+    # Assert
+    assert unchanged.status_code == status.HTTP_304_NOT_MODIFIED
+    assert voted.status_code == status.HTTP_204_NO_CONTENT
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["etag"] != etag
+    assert response.json()["total_votes"] == 1
+
+
+def test_retract_vote_and_delete_poll_through_api(client: TestClient):
+    # Arrange
+    poll = _create_poll(client)
+    option_id = poll["options"][1]["id"]
+    client.post(
+        f"/polls/{poll['id']}/votes",
+        json=CREDENTIALS | {"option_id": option_id},
+    )
+
+    # Act
+    retracted = client.request(
+        "DELETE", f"/polls/{poll['id']}/votes/{option_id}", json=CREDENTIALS
+    )
+    results = client.get(f"/polls/{poll['id']}/results")
+    deleted = client.request(
+        "DELETE", f"/polls/{poll['id']}", json=CREDENTIALS
+    )
+    missing = client.get(f"/polls/{poll['id']}/results")
+
+    # Assert
+    assert retracted.status_code == status.HTTP_204_NO_CONTENT
+    assert results.json()["total_votes"] == 0
+    assert deleted.status_code == status.HTTP_204_NO_CONTENT
+    assert missing.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_write_with_wrong_password_is_rejected(client: TestClient):
+    # Arrange
+    poll = _create_poll(client)
+
+    # Act
+    response = client.post(
+        f"/polls/{poll['id']}/votes",
+        json={"user_id": 0, "password": "guess", "option_id": 1},
+    )
+
+    # Assert
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+def test_write_outside_the_process_changes_etag_after_max_age(
+    client: TestClient,
+):
+    # Arrange
+    main.poll_response_cache.max_age_s = 0
+    poll = _create_poll(client)
+    url = f"/polls/{poll['id']}/results"
+    etag = client.get(url).headers["etag"]
+    unchanged = client.get(url, headers={"If-None-Match": etag})
+
+    # Act
+    main.poll_service.vote_repository.create_vote(
+        option_id=poll["options"][0]["id"], user_id=0
+    )
+    response = client.get(url, headers={"If-None-Match": etag})
+
+    # Assert
+    assert unchanged.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["etag"] != etag
+    assert response.json()["total_votes"] == 1
+
+
+def test_vote_through_api_shows_up_in_trending(client: TestClient):
+    # Arrange
+    poll = _create_poll(client)
+    before = client.get("/polls/trending").json()
+
+    # Act
+    client.post(
+        f"/polls/{poll['id']}/votes",
+        json=CREDENTIALS | {"option_id": poll["options"][0]["id"]},
+    )
+    response = client.get("/polls/trending")
+
+    # Assert
+    assert before == []
+    assert [entry["poll_id"] for entry in response.json()] == [poll["id"]]
+
+
+def test_user_signed_up_through_api_creates_poll(client: TestClient):
+    # Arrange
+    signed_up = client.post("/users", json={"name": "carol", "password": "pw"})
+    credentials = {"user_id": signed_up.json()["id"], "password": "pw"}
+
+    # Act
+    response = client.post(
+        "/polls",
+        json=credentials
+        | {"name": "Dinner", "tag": "dinner", "options": ["stew", "soup"]},
+    )
+
+    # Assert
+    assert signed_up.status_code == status.HTTP_201_CREATED
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.json()["user_id"] == credentials["user_id"]
+
+
+def test_votes_are_rate_limited_per_caller_named_in_the_body(
+    client: TestClient,
+):
+    # Arrange
+    poll = _create_poll(client)
+    other = client.post("/users", json={"name": "eve", "password": "pw"})
+    main.rate_limiter = RateLimiter(
+        InMemoryBucketBackend(),
+        {"votes": RateLimitRule(rate_per_s=0.001, burst=1, per_ip=False)},
+    )
+    url = f"/polls/{poll['id']}/votes"
+    option_id = poll["options"][0]["id"]
+
+    # Act
+    first = client.post(url, json=CREDENTIALS | {"option_id": option_id})
+    again = client.post(url, json=CREDENTIALS | {"option_id": option_id})
+    other_caller = client.post(
+        url,
+        json={
+            "user_id": other.json()["id"],
+            "password": "pw",
+            "option_id": option_id,
+        },
+    )
+
+    # Assert
+    assert first.status_code == status.HTTP_204_NO_CONTENT
+    assert again.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert other_caller.status_code == status.HTTP_204_NO_CONTENT
+
+
+def test_cpu_profile_interval_longer_than_the_profile_is_rejected(
+    client: TestClient, monkeypatch
+):
+    # Arrange
+    monkeypatch.setattr(main.configuration, "ADMIN_TOKEN", "t", raising=False)
+
+    # Act
+    response = client.get(
+        "/admin/profile/cpu?seconds=1&interval_ms=5000",
+        headers={"x-admin-token": "t"},
+    )
+
+    # Assert
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
@@ -0,0 +1,85 @@
+import gzip
+
+import brotli
+from fastapi import status
+
+from src.view.poll_response_cache import PollResponseCache
+
+
+def test_not_modified_matching_etag_returns_304():
+    # Arrange
+    cache = PollResponseCache(max_bytes=1024, epoch="e")
+    etag = cache.etag(3)
+
+    # Act
+    response = cache.not_modified(etag, f'"other", {etag}')
+
+    # Assert
+    assert etag == 'W/"e-3"'
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response.headers["etag"] == etag
+
+
+def test_not_modified_other_etag_returns_none():
+    # Arrange
+    cache = PollResponseCache(max_bytes=1024, epoch="e")
+
+    # Act & Assert
+    assert cache.not_modified(cache.etag(3), cache.etag(2)) is None
+    assert cache.not_modified(cache.etag(3), None) is None
+
+
+def test_put_large_body_serves_precompressed_variants():
+    # Arrange
+    cache = PollResponseCache(max_bytes=1 << 20, epoch="e")
+    body = b'{"name": "' + b"x" * 2000 + b'"}'
+
+    # Act
+    cache.put(("poll", 1), cache.etag(1), body, None)
+    br = cache.get(("poll", 1), cache.etag(1), "gzip, deflate, br")
+    gz = cache.get(("poll", 1), cache.etag(1), "gzip, br;q=0")
+    identity = cache.get(("poll", 1), cache.etag(1), None)
+
+    # Assert
+    assert br.headers["content-encoding"] == "br"
+    assert brotli.decompress(br.body) == body
+    assert gz.headers["content-encoding"] == "gzip"
+    assert gzip.decompress(gz.body) == body
+    assert "content-encoding" not in identity.headers
+    assert identity.body == body
+
+
+def test_get_stale_version_returns_none():
+    # Arrange
+    cache = PollResponseCache(max_bytes=1024, epoch="e")
+    cache.put(("poll", 1), cache.etag(1), b"{}", None)
+
+    # Act & Assert
+    assert cache.get(("poll", 1), cache.etag(2), None) is None
+
+
+def test_put_over_budget_evicts_least_recently_used():
+    # Arrange
+    cache = PollResponseCache(max_bytes=250, epoch="e")
+    cache.put(("poll", 1), cache.etag(1), b"1" * 100, None)
+    cache.put(("poll", 2), cache.etag(1), b"2" * 100, None)
+    cache.get(("poll", 1), cache.etag(1), None)
+
+    # Act
+    cache.put(("poll", 3), cache.etag(1), b"3" * 100, None)
+
+    # Assert
+    assert cache.size == 200
+    assert cache.get(("poll", 2), cache.etag(1), None) is None
+    assert cache.get(("poll", 1), cache.etag(1), None) is not None
+    assert cache.get(("poll", 3), cache.etag(1), None) is not None
+
+
+def test_get_past_max_age_returns_none_but_peek_keeps_body():
+    # Arrange
+    cache = PollResponseCache(max_bytes=1024, max_age_s=0, epoch="e")
+    cache.put(("poll", 1), cache.etag(1), b"{}", None)
+
+    # Act & Assert
+    assert cache.get(("poll", 1), cache.etag(1), None) is None
+    assert cache.peek(("poll", 1)) == (cache.etag(1), b"{}")
@@ -1,4 +1,5 @@
-from datetime import datetime
+import copy
+from datetime import datetime, timedelta, timezone
 from unittest.mock import MagicMock
 
 import pytest
@@ -7,9 +8,18 @@ from pytest import fixture
 from src.bll.bll_exceptions import PollExistsException, NotFound, NotAllowed
 from src.bll.bll_models import PollModel, OptionModel
 from src.bll.poll_service import PollService
-from src.dal import PollEntity, VoteRepository, PollRepository
-from src.dal.dal_entities import OptionEntity
+from src.bll.read_cache import ReadCache
+from src.bll.trending import TrendingPolls
+from src.bll.voter_index import VoterIndex
+from src.dal import PollEntity, VoteRepository, PollRepository, joined
+from src.dal.dal_entities import OptionEntity, PollSearchHit
 from src.dal.exceptions import DalUniqueViolationException
+from src.mapper import (
+    to_poll_search_page_dto,
+    from_search_cursor,
+    to_leaderboard_page_dto,
+    from_leaderboard_cursor,
+)
 
 
 @fixture
@@ -65,8 +75,8 @@ def test_get_polls_by_userid_returns_polls(
     option_entities: list[OptionEntity],
 ):
     # Arrange
-    poll_repository.get_options_for_poll.return_value = option_entities
-    poll_repository.get_polls_by_user.return_value = [poll_entity]
+    poll_entity.options = option_entities
+    poll_repository.get_polls_with_options.return_value = [poll_entity]
 
     # Act
     poll_service = PollService(
@@ -75,8 +85,8 @@ def test_get_polls_by_userid_returns_polls(
     poll = poll_service.get_polls_by_userid(user_id=1)[0]
 
     # Assert
-    poll_repository.get_polls_by_user.assert_called_with(user_id=1)
-    poll_repository.get_options_for_poll.assert_called_with(poll_id=poll_entity.id)
+    poll_repository.get_polls_with_options.assert_called_once_with(user_id=1)
+    poll_repository.get_options_for_poll.assert_not_called()
     assert_poll_entity_to_poll_model(poll_entity=poll_entity, poll_model=poll)
     for ent, model in zip(option_entities, poll.options):
         assert_option_entity_to_entity_model(option_entity=ent, option_model=model)
@@ -89,7 +99,7 @@ def test_get_poll_by_id_returns_poll(
     option_entities: list[OptionEntity],
 ):
     # Arrange
-    poll_repository.get_options_for_poll.return_value = option_entities
+    poll_entity.options = option_entities
     poll_repository.get_poll_by_id.return_value = poll_entity
 
     # Act
@@ -99,8 +109,10 @@ def test_get_poll_by_id_returns_poll(
     poll = poll_service.get_poll_by_id(poll_id=poll_entity.id)
 
     # Assert
-    poll_repository.get_poll_by_id.assert_called_with(poll_id=1)
-    poll_repository.get_options_for_poll.assert_called_with(poll_id=poll_entity.id)
+    poll_repository.get_poll_by_id.assert_called_once_with(
+        poll_id=1, load=(joined("options"),)
+    )
+    poll_repository.get_options_for_poll.assert_not_called()
     assert_poll_entity_to_poll_model(poll_entity=poll_entity, poll_model=poll)
     for ent, model in zip(option_entities, poll.options):
         assert_option_entity_to_entity_model(option_entity=ent, option_model=model)
@@ -113,7 +125,7 @@ def test_get_poll_by_userid_tag_returns_polls(
     option_entities: list[OptionEntity],
 ):
     # Arrange
-    poll_repository.get_options_for_poll.return_value = option_entities
+    poll_entity.options = option_entities
     poll_repository.get_poll_by_user_and_tag.return_value = poll_entity
 
     # Act
@@ -123,8 +135,10 @@ def test_get_poll_by_userid_tag_returns_polls(
     poll = poll_service.get_poll_by_tag_userid(tag=poll_entity.tag, user_id=1)
 
     # Assert
-    poll_repository.get_poll_by_id.get_poll_by_user_and_tag(poll_id=1)
-    poll_repository.get_options_for_poll.assert_called_with(poll_id=poll_entity.id)
+    poll_repository.get_poll_by_user_and_tag.assert_called_once_with(
+        tag=poll_entity.tag, user_id=1, load=(joined("options"),)
+    )
+    poll_repository.get_options_for_poll.assert_not_called()
     assert_poll_entity_to_poll_model(poll_entity=poll_entity, poll_model=poll)
     for ent, model in zip(option_entities, poll.options):
         assert_option_entity_to_entity_model(option_entity=ent, option_model=model)
@@ -161,8 +175,8 @@ def test_create_poll_poll_not_exists_returns_poll(
 ):
     # Arrange
     poll_repository.create_poll.return_value = None
+    poll_entity.options = option_entities
     poll_repository.get_poll_by_user_and_tag.return_value = poll_entity
-    poll_repository.get_options_for_poll.return_value = option_entities
 
     # Act
     poll_service = PollService(
@@ -244,3 +258,511 @@ def test_delete_poll_user_doesnt_own_poll_raises_exception(
 
     # Assert
     poll_repository.delete_poll.assert_not_called()
+
+
+def test_delete_poll_poll_exists_bumps_version(
+    poll_repository: PollRepository | MagicMock,
+    vote_repository: VoteRepository | MagicMock,
+    poll_entity: PollEntity,
+):
+    # Arrange
+    poll_repository.get_poll_by_id.return_value = poll_entity
+    poll_service = PollService(
+        poll_repository=poll_repository, vote_repository=vote_repository
+    )
+    version = poll_service.get_poll_version(poll_entity.id)
+
+    # Act
+    poll_service.delete_poll_by_id(user_id=poll_entity.user_id, poll_id=poll_entity.id)
+
+    # Assert
+    assert poll_service.get_poll_version(poll_entity.id) == version + 1
+
+
+def test_create_vote_option_exists_creates_vote_and_bumps_version(
+    poll_repository: PollRepository | MagicMock,
+    vote_repository: VoteRepository | MagicMock,
+    poll_entity: PollEntity,
+    option_entities: list[OptionEntity],
+):
+    # Arrange
+    poll_repository.get_option_by_id.return_value = option_entities[2]
+    poll_repository.get_poll_by_id.return_value = poll_entity
+    vote_repository.get_votes_by_user_poll.return_value = []
+
+    # Act
+    poll_service = PollService(
+        poll_repository=poll_repository, vote_repository=vote_repository
+    )
+    poll_service.create_vote(poll_id=poll_entity.id, option_id=2, user_id=3)
+
+    # Assert
+    vote_repository.create_vote.assert_called_once_with(option_id=2, user_id=3)
+    assert poll_service.get_poll_version(poll_entity.id) == 1
+
+
+def test_create_vote_option_of_other_poll_raises_exception(
+    poll_repository: PollRepository | MagicMock,
+    vote_repository: VoteRepository | MagicMock,
+):
+    # Arrange
+    poll_repository.get_option_by_id.return_value = OptionEntity(
+        id=2, poll_id=7, text="sometext"
+    )
+
+    # Act
+    poll_service = PollService(
+        poll_repository=poll_repository, vote_repository=vote_repository
+    )
+    with pytest.raises(NotFound):
+        poll_service.create_vote(poll_id=1, option_id=2, user_id=3)
+
+    # Assert
+    vote_repository.create_vote.assert_not_called()
+    assert poll_service.get_poll_version(1) == 0
+
+
+def test_create_vote_single_choice_second_vote_raises_exception(
+    poll_repository: PollRepository | MagicMock,
+    vote_repository: VoteRepository | MagicMock,
+    poll_entity: PollEntity,
+    option_entities: list[OptionEntity],
+):
+    # Arrange
+    poll_repository.get_option_by_id.return_value = option_entities[2]
+    poll_repository.get_poll_by_id.return_value = poll_entity
+    vote_repository.get_votes_by_user_poll.return_value = [MagicMock()]
+
+    # Act
+    poll_service = PollService(
+        poll_repository=poll_repository, vote_repository=vote_repository
+    )
+    with pytest.raises(NotAllowed):
+        poll_service.create_vote(poll_id=poll_entity.id, option_id=2, user_id=3)
+
+    # Assert
+    vote_repository.create_vote.assert_not_called()
+
+
+def test_get_poll_results_returns_counts_per_option(
+    poll_repository: PollRepository | MagicMock,
+    vote_repository: VoteRepository | MagicMock,
+    poll_entity: PollEntity,
+    option_entities: list[OptionEntity],
+):
+    # Arrange
+    poll_entity.options = option_entities
+    poll_repository.get_poll_by_id.return_value = poll_entity
+    vote_repository.get_vote_counts_by_poll.return_value = {0: 4, 3: 1}
+
+    # Act
+    poll_service = PollService(
+        poll_repository=poll_repository,
+        vote_repository=vote_repository,
+        read_cache=ReadCache(ttl_s=60),
+    )
+    poll = poll_service.get_poll_results(poll_id=poll_entity.id)
+    cached = poll_service.get_poll_by_id(poll_id=poll_entity.id)
+
+    # Assert
+    assert [option.votes for option in poll.options] == [4, 0, 0, 1, 0]
+    assert [option.votes for option in cached.options] == [None] * 5
+
+
+def test_search_polls_pages_after_the_last_hit(
+    poll_repository: PollRepository | MagicMock,
+    vote_repository: VoteRepository | MagicMock,
+    poll_entity: PollEntity,
+):
+    # Arrange
+    poll_repository.search_polls.return_value = [
+        PollSearchHit(poll=poll_entity, rank=0.9),
+        PollSearchHit(poll=poll_entity, rank=0.5),
+        PollSearchHit(poll=poll_entity, rank=0.1),
+    ]
+
+    # Act
+    poll_service = PollService(
+        poll_repository=poll_repository, vote_repository=vote_repository
+    )
+    page = poll_service.search_polls(query="lunch", limit=2)
+    dto = to_poll_search_page_dto(page)
+
+    # Assert
+    poll_repository.search_polls.assert_called_with(
+        query="lunch", limit=3, cursor=None
+    )
+    assert len(page.polls) == 2
+    assert page.next_cursor == (0.5, poll_entity.id)
+    assert from_search_cursor(dto.next_cursor) == page.next_cursor
+    with pytest.raises(ValueError):
+        from_search_cursor("not a cursor")
+
+
+def test_leaderboard_pages_by_votes_and_poll_id(
+    vote_repository: VoteRepository | MagicMock,
+):
+    # Arrange
+    cursor = MagicMock()
+    cursor.fetchall.return_value = [
+        (7, "lunch", "food", 40),
+        (3, "dinner", "food", 40),
+        (9, "snack", "food", 12),
+    ]
+    poll_service = PollService(
+        poll_repository=PollRepository(cursor), vote_repository=vote_repository
+    )
+
+    # Act
+    page = poll_service.get_leaderboard(tag="food", limit=2, cursor=(41, 1))
+    dto = to_leaderboard_page_dto(page)
+
+    # Assert
+    statement, parameters = cursor.execute.call_args.args
+    assert "totals.tag = %(tag)s" in statement
+    assert "(totals.votes, totals.poll_id) <" in statement
+    assert parameters["limit"] == 3
+    assert (parameters["votes"], parameters["poll_id"]) == (41, 1)
+    assert [poll.poll_id for poll in page.polls] == [7, 3]
+    assert page.next_cursor == (40, 3)
+    assert from_leaderboard_cursor(dto.next_cursor) == (40, 3)
+
+
+def test_vote_series_picks_resolution_and_fills_empty_buckets(
+    poll_repository: PollRepository | MagicMock,
+    vote_repository: VoteRepository | MagicMock,
+    option_entities: list[OptionEntity],
+):
+    # Arrange
+    poll_repository.get_options_for_poll.return_value = option_entities[:2]
+    vote_repository.get_vote_rollups.return_value = [
+        (0, datetime(2024, 1, 1, 10), 5),
+        (1, datetime(2024, 1, 1, 12), 2),
+    ]
+    poll_service = PollService(
+        poll_repository=poll_repository, vote_repository=vote_repository
+    )
+
+    # Act
+    series = poll_service.get_vote_series(
+        poll_id=1,
+        start=datetime(2024, 1, 1, 10, 30),
+        end=datetime(2024, 1, 1, 13, 15),
+        max_points=60,
+    )
+
+    # Assert
+    vote_repository.get_vote_rollups.assert_called_with(
+        poll_id=1,
+        resolution="h",
+        start=datetime(2024, 1, 1, 10),
+        end=datetime(2024, 1, 1, 13, 15),
+    )
+    assert series.resolution == "hour"
+    assert series.buckets == [datetime(2024, 1, 1, h) for h in range(10, 14)]
+    assert [option.votes for option in series.options] == [
+        [5, 0, 0, 0],
+        [0, 0, 2, 0],
+    ]
+
+
+def test_vote_series_skips_resolutions_pruned_before_start(
+    poll_repository: PollRepository | MagicMock,
+    vote_repository: VoteRepository | MagicMock,
+    option_entities: list[OptionEntity],
+):
+    # Arrange
+    poll_repository.get_options_for_poll.return_value = option_entities[:2]
+    vote_repository.get_vote_rollups.return_value = []
+    poll_service = PollService(
+        poll_repository=poll_repository,
+        vote_repository=vote_repository,
+        rollup_retention={"m": timedelta(days=2)},
+    )
+    recent = datetime.now(timezone.utc).replace(tzinfo=None)
+
+    # Act
+    old_series = poll_service.get_vote_series(
+        poll_id=1,
+        start=datetime(2024, 1, 1, 10),
+        end=datetime(2024, 1, 1, 13),
+        max_points=1000,
+    )
+    recent_series = poll_service.get_vote_series(
+        poll_id=1,
+        start=recent - timedelta(hours=3),
+        end=recent,
+        max_points=1000,
+    )
+
+    # Assert
+    assert old_series.resolution == "hour"
+    assert recent_series.resolution == "minute"
+
+
+def test_prune_vote_rollups_keeps_the_bucket_holding_the_cutoff(
+    poll_repository: PollRepository | MagicMock,
+    vote_repository: VoteRepository | MagicMock,
+):
+    # Arrange
+    poll_service = PollService(
+        poll_repository=poll_repository,
+        vote_repository=vote_repository,
+        rollup_retention={"m": timedelta(days=2), "h": timedelta(days=90)},
+    )
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+
+    # Act
+    poll_service.prune_vote_rollups()
+
+    # Assert
+    calls = {
+        call.kwargs["resolution"]: call.kwargs["before"]
+        for call in vote_repository.delete_vote_rollups_before.call_args_list
+    }
+    assert set(calls) == {"m", "h"}
+    assert calls["m"].second == 0
+    assert timedelta(0) <= now - timedelta(days=2) - calls["m"] < timedelta(
+        minutes=1
+    )
+    assert calls["h"].minute == 0
+    assert timedelta(0) <= now - timedelta(days=90) - calls["h"] < timedelta(
+        hours=1
+    )
+
+
+def test_option_overlap_and_membership_come_from_the_voter_index(
+    poll_repository: PollRepository | MagicMock,
+    vote_repository: VoteRepository | MagicMock,
+    poll_entity: PollEntity,
+    option_entities: list[OptionEntity],
+):
+    # Arrange
+    poll_repository.get_options_for_poll.return_value = option_entities[:3]
+    poll_entity.options = option_entities[:3]
+    poll_repository.get_poll_by_id.return_value = poll_entity
+    voter_index = VoterIndex()
+    voter_index.build([(0, 1), (0, 2), (0, 3), (1, 2), (1, 3), (2, 9)])
+    poll_service = PollService(
+        poll_repository=poll_repository,
+        vote_repository=vote_repository,
+        voter_index=voter_index,
+    )
+
+    # Act
+    overlap = poll_service.get_option_overlap(poll_id=1)
+    membership = poll_service.get_poll_membership(poll_id=1, user_id=3)
+    poll_entity.anonymous_voting = True
+    poll_service.poll_versions.bump(1)
+    anonymous = poll_service.get_poll_membership(poll_id=1, user_id=3)
+
+    # Assert
+    assert overlap.option_ids == [0, 1, 2]
+    assert overlap.voters == [[3, 2, 0], [2, 2, 0], [0, 0, 1]]
+    assert membership.voted
+    assert membership.option_ids == [0, 1]
+    assert anonymous.voted
+    assert anonymous.option_ids is None
+
+
+def test_get_polls_returns_polls_with_counts_in_requested_order(
+    poll_repository: PollRepository | MagicMock,
+    vote_repository: VoteRepository | MagicMock,
+    poll_entity: PollEntity,
+):
+    # Arrange
+    polls = list()
+    for poll_id in (2, 5, 7):
+        poll = copy.copy(poll_entity)
+        poll.id = poll_id
+        poll.options = [
+            OptionEntity(id=poll_id * 10, poll_id=poll_id, text="a", votes=3)
+        ]
+        polls.append(poll)
+    poll_repository.get_polls_with_options.return_value = polls
+    poll_service = PollService(
+        poll_repository=poll_repository, vote_repository=vote_repository
+    )
+
+    # Act
+    found = poll_service.get_polls([7, 9, 2, 5])
+
+    # Assert
+    poll_repository.get_polls_with_options.assert_called_once_with(
+        poll_ids=[7, 9, 2, 5], with_counts=True
+    )
+    poll_repository.get_options_for_poll.assert_not_called()
+    assert [poll.id for poll in found] == [7, 2, 5]
+    assert found[0].options == (OptionModel(id=70, text="a", votes=3),)
+
+
+def test_get_polls_by_id_shares_the_single_poll_cache(
+    poll_repository: PollRepository | MagicMock,
+    vote_repository: VoteRepository | MagicMock,
+    poll_entity: PollEntity,
+    option_entities: list[OptionEntity],
+):
+    # Arrange
+    poll_entity.options = option_entities
+    poll_repository.get_poll_by_id.return_value = poll_entity
+    other = copy.copy(poll_entity)
+    other.id = 2
+    poll_repository.get_polls_with_options.return_value = [other]
+    poll_service = PollService(
+        poll_repository=poll_repository,
+        vote_repository=vote_repository,
+        read_cache=ReadCache(ttl_s=60),
+    )
+    poll_service.get_poll_by_id(poll_id=1)
+
+    # Act
+    polls = poll_service.get_polls_by_id([1, 2, 3])
+    cached = poll_service.get_poll_by_id(poll_id=2)
+
+    # Assert
+    poll_repository.get_polls_with_options.assert_called_once_with(
+        poll_ids=[2, 3], with_counts=False
+    )
+    poll_repository.get_poll_by_id.assert_called_once()
+    assert sorted(polls) == [1, 2]
+    assert cached == polls[2]
+
+
+def test_apply_new_votes_feeds_vote_changes_from_the_table(
+    poll_repository: PollRepository | MagicMock,
+    vote_repository: VoteRepository | MagicMock,
+):
+    # Arrange
+    vote_repository.get_vote_changes.side_effect = [
+        (7, []),
+        (
+            9,
+            [
+                ("i", 8, 1, 10, 4),
+                ("i", 9, 2, 20, 4),
+                ("i", 10, 1, 11, 5),
+                ("d", 8, 1, 10, 4),
+                ("d", 6, None, 30, 4),
+            ],
+        ),
+        (9, []),
+    ]
+    voter_index = VoterIndex()
+    voter_index.build([(30, 4), (30, 5)])
+    poll_service = PollService(
+        poll_repository=poll_repository,
+        vote_repository=vote_repository,
+        trending=TrendingPolls(),
+        voter_index=voter_index,
+        follow_votes=True,
+    )
+
+    # Act
+    started = poll_service.apply_new_votes()
+    applied = poll_service.apply_new_votes()
+    poll_service.apply_new_votes()
+
+    # Assert
+    assert started == 0
+    assert applied == 5
+    assert [
+        call.kwargs["since"]
+        for call in vote_repository.get_vote_changes.call_args_list
+    ] == [None, 7, 9]
+    assert [poll_id for poll_id, _ in poll_service.trending.trending(2)] == [
+        1,
+        2,
+    ]
+    assert list(voter_index.voters(10)) == []
+    assert list(voter_index.voters(11)) == [5]
+    assert list(voter_index.voters(20)) == [4]
+    assert list(voter_index.voters(30)) == []
+    assert poll_service.get_poll_version(1) == 1
+    assert poll_service.get_poll_version(2) == 1
+
+
+def test_loaded_voter_index_is_followed_from_its_saved_position(
+    poll_repository: PollRepository | MagicMock,
+    vote_repository: VoteRepository | MagicMock,
+    tmp_path,
+):
+    # Arrange
+    path = str(tmp_path / "voters.idx")
+    saved = VoterIndex(path)
+    saved.build([(10, 4)])
+    saved.save(position=7)
+    saved.close()
+    vote_repository.get_vote_changes.side_effect = [
+        (9, [("i", 8, 1, 10, 5)]),
+        (11, []),
+    ]
+    voter_index = VoterIndex(path)
+    poll_service = PollService(
+        poll_repository=poll_repository,
+        vote_repository=vote_repository,
+        voter_index=voter_index,
+        follow_votes=True,
+    )
+
+    # Act
+    caught_up = poll_service.apply_new_votes()
+    poll_service.apply_new_votes()
+    poll_service.save_voter_index()
+
+    # Assert
+    assert caught_up == 1
+    assert vote_repository.get_vote_changes.call_args_list[0].kwargs == {
+        "since": 7
+    }
+    assert list(voter_index.voters(10)) == [4, 5]
+    assert VoterIndex(path).position == 11
+
+
+def test_prune_vote_history_drops_vote_changes_past_their_retention(
+    poll_repository: PollRepository | MagicMock,
+    vote_repository: VoteRepository | MagicMock,
+):
+    # Arrange
+    poll_service = PollService(
+        poll_repository=poll_repository,
+        vote_repository=vote_repository,
+        change_retention=timedelta(hours=1),
+    )
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+
+    # Act
+    poll_service.prune_vote_history()
+
+    # Assert
+    before = vote_repository.delete_vote_changes_before.call_args.kwargs[
+        "before"
+    ]
+    assert timedelta(0) <= before - (now - timedelta(hours=1)) < timedelta(
+        minutes=1
+    )
+
+
+def test_followed_votes_are_left_to_the_feed(
+    poll_repository: PollRepository | MagicMock,
+    vote_repository: VoteRepository | MagicMock,
+    poll_entity: PollEntity,
+):
+    # Arrange
+    poll_repository.get_option_by_id.return_value = OptionEntity(
+        id=10, poll_id=1, text="yes"
+    )
+    poll_repository.get_poll_by_id.return_value = poll_entity
+    vote_repository.get_votes_by_user_poll.return_value = []
+    poll_service = PollService(
+        poll_repository=poll_repository,
+        vote_repository=vote_repository,
+        trending=TrendingPolls(),
+        follow_votes=True,
+    )
+
+    # Act
+    poll_service.create_vote(poll_id=1, option_id=10, user_id=4)
+
+    # Assert
+    assert poll_service.trending.trending(1) == []
+    assert poll_service.get_poll_version(1) == 1
@@ -0,0 +1,85 @@
+import threading
+import time
+
+import pytest
+
+from src.profiling import (
+    SamplingProfiler,
+    AllocationTracker,
+    ProfilerBusy,
+    to_collapsed,
+    to_speedscope,
+)
+
+
+def _busy_loop(stop: threading.Event) -> None:
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_profile_samples_other_threads():
+    # Arrange
+    profiler = SamplingProfiler()
+    stop = threading.Event()
+    worker = threading.Thread(target=_busy_loop, args=(stop,))
+    worker.start()
+
+    # Act
+    try:
+        stacks = profiler.profile(duration_s=0.2, interval_s=0.005)
+    finally:
+        stop.set()
+        worker.join()
+
+    # Assert
+    assert any("_busy_loop (test_profiling.py)" in stack for stack in stacks)
+    collapsed = to_collapsed(stacks)
+    assert collapsed.splitlines()[0].rsplit(" ", 1)[1].isdigit()
+    speedscope = to_speedscope(stacks, "test", 0.005)
+    assert speedscope["profiles"][0]["samples"]
+
+
+def test_second_profile_while_running_raises_exception():
+    # Arrange
+    profiler = SamplingProfiler()
+    first = threading.Thread(target=profiler.profile, args=(0.3, 0.01))
+    first.start()
+    time.sleep(0.05)
+
+    # Act & Assert
+    with pytest.raises(ProfilerBusy):
+        profiler.profile(0.01, 0.01)
+    first.join()
+
+
+def test_profile_ends_at_its_duration_whatever_the_interval():
+    # Arrange
+    profiler = SamplingProfiler()
+
+    # Act
+    started = time.perf_counter()
+    profiler.profile(duration_s=0.05, interval_s=30)
+    elapsed = time.perf_counter() - started
+
+    # Assert
+    assert elapsed < 1
+
+
+def test_allocation_diff_attributes_growth_to_line():
+    # Arrange
+    tracker = AllocationTracker()
+    tracker.start(frames=1)
+
+    # Act
+    try:
+        retained = [bytearray(1024) for _ in range(1000)]
+        statistics = tracker.snapshot("lineno", limit=5, diff=True)
+    finally:
+        tracker.stop()
+
+    # Assert
+    assert len(retained) == 1000
+    top = statistics[0]
+    assert top.traceback[0].filename.endswith("test_profiling.py")
+    assert top.size_diff >= 1000 * 1024
+    assert not tracker.active
@@ -0,0 +1,139 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi import HTTPException
+
+from src.view.rate_limiter import (
+    InMemoryBucketBackend,
+    SharedMemoryBucketBackend,
+    RateLimiter,
+    RateLimitRule,
+    parse_rules,
+)
+
+
+def _request(user_id: str | None, host: str) -> MagicMock:
+    request = MagicMock()
+    request.path_params = {} if user_id is None else {"user_id": user_id}
+    request.client.host = host
+    return request
+
+
+def test_bucket_allows_burst_then_refills_lazily():
+    # Arrange
+    backend = InMemoryBucketBackend(shards=4)
+
+    # Act
+    with patch("src.view.rate_limiter.time.monotonic", return_value=100.0):
+        burst = [backend.acquire("k", rate_per_s=2, burst=3) for _ in range(4)]
+    with patch("src.view.rate_limiter.time.monotonic", return_value=100.5):
+        refilled = backend.acquire("k", rate_per_s=2, burst=3)
+
+    # Assert
+    assert burst == [0.0, 0.0, 0.0, 0.5]
+    assert refilled == 0.0
+
+
+def test_idle_buckets_are_evicted_least_recently_used_first():
+    # Arrange
+    backend = InMemoryBucketBackend(shards=1, max_buckets=2)
+    backend.acquire("a", rate_per_s=1, burst=1)
+    backend.acquire("b", rate_per_s=1, burst=1)
+
+    # Act
+    backend.acquire("a", rate_per_s=1, burst=1)
+    backend.acquire("c", rate_per_s=1, burst=1)
+
+    # Assert
+    assert len(backend) == 2
+    assert backend.acquire("a", rate_per_s=1, burst=1) > 0
+    assert backend.acquire("b", rate_per_s=1, burst=1) == 0.0
+
+
+def test_shared_backend_is_shared_between_instances(tmp_path):
+    # Arrange
+    path = str(tmp_path / "buckets")
+    first = SharedMemoryBucketBackend(path, slots=1024, stripes=8)
+    second = SharedMemoryBucketBackend(path, slots=1024, stripes=8)
+
+    # Act
+    allowed = first.acquire("login:ip:1.2.3.4", rate_per_s=0.1, burst=1)
+    denied = second.acquire("login:ip:1.2.3.4", rate_per_s=0.1, burst=1)
+    other = second.acquire("login:ip:5.6.7.8", rate_per_s=0.1, burst=1)
+    first.close()
+    second.close()
+
+    # Assert
+    assert allowed == 0.0
+    assert 9 < denied <= 10
+    assert other == 0.0
+
+
+def test_check_limits_user_and_ip_and_sets_retry_after():
+    # Arrange
+    rate_limiter = RateLimiter(
+        InMemoryBucketBackend(),
+        {"credentials": RateLimitRule(rate_per_s=0.5, burst=1)},
+    )
+    rate_limiter.check("credentials", _request("1", "10.0.0.1"))
+
+    # Act
+    with pytest.raises(HTTPException) as same_user:
+        rate_limiter.check("credentials", _request("1", "10.0.0.2"))
+    with pytest.raises(HTTPException) as same_ip:
+        rate_limiter.check("credentials", _request("2", "10.0.0.1"))
+    rate_limiter.check("credentials", _request("3", "10.0.0.3"))
+    rate_limiter.check("unlimited", _request("1", "10.0.0.1"))
+
+    # Assert
+    assert same_user.value.status_code == 429
+    assert same_user.value.headers == {"Retry-After": "2"}
+    assert same_ip.value.status_code == 429
+
+
+def test_check_keys_on_the_caller_and_takes_no_token_when_rejected():
+    # Arrange
+    backend = InMemoryBucketBackend()
+    rate_limiter = RateLimiter(
+        backend, {"votes": RateLimitRule(rate_per_s=0.001, burst=1)}
+    )
+    rate_limiter.check("votes", _request(None, "10.0.0.1"), user_id=1)
+
+    # Act
+    with pytest.raises(HTTPException):
+        rate_limiter.check("votes", _request(None, "10.0.0.1"), user_id=2)
+    with pytest.raises(HTTPException):
+        rate_limiter.check("votes", _request(None, "10.0.0.2"), user_id=1)
+
+    # Assert
+    assert backend.acquire("votes:user:2", rate_per_s=0.001, burst=1) == 0.0
+    assert backend.acquire("votes:ip:10.0.0.2", rate_per_s=0.001, burst=1) == 0
+
+
+def test_shared_backend_takes_no_token_unless_every_bucket_has_one(tmp_path):
+    # Arrange
+    backend = SharedMemoryBucketBackend(
+        str(tmp_path / "buckets"), slots=1024, stripes=8
+    )
+    backend.acquire("a", rate_per_s=0.001, burst=1)
+
+    # Act
+    rejected = backend.acquire_all(["b", "a"], rate_per_s=0.001, burst=1)
+    untouched = backend.acquire("b", rate_per_s=0.001, burst=1)
+    backend.close()
+
+    # Assert
+    assert rejected > 0
+    assert untouched == 0.0
+
+
+def test_parse_rules_overrides_defaults():
+    # Arrange
+    defaults = {"signup": RateLimitRule(1, 10, per_user=False)}
+
+    # Act
+    rules = parse_rules("signup=5:20, vote=2", defaults)
+
+    # Assert
+    assert rules["signup"] == RateLimitRule(5, 20, per_user=False)
+    assert rules["vote"] == RateLimitRule(2, 2)
@@ -0,0 +1,126 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from src.bll.read_cache import ReadCache, SingleFlight
+
+
+def test_concurrent_calls_share_one_load():
+    # Arrange
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = list()
+
+    def load() -> int:
+        calls.append(1)
+        release.wait(1)
+        return 42
+
+    # Act
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures = [pool.submit(flight.do, "poll:1", load) for _ in range(8)]
+        while not flight._calls:
+            pass
+        release.set()
+        results = [future.result() for future in futures]
+
+    # Assert
+    assert results == [42] * 8
+    assert len(calls) < 8
+    assert flight._calls == {}
+
+
+def test_waiters_see_the_error_of_the_shared_load():
+    # Arrange
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def load() -> int:
+        started.set()
+        release.wait(1)
+        raise LookupError("gone")
+
+    # Act
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(flight.do, "k", load)
+        started.wait(1)
+        follower = pool.submit(flight.do, "k", load)
+        release.set()
+
+        # Assert
+        with pytest.raises(LookupError):
+            leader.result()
+        with pytest.raises(LookupError):
+            follower.result()
+
+
+def test_entries_follow_the_version_and_are_shared():
+    # Arrange
+    cache = ReadCache(ttl_s=60)
+    load = MagicMock(side_effect=[{"votes": 1}, {"votes": 2}])
+
+    # Act
+    first = cache.get("poll", 0, load)
+    again = cache.get("poll", 0, load)
+    bumped = cache.get("poll", 1, load)
+
+    # Assert
+    assert again is first
+    assert bumped == {"votes": 2}
+    assert load.call_count == 2
+
+
+def test_stale_entry_is_served_while_one_refresh_runs():
+    # Arrange
+    executor = MagicMock()
+    cache = ReadCache(ttl_s=1, stale_s=10, executor=executor)
+    load = MagicMock(side_effect=["old", "new"])
+    with patch("src.bll.read_cache.time.monotonic", return_value=100.0):
+        cache.get("poll", 0, load)
+
+    # Act
+    with patch("src.bll.read_cache.time.monotonic", return_value=102.0):
+        stale = [cache.get("poll", 0, load) for _ in range(3)]
+        refresh = executor.submit.call_args.args[0]
+        refresh()
+    with patch("src.bll.read_cache.time.monotonic", return_value=102.5):
+        fresh = cache.get("poll", 0, load)
+
+    # Assert
+    assert stale == ["old"] * 3
+    assert executor.submit.call_count == 1
+    assert fresh == "new"
+
+
+def test_expired_entry_is_loaded_again():
+    # Arrange
+    cache = ReadCache(ttl_s=1, stale_s=1)
+    load = MagicMock(side_effect=["old", "new"])
+    with patch("src.bll.read_cache.time.monotonic", return_value=100.0):
+        cache.get("poll", 0, load)
+
+    # Act
+    with patch("src.bll.read_cache.time.monotonic", return_value=103.0):
+        value = cache.get("poll", 0, load)
+
+    # Assert
+    assert value == "new"
+
+
+def test_get_many_loads_misses_in_one_call_and_shares_entries():
+    # Arrange
+    cache = ReadCache(ttl_s=60)
+    cache.get("a", 0, lambda: "cached a")
+    load_many = MagicMock(return_value={"b": "loaded b"})
+
+    # Act
+    found = cache.get_many({"a": 0, "b": 0, "c": 0}, load_many)
+    again = cache.get("b", 0, MagicMock())
+
+    # Assert
+    load_many.assert_called_once_with(["b", "c"])
+    assert found == {"a": "cached a", "b": "loaded b", "c": None}
+    assert again == "loaded b"
@@ -0,0 +1,22 @@
+from unittest.mock import MagicMock
+
+import pytest
+from psycopg2.errors import UniqueViolation
+
+from src.dal import VoteRepository
+from src.dal.exceptions import DalUniqueViolationException
+
+
+def test_repeated_vote_raises_unique_violation_and_rolls_back():
+    # Arrange
+    crs = MagicMock()
+    crs.execute.side_effect = UniqueViolation()
+    vote_repository = VoteRepository(crs, MagicMock(), MagicMock())
+
+    # Act
+    with pytest.raises(DalUniqueViolationException):
+        vote_repository.create_vote(option_id=10, user_id=4)
+
+    # Assert
+    crs.connection.rollback.assert_called_once()
+    crs.connection.commit.assert_not_called()
@@ -0,0 +1,71 @@
+from unittest.mock import MagicMock
+
+import numpy as np
+import pytest
+
+from src.bll.result_stats import ResultStatistics, wilson_intervals
+
+
+def test_wilson_intervals_match_reference_values():
+    # Act
+    shares, lower, upper, margins = wilson_intervals(
+        np.array([[52, 48], [0, 0], [10, 0]]), z=1.96
+    )
+
+    # Assert
+    assert shares[0].tolist() == [0.52, 0.48]
+    assert lower[0, 0] == pytest.approx(0.42316, abs=1e-5)
+    assert upper[0, 0] == pytest.approx(0.61536, abs=1e-5)
+    assert margins[0, 0] == pytest.approx(0.09792, abs=1e-5)
+    assert (lower[1].tolist(), upper[1].tolist()) == ([0, 0], [1, 1])
+    assert upper[2, 0] == 1 and 0 < upper[2, 1] < 0.3
+
+
+def test_winner_probabilities_follow_the_margin():
+    # Arrange
+    statistics = ResultStatistics(draws=4_000, seed=2)
+
+    # Act
+    computed = statistics.compute(
+        {
+            1: {10: 900, 11: 100},
+            2: {20: 500, 21: 500, 22: 0},
+            3: {30: 0, 31: 0},
+        }
+    )
+
+    # Assert
+    lopsided, tied, empty = (
+        [option.win_probability for option in computed[poll].options]
+        for poll in (1, 2, 3)
+    )
+    assert lopsided == [1.0, 0.0]
+    assert tied[0] == pytest.approx(0.5, abs=0.05)
+    assert tied[2] == 0
+    assert sum(tied) == pytest.approx(1)
+    assert empty == pytest.approx([0.5, 0.5])
+
+
+def test_statistics_are_computed_once_per_poll_version():
+    # Arrange
+    statistics = ResultStatistics(draws=100, seed=0)
+    load_tallies = MagicMock(
+        side_effect=lambda poll_ids: {
+            poll_id: {poll_id * 10: 3, poll_id * 10 + 1: 1}
+            for poll_id in poll_ids
+            if poll_id != 9
+        }
+    )
+
+    # Act
+    first = statistics.get({1: 0, 2: 0, 9: 0}, load_tallies)
+    statistics.get({1: 0, 2: 0}, load_tallies)
+    statistics.get({1: 0, 2: 1}, load_tallies)
+
+    # Assert
+    assert sorted(first) == [1, 2]
+    assert first[1].options[0].share == 0.75
+    assert [call.args[0] for call in load_tallies.call_args_list] == [
+        [1, 2, 9],
+        [2],
+    ]
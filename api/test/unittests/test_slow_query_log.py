@@ -0,0 +1,126 @@
+from unittest.mock import MagicMock
+
+from pytest import fixture
+
+from src.dal import SlowQueryLog, TimedCursor, VoteRepository
+from src.dal.slow_query_log import normalize_statement
+
+
+@fixture
+def explain_connection() -> MagicMock:
+    connection = MagicMock()
+    connection.closed = 0
+    connection.cursor.return_value.fetchall.return_value = [
+        ("Seq Scan on votes",),
+        ("Execution Time: 1200.000 ms",),
+    ]
+    return connection
+
+
+def test_record_below_threshold_is_ignored():
+    # Arrange
+    slow_query_log = SlowQueryLog(threshold_ms=100)
+
+    # Act
+    slow_query_log.record("SELECT 1;", None, 0.05, "method")
+
+    # Assert
+    assert slow_query_log.entries() == []
+
+
+def test_record_redacts_parameters_and_captures_origin():
+    # Arrange
+    slow_query_log = SlowQueryLog(threshold_ms=100)
+
+    # Act
+    slow_query_log.record(
+        "SELECT *\n FROM users WHERE name = %s AND id = %s;",
+        ("alice", 7),
+        0.25,
+        "UserRepository.get_user_by_name",
+    )
+
+    # Assert
+    entry = slow_query_log.entries()[0]
+    assert entry.statement == (
+        "SELECT * FROM users WHERE name = %s AND id = %s;"
+    )
+    assert entry.parameters == ["<str>", "<int>"]
+    assert entry.duration_ms == 250
+    assert "test_record_redacts_parameters_and_captures_origin" in (
+        entry.origin
+    )
+
+
+def test_slow_statement_is_explained_once_on_side_connection(
+    explain_connection: MagicMock,
+):
+    # Arrange
+    connect = MagicMock(return_value=explain_connection)
+    slow_query_log = SlowQueryLog(threshold_ms=0, explain_connect=connect)
+    cursor = MagicMock()
+    cursor.fetchall.return_value = []
+    vote_repository = VoteRepository(
+        TimedCursor(cursor, slow_query_log), MagicMock(), MagicMock()
+    )
+
+    # Act
+    vote_repository.get_votes_by_poll(1)
+    slow_query_log.wait_for_plans()
+    vote_repository.get_votes_by_poll(2)
+    slow_query_log.wait_for_plans()
+
+    # Assert
+    entries = slow_query_log.entries()
+    assert [entry.method for entry in entries] == [
+        "VoteRepository.get_votes_by_poll"
+    ] * 2
+    assert entries[0].plan == (
+        "Seq Scan on votes\nExecution Time: 1200.000 ms"
+    )
+    connect.assert_called_once()
+    explain_cursor = explain_connection.cursor.return_value
+    explain_cursor.execute.assert_called_once()
+    assert explain_cursor.execute.call_args.args[0].startswith(
+        "EXPLAIN (ANALYZE, BUFFERS) "
+    )
+    explain_connection.rollback.assert_called_once()
+
+
+def test_inlined_batches_normalize_to_one_statement():
+    # Arrange
+    batches = [
+        b"INSERT INTO options (text, poll_id) values ('a', 1),('b', 1);",
+        b"INSERT INTO options (text, poll_id) values ('c', 7),('d', 7),"
+        b"('e''s', 7);",
+    ]
+
+    # Act
+    statements = {normalize_statement(batch) for batch in batches}
+
+    # Assert
+    assert statements == {
+        "INSERT INTO options (text, poll_id) values ('?', ?), ...;"
+    }
+
+
+def test_explained_statements_are_bounded_by_capacity(
+    explain_connection: MagicMock,
+):
+    # Arrange
+    slow_query_log = SlowQueryLog(
+        threshold_ms=0,
+        capacity=2,
+        explain_connect=MagicMock(return_value=explain_connection),
+    )
+
+    # Act
+    for table in ("users", "polls", "options", "votes"):
+        slow_query_log.record(f"SELECT * FROM {table};", None, 1, "method")
+        slow_query_log.wait_for_plans()
+
+    # Assert
+    assert list(slow_query_log._explained) == [
+        "SELECT * FROM options;",
+        "SELECT * FROM votes;",
+    ]
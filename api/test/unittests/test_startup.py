@@ -0,0 +1,109 @@
+import os
+import subprocess
+import sys
+from unittest.mock import MagicMock, patch
+
+from psycopg2.errors import UndefinedTable
+
+from src.dal.init_db import (
+    SCHEMA_VERSION,
+    schema_is_current,
+    prepare_schema,
+    ensure_exists,
+)
+
+
+def test_import_main_needs_no_environment_or_database():
+    # Arrange
+    env = {"PATH": os.environ.get("PATH", "")}
+
+    # Act
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, src.main; "
+            "assert 'brotli' not in sys.modules, 'brotli'; "
+            "assert 'numpy' not in sys.modules, 'numpy'; "
+            "assert 'src.bll.analytics' not in sys.modules, 'analytics'",
+        ],
+        cwd=os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+
+    # Assert
+    assert result.returncode == 0, result.stderr
+
+
+def test_schema_is_current_without_version_table_returns_false():
+    # Arrange
+    cursor = MagicMock()
+    cursor.execute.side_effect = UndefinedTable()
+
+    # Act
+    current = schema_is_current(cursor)
+
+    # Assert
+    assert current is False
+    cursor.connection.rollback.assert_called_once()
+
+
+def test_prepare_schema_skips_ddl_when_version_matches():
+    # Arrange
+    cursor = MagicMock()
+    cursor.fetchone.return_value = (SCHEMA_VERSION,)
+
+    # Act
+    with patch("src.dal.init_db.ensure_exists") as ensure_exists:
+        changed = prepare_schema(cursor)
+
+    # Assert
+    assert changed is False
+    ensure_exists.assert_not_called()
+    cursor.execute.assert_called_once()
+
+
+def test_prepare_schema_runs_ddl_for_old_version():
+    # Arrange
+    cursor = MagicMock()
+    cursor.fetchone.return_value = (SCHEMA_VERSION - 1,)
+
+    # Act
+    with patch("src.dal.init_db.ensure_exists") as ensure_exists:
+        ensure_exists.return_value = True
+        changed = prepare_schema(cursor)
+
+    # Assert
+    assert changed is True
+    ensure_exists.assert_called_once_with(cursor)
+
+
+def test_ensure_exists_skips_ddl_applied_while_waiting_for_lock():
+    # Arrange
+    cursor = MagicMock()
+    cursor.fetchone.side_effect = [(True,), (SCHEMA_VERSION,)]
+
+    # Act
+    changed = ensure_exists(cursor)
+
+    # Assert
+    assert changed is False
+    statements = [call.args[0] for call in cursor.execute.call_args_list]
+    assert "pg_advisory_xact_lock" in statements[0]
+    assert statements[-1] == "COMMIT;"
+    assert not any("CREATE TABLE" in statement for statement in statements)
+
+
+def test_ensure_exists_runs_ddl_for_old_version():
+    # Arrange
+    cursor = MagicMock()
+    cursor.fetchone.side_effect = [(True,), (SCHEMA_VERSION - 1,)]
+
+    # Act
+    changed = ensure_exists(cursor)
+
+    # Assert
+    assert changed is True
+    assert "CREATE TABLE" in cursor.execute.call_args.args[0]
@@ -0,0 +1,88 @@
+from unittest.mock import MagicMock
+
+from pytest import fixture
+
+from src.bll.poll_service import PollService
+from src.dal import PollRepository, VoteRepository
+from src.tracing import Tracer, span, current_span, _to_otlp
+
+
+class ListExporter:
+    def __init__(self) -> None:
+        self.traces = list()
+
+    def export(self, spans) -> None:
+        self.traces.append(spans)
+
+
+@fixture
+def poll_service() -> PollService:
+    cursor = MagicMock()
+    cursor.fetchone.return_value = None
+    cursor.fetchall.return_value = []
+    poll_repository = PollRepository(cursor)
+    return PollService(
+        poll_repository=poll_repository,
+        vote_repository=VoteRepository(cursor, MagicMock(), poll_repository),
+    )
+
+
+def test_trace_nests_service_and_sql_spans(poll_service: PollService):
+    # Arrange
+    exporter = ListExporter()
+    tracer = Tracer(sample_rate=1.0, exporter=exporter)
+
+    # Act
+    with tracer.start_trace("GET /polls/{poll_id}"):
+        poll_service.get_poll_results(1)
+
+    # Assert
+    spans = {span.name: span for span in exporter.traces[0]}
+    root = spans["GET /polls/{poll_id}"]
+    results = spans["PollService.get_poll_results"]
+    by_id = spans["PollService.get_poll_by_id"]
+    sql = spans["PollRepository.get_poll_by_id"]
+    assert results.parent is root
+    assert by_id.parent is results
+    assert sql.parent is by_id
+    assert sql.kind == "client"
+    assert "FROM polls" in sql.attributes["db.statement"]
+    assert root.db_round_trips == results.db_round_trips == 1
+    assert len({span.trace_id for span in spans.values()}) == 1
+    assert exporter.traces[0][-1] is root
+
+
+def test_unsampled_request_records_nothing(poll_service: PollService):
+    # Arrange
+    exporter = ListExporter()
+    tracer = Tracer(sample_rate=0.0, exporter=exporter)
+
+    # Act
+    with tracer.start_trace("GET /polls/{poll_id}") as root:
+        with span("inner") as inner:
+            poll_service.get_poll_results(1)
+            active = current_span()
+
+    # Assert
+    assert root is None and inner is None and active is None
+    assert exporter.traces == []
+
+
+def test_otlp_export_links_parent_spans():
+    # Arrange
+    exporter = ListExporter()
+    tracer = Tracer(sample_rate=1.0, exporter=exporter)
+    with tracer.start_trace("root", **{"http.method": "GET"}):
+        with span("child"):
+            pass
+
+    # Act
+    document = _to_otlp(exporter.traces[0])
+
+    # Assert
+    child, root = document["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert child["parentSpanId"] == root["spanId"]
+    assert root["parentSpanId"] == ""
+    assert {"key": "http.method", "value": {"stringValue": "GET"}} in root[
+        "attributes"
+    ]
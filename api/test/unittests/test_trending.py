@@ -0,0 +1,106 @@
+import itertools
+import math
+import random
+from collections import Counter
+
+import pytest
+
+from src.bll.trending import CountMinSketch, TrendingPolls
+
+
+def _zipf_votes(polls: int, votes: int, s: float, seed: int) -> list[int]:
+    rng = random.Random(seed)
+    ranking = list(range(1, polls + 1))
+    rng.shuffle(ranking)
+    weights = itertools.accumulate(1 / rank**s for rank in range(1, polls + 1))
+    return rng.choices(ranking, cum_weights=list(weights), k=votes)
+
+
+@pytest.fixture(scope="module")
+def zipf_votes() -> list[int]:
+    return _zipf_votes(polls=20_000, votes=200_000, s=1.1, seed=7)
+
+
+def test_sketch_overcounts_within_its_bound(zipf_votes: list[int]):
+    # Arrange
+    sketch = CountMinSketch(width=2048, depth=4, seed=1)
+    exact = Counter(zipf_votes)
+
+    # Act
+    for poll_id in zipf_votes:
+        sketch.add(poll_id, 1)
+
+    # Assert
+    bound = math.e / sketch.width * len(zipf_votes)
+    errors = [
+        sketch.estimate(poll_id) - count for poll_id, count in exact.items()
+    ]
+    assert min(errors) >= 0
+    assert sum(error > bound for error in errors) / len(errors) < 0.05
+
+
+def test_top_polls_match_exact_counts(zipf_votes: list[int]):
+    # Arrange
+    trending = TrendingPolls(half_life_s=1e9, top_k=50, seed=1)
+    exact = Counter(zipf_votes)
+
+    # Act
+    for i, poll_id in enumerate(zipf_votes):
+        trending.record(poll_id, now=i * 1e-3)
+    top = trending.trending(limit=10, now=len(zipf_votes) * 1e-3)
+
+    # Assert
+    expected = {poll_id for poll_id, _ in exact.most_common(10)}
+    found = {poll_id for poll_id, _ in top}
+    assert len(expected & found) >= 9
+    for poll_id, votes_per_s in top:
+        estimated = votes_per_s * trending.tau_s
+        assert estimated == pytest.approx(exact[poll_id], rel=0.05)
+
+
+def test_recent_votes_outrank_old_ones():
+    # Arrange
+    trending = TrendingPolls(half_life_s=60, top_k=10, snapshot_interval_s=0)
+
+    # Act
+    for i in range(100):
+        trending.record(1, now=i * 0.1)
+    for i in range(30):
+        trending.record(2, now=600 + i * 0.1)
+    top = trending.trending(limit=2, now=603)
+
+    # Assert
+    assert [poll_id for poll_id, _ in top] == [2, 1]
+    assert top[1][1] < top[0][1] / 100
+
+
+def test_rescaling_keeps_rates():
+    # Arrange
+    trending = TrendingPolls(half_life_s=1, top_k=10, snapshot_interval_s=0)
+    trending.record(1, now=0)
+    trending.record(2, now=0)
+
+    # Act
+    trending.record(2, now=100)
+    top = trending.trending(limit=2, now=100)
+
+    # Assert
+    assert top[0][0] == 2
+    assert top[0][1] == pytest.approx(1 / trending.tau_s, rel=1e-6)
+    assert top[1][1] < 1e-20
+
+
+def test_snapshot_is_served_until_the_interval_passes():
+    # Arrange
+    trending = TrendingPolls(half_life_s=60, top_k=10, snapshot_interval_s=5)
+    trending.record(1, now=0)
+    first = trending.trending(limit=5, now=0)
+
+    # Act
+    trending.record(2, now=1)
+    cached = trending.trending(limit=5, now=1)
+    refreshed = trending.trending(limit=5, now=5)
+
+    # Assert
+    assert cached == first
+    assert {poll_id for poll_id, _ in refreshed} == {1, 2}
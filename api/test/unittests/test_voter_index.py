@@ -0,0 +1,141 @@
+import os
+import random
+import time
+
+import pytest
+
+from src.bll.roaring import RoaringBitmap
+from src.bll.voter_index import VoterIndex
+
+
+@pytest.fixture
+def values() -> list[int]:
+    # sparse and dense containers side by side
+    rng = random.Random(3)
+    dense = rng.sample(range(1 << 16, 2 << 16), 20_000)
+    sparse = rng.sample(range(5 << 16, 9 << 16), 3_000)
+    return sorted(dense + sparse + [0, 7])
+
+
+def test_set_operations_match_python_sets(values: list[int]):
+    # Arrange
+    rng = random.Random(4)
+    other = sorted(rng.sample(range(0, 9 << 16), 30_000))
+    mine, theirs = RoaringBitmap.from_sorted(values), RoaringBitmap(other)
+
+    # Act
+    intersection = mine & theirs
+    union = mine | theirs
+
+    # Assert
+    assert list(intersection) == sorted(set(values) & set(other))
+    assert list(union) == sorted(set(values) | set(other))
+    assert mine.intersection_len(theirs) == len(intersection)
+    assert len(mine) == len(values)
+    assert values[100] in mine and (3 << 16) not in mine
+
+
+def test_containers_change_kind_as_they_fill_and_empty():
+    # Arrange
+    bitmap = RoaringBitmap()
+
+    # Act
+    for value in range(0, 10_000, 2):
+        bitmap.add(value)
+    filled = bitmap._containers[0]
+    for value in range(0, 10_000, 2):
+        bitmap.discard(value)
+
+    # Assert
+    assert isinstance(filled, int)
+    assert len(bitmap) == 0 and bitmap._containers == {}
+
+
+def test_bitmap_survives_serialization(values: list[int]):
+    # Arrange
+    bitmap = RoaringBitmap.from_sorted(values)
+
+    # Act
+    data = bitmap.to_bytes()
+    restored = RoaringBitmap.from_buffer(memoryview(data))
+
+    # Assert
+    assert restored == bitmap
+    assert len(data) < 4 * len(values)
+
+
+def test_saved_index_is_mapped_back_with_its_position(tmp_path):
+    # Arrange
+    path = str(tmp_path / "voters.idx")
+    index = VoterIndex(path)
+    index.build([(1, 5), (1, 6), (2, 6)])
+    index.add(3, 7)
+    index.discard(1, 5)
+    index.save(position=42)
+    index.close()
+
+    # Act
+    reloaded = VoterIndex(path)
+    shared = VoterIndex(path)
+
+    # Assert
+    assert reloaded.loaded and shared.loaded
+    assert reloaded.position == 42
+    assert list(reloaded.voters(1)) == [6]
+    assert list(reloaded.voters(3)) == [7]
+    assert reloaded.voters(1).intersection_len(reloaded.voters(2)) == 1
+    assert list(shared.voters(1)) == [6]
+
+
+def test_index_without_a_position_or_too_old_is_rebuilt(tmp_path):
+    # Arrange
+    unpositioned, old = str(tmp_path / "a.idx"), str(tmp_path / "b.idx")
+    for path, position in ((unpositioned, None), (old, 42)):
+        index = VoterIndex(path)
+        index.build([(1, 5)])
+        index.save(position=position)
+        index.close()
+
+    # Act
+    time.sleep(0.01)
+    reloaded = [VoterIndex(unpositioned), VoterIndex(old, max_age_s=0.005)]
+
+    # Assert
+    assert [index.loaded for index in reloaded] == [False, False]
+    assert [index.position for index in reloaded] == [None, None]
+
+
+def test_workers_sharing_a_path_keep_their_own_saves_mapped(tmp_path):
+    # Arrange
+    path = str(tmp_path / "voters.idx")
+    first, second = VoterIndex(path), VoterIndex(path)
+    first.build([(1, 5)])
+    second.build([(1, 6)])
+
+    # Act
+    first.save(position=1)
+    second.save(position=2)
+
+    # Assert
+    assert list(first.voters(1)) == [5]
+    assert list(second.voters(1)) == [6]
+    assert VoterIndex(path).position == 2
+    assert sorted(os.listdir(tmp_path)) == ["voters.idx"]
+
+
+def test_updates_during_a_build_are_kept():
+    # Arrange
+    index = VoterIndex()
+
+    def votes():
+        yield 1, 5
+        index.add(1, 9)
+        index.remove_options([2])
+        yield 2, 5
+
+    # Act
+    index.build(votes())
+
+    # Assert
+    assert list(index.voters(1)) == [5, 9]
+    assert len(index.voters(2)) == 0